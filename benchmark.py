@@ -0,0 +1,285 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import parse_cache
+import season_store
+from logger import logger
+from pipeline import combine_sheets, NAT_SHEET_NAME
+from per_nat_stage1_finalizer import per_nat_stage1_finalizer
+from per_zone_stage1 import per_zone_stage1
+from per_zone_stage2 import per_zone_stage2
+from per_zone_stage3 import per_zone_stage3
+from per_zone_stage4 import per_zone_stage4
+from per_zone_stage4_finalizer import per_zone_stage4_finalizer
+from per_zone_stage5 import store_previous_year as store_zone_season
+from per_zone_stage6 import per_zone_stage6
+from per_zone_stage7 import per_zone_stage7
+from per_nat_stage1 import per_nat_stage1
+from per_nat_stage2 import store_previous_year as store_nat_season
+from per_nat_stage3 import per_nat_stage3
+from per_nat_stage4 import per_nat_stage4
+from per_nat_stage5 import per_nat_stage5
+from per_nat_stage6 import per_nat_stage6
+
+SOURCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sources")
+SOURCE_PATTERN = re.compile(r"availabilityPer(Zone|Type|Nationality)(\d{4})\.xlsx?$")
+RSS_SAMPLE_INTERVAL = 0.005  # Seconds between memory samples while a stage runs
+
+
+def current_rss():
+    """Return the resident set size of this process in bytes, or None when it can't be read."""
+    if sys.platform.startswith("linux"):
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.WorkingSetSize
+    try:
+        import resource
+        # ru_maxrss is the peak so far (KB on Linux, bytes on macOS), the best available without /proc
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+class PeakRssSampler:
+    """Track the highest RSS seen while the with block runs by sampling from a background thread."""
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(RSS_SAMPLE_INTERVAL):
+            self._update()
+
+    def _update(self):
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._update()
+        return False
+
+
+def find_sources(sources_dir):
+    """
+    Return {"zone": {year: path}, "type": {...}, "nationality": {...}} for the e-Camping exports in sources_dir.
+    The newest zone year is the current year, every older zone / nationality year is a previous year.
+    """
+    found = {"zone": {}, "type": {}, "nationality": {}}
+    for name in sorted(os.listdir(sources_dir)):
+        match = SOURCE_PATTERN.match(name)
+        if match:
+            found[match.group(1).lower()][int(match.group(2))] = os.path.join(sources_dir, name)
+    if not found["zone"] or not found["nationality"]:
+        raise ValueError(f"No availabilityPerZone / availabilityPerNationality exports found in {sources_dir}")
+    current_year = max(found["zone"])
+    if current_year not in found["type"] or current_year not in found["nationality"]:
+        raise ValueError(f"availabilityPerType{current_year} and availabilityPerNationality{current_year} are needed")
+    return found, current_year
+
+
+def run_chain(sources, current_year, output_dir, measure):
+    """
+    Run every stage once in pipeline order, handing workbooks over in memory.
+    measure(name, function, *args) runs a stage and returns its result.
+    """
+    zone = sources["zone"][current_year]
+    nationality = sources["nationality"][current_year]
+    previous_zone = {year: path for year, path in sorted(sources["zone"].items(), reverse=True) if year < current_year}
+    previous_nat = {year: path for year, path in sorted(sources["nationality"].items(), reverse=True)
+                    if year < current_year}
+
+    zone_stage1 = measure("per_zone_stage1", per_zone_stage1, zone)
+    zone_stage2 = measure("per_zone_stage2", per_zone_stage2, zone_stage1, sources["type"][current_year])
+    zone_stage3 = measure("per_zone_stage3", per_zone_stage3, zone_stage2)
+    zone_stage4 = measure("per_zone_stage4", per_zone_stage4, zone_stage3)
+    zone_seasons = [measure(f"per_zone_stage5[{year}]", store_zone_season, path, year)
+                    for year, path in previous_zone.items()]
+    measure("per_zone_stage4_finalizer", per_zone_stage4_finalizer, zone_stage3)
+    zone_stage6 = measure("per_zone_stage6", per_zone_stage6, zone_stage4, zone_seasons)
+    zone_stage7 = measure("per_zone_stage7", per_zone_stage7, zone_stage6)
+
+    measure("per_nat_stage1_finalizer", per_nat_stage1_finalizer, nationality)
+    nat_seasons = [measure(f"per_nat_stage2[{year}]", store_nat_season, path, year)
+                   for year, path in previous_nat.items()]
+    nat_stage1 = measure("per_nat_stage1", per_nat_stage1, nationality)
+    nat_years = list(previous_nat)
+    nat_stage3 = measure("per_nat_stage3", per_nat_stage3, nat_stage1, nat_seasons)
+    nat_stage4 = measure("per_nat_stage4", per_nat_stage4, nat_stage3, None, nat_years, len(nat_seasons))
+    nat_stage5 = measure("per_nat_stage5", per_nat_stage5, nat_stage4, None, nat_years)
+    nat_stage6 = measure("per_nat_stage6", per_nat_stage6, nat_stage5, None, nat_years)
+
+    measure("combine_sheets", combine_sheets, zone_stage7, nat_stage6, os.path.join(output_dir, "benchmark_plan.xlsx"),
+            "benchmark", NAT_SHEET_NAME)
+
+
+def benchmark(sources_dir=SOURCES_DIR, repeat=3, warmup=1, warm_cache=False):
+    """
+    Run the stage chain warmup + repeat times and return the report with wall time, CPU time and peak RSS per stage.
+    The parse cache and the season store live in a temporary directory and are emptied before every run unless
+    warm_cache is set.
+    """
+    sources, current_year = find_sources(sources_dir)
+    samples = {}
+
+    def measure(name, function, *args):
+        with PeakRssSampler() as rss:
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            result = function(*args)
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        if recording:
+            sample = samples.setdefault(name, {"wall": [], "cpu": [], "peak_rss": []})
+            sample["wall"].append(wall)
+            sample["cpu"].append(cpu)
+            sample["peak_rss"].append(rss.peak)
+        return result
+
+    original_cache_dir, original_history_db = parse_cache.CACHE_DIR, season_store.HISTORY_DB
+    work_dir = tempfile.mkdtemp(prefix="plan_benchmark_")
+    parse_cache.CACHE_DIR = os.path.join(work_dir, "cache")
+    season_store.HISTORY_DB = os.path.join(work_dir, "history", "seasons.sqlite")
+    try:
+        for run in range(warmup + repeat):
+            recording = run >= warmup
+            if not warm_cache:
+                shutil.rmtree(parse_cache.CACHE_DIR, ignore_errors=True)
+                shutil.rmtree(os.path.dirname(season_store.HISTORY_DB), ignore_errors=True)
+            run_chain(sources, current_year, work_dir, measure)
+    finally:
+        parse_cache.CACHE_DIR = original_cache_dir
+        season_store.HISTORY_DB = original_history_db
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    stages = {}
+    for name, sample in samples.items():
+        peaks = [peak for peak in sample["peak_rss"] if peak is not None]
+        stages[name] = {
+            "wall_median": statistics.median(sample["wall"]),
+            "wall_min": min(sample["wall"]),
+            "wall_mean": statistics.mean(sample["wall"]),
+            "cpu_median": statistics.median(sample["cpu"]),
+            "peak_rss_max": max(peaks) if peaks else None,
+            "wall": sample["wall"],
+            "cpu": sample["cpu"],
+        }
+
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "sources": {kind: {str(year): os.path.basename(path) for year, path in years.items()}
+                    for kind, years in sources.items()},
+        "current_year": current_year,
+        "repeat": repeat,
+        "warmup": warmup,
+        "warm_cache": warm_cache,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "stages": stages,
+        "total_wall_median": sum(stage["wall_median"] for stage in stages.values()),
+    }
+
+
+def compare(report, baseline, threshold):
+    """Add the median wall time change against the baseline to every stage and return the regressed stage names."""
+    regressions = []
+    for name, stage in report["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base or not base["wall_median"]:
+            stage["change"] = None
+            continue
+        stage["change"] = stage["wall_median"] / base["wall_median"] - 1
+        if stage["change"] > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def format_table(report):
+    """Render the report as a plain text table."""
+    with_change = any("change" in stage for stage in report["stages"].values())
+    header = f"{'Stage':<28}{'Wall med (s)':>14}{'Wall min (s)':>14}{'CPU med (s)':>13}{'Peak RSS (MB)':>15}"
+    if with_change:
+        header += f"{'vs baseline':>13}"
+    lines = [header, "-" * len(header)]
+    for name, stage in report["stages"].items():
+        peak = f"{stage['peak_rss_max'] / 1024 / 1024:.1f}" if stage["peak_rss_max"] is not None else "n/a"
+        line = (f"{name:<28}{stage['wall_median']:>14.4f}{stage['wall_min']:>14.4f}"
+                f"{stage['cpu_median']:>13.4f}{peak:>15}")
+        if with_change:
+            line += f"{stage['change']:>+12.1%} " if stage.get("change") is not None else f"{'new':>13}"
+        lines.append(line)
+    lines.append("-" * len(header))
+    lines.append(f"{'Total':<28}{report['total_wall_median']:>14.4f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every pipeline stage on the e-Camping exports.")
+    parser.add_argument("--sources", default=SOURCES_DIR,
+                        help="Directory with availabilityPer{Zone,Type,Nationality}YYYY.xls exports")
+    parser.add_argument("--repeat", type=int, default=3, help="Measured runs")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured runs before the measured ones")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="Keep the parse cache and the season store between runs")
+    parser.add_argument("--json", help="Write the report to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a report saved with --json")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Median wall time increase counted as a regression (0.10 = 10%%)")
+    parser.add_argument("--verbose", action="store_true", help="Keep the stage logging")
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.warmup < 0:
+        parser.error("--repeat must be at least 1 and --warmup at least 0")
+
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+    report = benchmark(args.sources, args.repeat, args.warmup, args.warm_cache)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    print(format_table(report))
+    if regressions:
+        print(f"Regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+from openpyxl.cell.cell import Cell
+
+
+class ColumnPlan:
+    """
+    The column order of a worksheet, rearranged as a list before any cell is touched.
+    insert, move and delete behave like ws.insert_cols, ws.move_range(cols=...) and ws.delete_cols,
+    but each one only reorders the list of columns ({row: cell}); apply() then puts every cell
+    in its final column in one pass instead of shifting the whole sheet at every step.
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.columns = [{} for _ in range(ws.max_column)]
+        for (row, column), cell in ws._cells.items():
+            self.columns[column - 1][row] = cell
+
+    def _pad(self, column):
+        """Make sure the 1-based column exists in the plan."""
+        while len(self.columns) < column:
+            self.columns.append({})
+
+    def headers(self):
+        """Return the header row as get_headers would after the planned changes."""
+        last_column = len(self.columns)
+        while last_column and not self.columns[last_column - 1]:
+            last_column -= 1  # Like ws.max_column, empty columns at the end do not count
+        return [cell.value if cell else None for cell in (column.get(1) for column in self.columns[:last_column])]
+
+    def set_value(self, row, column, value):
+        """Plan ws.cell(row=row, column=column).value = value."""
+        self._pad(column)
+        cells = self.columns[column - 1]
+        if row not in cells:
+            cells[row] = Cell(self.ws, row=row, column=column)
+        cells[row].value = value
+
+    def insert(self, column, amount=1):
+        """Plan ws.insert_cols(column, amount)."""
+        self._pad(column - 1)
+        self.columns[column - 1:column - 1] = [{} for _ in range(amount)]
+
+    def delete(self, column, amount=1):
+        """Plan ws.delete_cols(column, amount)."""
+        del self.columns[column - 1:column - 1 + amount]
+
+    def move(self, column, to_column):
+        """Plan moving a whole column with ws.move_range, which replaces every cell of the target column."""
+        if column == to_column:
+            return
+        self._pad(max(column, to_column))
+        self.columns[to_column - 1] = self.columns[column - 1]
+        self.columns[column - 1] = {}
+
+    def reorder(self, order):
+        """
+        Plan the whole column order at once: order lists the planned columns (1-based) left to right,
+        None for a new empty column. Columns left out are deleted.
+        """
+        columns = self.columns
+        self.columns = [columns[column - 1] if column else {} for column in order]
+
+    def apply(self):
+        """Move every cell to its planned column at once."""
+        cells = {}
+        for column, column_cells in enumerate(self.columns, start=1):
+            for row, cell in column_cells.items():
+                cell.column = column
+                cells[(row, column)] = cell
+        self.ws._cells = cells
+
+
+class RowPlan:
+    """
+    Rows to insert into a worksheet, collected before any cell is touched.
+    insert_below behaves like ws.insert_rows(row + 1) followed by writing the new row, with row counted
+    in the original sheet, and insert_cols like ws.insert_cols on the original rows before any new row is written;
+    apply() then puts the original and the new rows in their final place in one pass
+    instead of shifting the sheet at every insertion.
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.inserted = {}  # original row (0 = above the first row) -> new rows right below it, top to bottom
+        self.inserted_cols = []  # (column, amount) of the original rows, in the order planned
+
+    def insert_cols(self, column, amount=1):
+        """Plan ws.insert_cols(column, amount) on the original rows; the planned new rows keep their columns."""
+        self.inserted_cols.append((column, amount))
+
+    def _column(self, column):
+        """Return the column an original cell ends up in after the planned column inserts."""
+        for inserted, amount in self.inserted_cols:
+            if column >= inserted:
+                column += amount
+        return column
+
+    def insert_below(self, row, values):
+        """
+        Plan a new row with values (column 1 onward) right below the original row (0 for the top of the sheet).
+        Like repeated ws.insert_rows(row + 1) calls, the last row planned below a row ends up right below it.
+        """
+        self.inserted.setdefault(row, []).insert(0, list(values))
+
+    def apply(self):
+        """Move every original cell down by the rows and right by the columns inserted before it and write the new rows, at once."""
+        rows = {}
+        for (row, column), cell in self.ws._cells.items():
+            rows.setdefault(row, {})[column] = cell
+
+        cells = {}
+        new_row = 0
+        for row in range(max(rows, default=0) + 1):
+            if row:
+                new_row += 1
+                for column, cell in rows.get(row, {}).items():
+                    cell.row, cell.column = new_row, self._column(column)
+                    cells[(new_row, cell.column)] = cell
+            for values in self.inserted.get(row, ()):
+                new_row += 1
+                for column, value in enumerate(values, start=1):
+                    cells[(new_row, column)] = Cell(self.ws, row=new_row, column=column, value=value)
+        self.ws._cells = cells
@@ -0,0 +1,142 @@
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+from openpyxl import Workbook
+from logger import logger
+
+# Rows of the real exports, the generated ones are added after them
+BASE_HOUSE_ZONES = [(".Beach Apt / for 5.2.6", 32), (".LUX for 4", 51), (".Safari Tent 5pax", 12),
+                    (".Sea Safari 4pax", 31), (".Skyline 3pax", 11), (".Standard Mobile Home", 31),
+                    (".ΤΡΟΧΟΣΠΙΤΑ DELUXE", 8), (".ΤΡΟΧΟΣΠΙΤΑ SEA VIEW", 24), (".ΤΡΟΧΟΣΠΙΤΑ standard", 8)]
+YOUTH_HOSTEL_ZONE = (".Youth Hostel", 46)
+BASE_CAMPING_ZONES = [("2", 54), ("3", 97), ("4", 23), ("5", 50), ("6", 20), ("7", 58), ("Z", 29), ("Κ", 106)]
+# The types per_zone_stage2 puts in place of ".Beach Apt / for 5.2.6", then the other types of the export
+SPLIT_TYPES = [("APT", 2), ("Beach", 3), ("for2", 7), ("for5", 14), ("for6", 6)]
+OTHER_TYPES = [("DLX", 8), ("Lux100", 19), ("Lux200", 19), ("LuxH", 13), ("MH", 31), ("Skyline", 11), ("TP", 32),
+               ("YH", 46)]
+BASE_NATIONALITIES = ["ΑΛΒΑΝΙΑ", "ΑΥΣΤΡΙΑ", "ΒΕΛΓΙΟ", "ΒΟΡΕΙΑ ΜΑΚΕΔΟΝΙΑ", "ΒΟΣΝΙΑ-ΕΡΖΕΓΟΒΙΝΗ", "ΒΟΥΛΓΑΡΙΑ", "ΓΑΛΛΙΑ",
+                      "ΓΕΡΜΑΝΙΑ", "ΓΕΩΡΓΙΑ", "ΔΑΝΙΑ", "ΕΛΒΕΤΙΑ", "ΕΛΛΗΝΙΚΗ", "ΕΣΘΟΝΙΑ", "Η.Π.Α.", "ΗΝΩΜΕΝΟ ΒΑΣΙΛΕΙΟ",
+                      "ΙΡΛΑΝΔΙΑ", "ΙΣΠΑΝΙΑ", "ΙΣΡΑΗΛ", "ΙΤΑΛΙΑ", "ΚΑΝΑΔΑΣ", "ΚΡΟΑΤΙΑ", "ΚΥΠΡΟΣ", "ΛΕΤΤΟΝΙΑ",
+                      "ΛΟΥΞΕΜΒΟΥΡΓΟ", "ΜΟΛΔΑΒΙΑ", "ΟΛΛΑΝΔΙΑ", "ΟΥΓΓΑΡΙΑ", "ΟΥΚΡΑΝΙΑ", "ΠΟΛΩΝΙΑ", "ΡΟΥΜΑΝΙΑ",
+                      "ΣΕΡΒΙΑ", "ΣΛΟΒΑΚΙΑ", "ΣΛΟΒΕΝΙΑ", "ΣΟΥΗΔΙΑ", "ΤΟΥΡΚΙΑ", "ΤΣΕΧΙΑ, ΔΗΜΟΚΡΑΤΙΑ ΤΗΣ"]
+
+SHEET_NAME = "Πληρότητα"
+DATE_FORMAT = "d-mmm"  # Number format of the date header cells in the e-Camping exports
+SEASON_START = (4, 29)  # Month and day the season opens
+NATIONALITY_PRESENCE = 0.85  # Share of the nationalities that show up in a given year
+
+
+def build_zones(zone_count):
+    """Return the (name, capacity) house rows, the Youth Hostel row and the camping rows for zone_count zones."""
+    houses = list(BASE_HOUSE_ZONES)
+    camping = list(BASE_CAMPING_ZONES)
+    base_count = len(houses) + 1 + len(camping)
+    for number in range(max(0, zone_count - base_count)):
+        # Generated houses keep a house keyword in their name so the stages put them in the Accommodations section
+        if number % 2 == 0:
+            name, capacity = BASE_HOUSE_ZONES[1 + (number // 2) % (len(BASE_HOUSE_ZONES) - 1)]
+            houses.append((f"{name} {number // 2 + 1:03d}", capacity))
+        else:
+            camping.append((f"C{number // 2 + 1:03d}", 20 + (number * 7) % 80))
+    return houses, YOUTH_HOSTEL_ZONE, camping
+
+
+def build_nationalities(nationality_count):
+    """Return nationality_count nationality names, the real ones first."""
+    names = BASE_NATIONALITIES[:nationality_count]
+    names += [f"ΧΩΡΑ {number:03d}" for number in range(1, nationality_count - len(names) + 1)]
+    return sorted(names)
+
+
+def season_dates(year, season_days):
+    """Return the dates of a season of season_days days."""
+    start = datetime(year, *SEASON_START)
+    return [start + timedelta(days=day) for day in range(season_days)]
+
+
+def occupancy(rng, capacity, day, season_days):
+    """Return a plausible booked units value for a day, peaking mid season, or None for an empty export cell."""
+    peak = 1 - abs(day / max(season_days - 1, 1) - 0.6) * 1.4
+    booked = round(capacity * max(peak, 0) * rng.uniform(0.6, 1.0))
+    if booked == 0:
+        return None if rng.random() < 0.7 else 0.0
+    return float(booked)
+
+
+def new_sheet(dates):
+    """Create a workbook with the e-Camping header row."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = SHEET_NAME
+    ws.append(["Category", "Capacity"] + dates)
+    for cell in ws[1][2:]:
+        cell.number_format = DATE_FORMAT
+    return wb, ws
+
+
+def write_capacity_export(output_file, rows, dates, rng):
+    """Write an availabilityPerZone / availabilityPerType export with one row per (name, capacity)."""
+    wb, ws = new_sheet(dates)
+    for name, capacity in rows:
+        ws.append([name, float(capacity)] + [occupancy(rng, capacity, day, len(dates)) for day in range(len(dates))])
+    wb.save(output_file)
+
+
+def write_nationality_export(output_file, nationalities, dates, rng):
+    """Write an availabilityPerNationality export with a Rooms and a Camping row per nationality present."""
+    wb, ws = new_sheet(dates)
+    for prefix, scale in ((" Rooms ", 30), ("Camping ", 10)):
+        for nationality in nationalities:
+            if rng.random() > NATIONALITY_PRESENCE:
+                continue
+            weight = rng.choice((0, 0, 1, 2, scale))
+            ws.append([f"{prefix}{nationality}", None]
+                      + [occupancy(rng, weight, day, len(dates)) for day in range(len(dates))])
+    wb.save(output_file)
+
+
+def generate_sources(output_dir, zones=18, nationalities=36, season_days=154, years=3, current_year=None, seed=0):
+    """
+    Write e-Camping shaped availabilityPerZone/PerType/PerNationality workbooks into output_dir:
+    Zone and Nationality for current_year and the years - 1 previous years, Type for current_year.
+    The defaults match the size of the bundled sources/, current_year defaults to this year like the stages assume.
+    Returns the written file paths.
+    """
+    current_year = current_year or datetime.now().year
+    rng = random.Random(seed)
+    houses, youth_hostel, camping = build_zones(zones)
+    nationality_names = build_nationalities(nationalities)
+    os.makedirs(output_dir, exist_ok=True)
+
+    written = []
+    for year in range(current_year, current_year - years, -1):
+        dates = season_dates(year, season_days)
+        zone_file = os.path.join(output_dir, f"availabilityPerZone{year}.xlsx")
+        write_capacity_export(zone_file, houses + [youth_hostel] + camping, dates, rng)
+        nationality_file = os.path.join(output_dir, f"availabilityPerNationality{year}.xlsx")
+        write_nationality_export(nationality_file, nationality_names, dates, rng)
+        written += [zone_file, nationality_file]
+        if year == current_year:
+            type_file = os.path.join(output_dir, f"availabilityPerType{year}.xlsx")
+            write_capacity_export(type_file, sorted(camping + SPLIT_TYPES + OTHER_TYPES), dates, rng)
+            written.append(type_file)
+
+    logger.info(f"Generated {len(written)} files in {output_dir}: {len(houses) + 1 + len(camping)} zones, "
+                f"{len(nationality_names)} nationalities, {season_days} days, {years} years")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate e-Camping shaped exports for scale testing.")
+    parser.add_argument("--output-dir", default="generated_sources")
+    parser.add_argument("--zones", type=int, default=18, help="Zone rows, including the Youth Hostel")
+    parser.add_argument("--nationalities", type=int, default=36)
+    parser.add_argument("--season-days", type=int, default=154)
+    parser.add_argument("--years", type=int, default=3, help="Current year plus previous years")
+    parser.add_argument("--current-year", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_sources(args.output_dir, args.zones, args.nationalities, args.season_days, args.years,
+                     args.current_year, args.seed)
@@ -5,13 +5,14 @@ from datetime import datetime
 from file_handler import select_file
 from processing import process_files
 from logger import logger
+from season_align import ALIGN_MODES
 
 
 class PlanoKratiseonApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Πλάνο Κρατήσεων")
-        self.root.geometry("600x700")
+        self.root.geometry("600x800")
         self.root.configure(bg="#f0f0f0")
 
         self.cleanup_outputs = False
@@ -100,6 +101,27 @@ class PlanoKratiseonApp:
                                                command=self.toggle_cleanup)
         self.cleanup_checkbox.pack()
 
+        # Skip the stages whose inputs did not change since the last run
+        self.stage_cache_var = tk.BooleanVar(value=True)
+        self.stage_cache_checkbox = tk.Checkbutton(self.root, text="Reuse Unchanged Stages",
+                                                   variable=self.stage_cache_var)
+        self.stage_cache_checkbox.pack()
+
+        # Nationality separators and year bands as conditional formats instead of cell fills
+        self.range_fills_var = tk.BooleanVar(value=False)
+        self.range_fills_checkbox = tk.Checkbutton(self.root, text="Conditional Format Fills",
+                                                   variable=self.range_fills_var)
+        self.range_fills_checkbox.pack()
+
+        # Previous years on the same calendar date or on the same weekday
+        alignment_frame = tk.Frame(self.root, bg="#f0f0f0")
+        alignment_frame.pack(pady=5)
+        alignment_label = tk.Label(alignment_frame, text="Align Previous Years By", bg="#f0f0f0")
+        alignment_label.pack(side="left", padx=5)
+        self.alignment_var = tk.StringVar(value=ALIGN_MODES[0])
+        self.alignment_menu = tk.OptionMenu(alignment_frame, self.alignment_var, *ALIGN_MODES)
+        self.alignment_menu.pack(side="left")
+
         self.status_label = tk.Label(self.root, text="", fg="blue", bg="#f0f0f0", font=("Arial", 10))
         self.status_label.pack(pady=10)
 
@@ -0,0 +1,97 @@
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+GREEK_DAYS = {
+    "Mon": "Δευ", "Tue": "Τρι", "Wed": "Τετ", "Thu": "Πεμ",
+    "Fri": "Παρ", "Sat": "Σαβ", "Sun": "Κυρ"
+}
+
+# Parsed headers kept per process: a few seasons of day headers in each format, the oldest are dropped first
+HEADER_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=HEADER_CACHE_SIZE)
+def _parse_value(value, dayfirst):
+    try:
+        date = pd.to_datetime(value, dayfirst=dayfirst)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    return None if pd.isna(date) else date
+
+
+def parse_header(value, dayfirst=True):
+    """
+    Return the Timestamp of one header, None when it is not a date. Results are memoized, up to
+    HEADER_CACHE_SIZE headers: the same headers come back in every stage and for every zone of a season.
+    """
+    if value is None:
+        return None
+    try:
+        return _parse_value(value, dayfirst)
+    except TypeError:  # Unhashable, parse it every time
+        return _parse_value.__wrapped__(value, dayfirst)
+
+
+def parse_headers(headers, dayfirst=True):
+    """
+    Return the Timestamp of every header, or None for the headers that are not dates, like calling
+    pd.to_datetime(header, dayfirst=dayfirst) on each of them. The date cells of the exports are
+    converted together in one call, text headers go through parse_header().
+    """
+    headers = list(headers)
+    date_positions = [position for position, header in enumerate(headers)
+                      if isinstance(header, (datetime, np.datetime64))]
+    skipped = set(date_positions)
+    dates = [None if position in skipped else parse_header(header, dayfirst)
+             for position, header in enumerate(headers)]
+    if date_positions:
+        converted = pd.to_datetime([headers[position] for position in date_positions])
+        for position, date in zip(date_positions, converted):
+            dates[position] = None if pd.isna(date) else date
+    return dates
+
+
+def date_headers(headers, dayfirst=True):
+    """Return the headers that are dates, in order."""
+    return [header for header, date in zip(headers, parse_headers(headers, dayfirst)) if date is not None]
+
+
+def header_labels(headers, date_format, dayfirst=True):
+    """Return {header: its date written with date_format} for the headers that are dates."""
+    return {header: date.strftime(date_format) for header, date in zip(headers, parse_headers(headers, dayfirst))
+            if date is not None}
+
+
+def greek_day_label(date):
+    """Write a date as 'Δευ 14/09', the header of the nationality sheets."""
+    day = date.strftime("%a")
+    return f"{GREEK_DAYS.get(day, day)} {date.strftime('%d/%m')}"
+
+
+@lru_cache(maxsize=HEADER_CACHE_SIZE)
+def month_header_date(header):
+    """Return the datetime of a 'Apr 2025' month header, None for any other header."""
+    if not isinstance(header, str):
+        return None
+    try:
+        return datetime.strptime(header, '%b %Y')
+    except ValueError:
+        return None
+
+
+def month_column_ranges(headers, months, start=1):
+    """
+    Return {month: [first column, last column]} of the daily 'Δευ 14/09' headers, months[i] being month i + 4
+    (months start in April). headers[0] is column start.
+    """
+    month_suffixes = {f"/{str(i + 4).zfill(2)}": month for i, month in enumerate(months)}
+    month_ranges = {}
+    for col, header in enumerate(headers, start=start):
+        if isinstance(header, str):
+            month = month_suffixes.get(header[-3:])
+            if month:
+                month_ranges.setdefault(month, [col, col])[1] = col
+    return month_ranges
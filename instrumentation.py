@@ -0,0 +1,133 @@
+import cProfile
+import json
+import os
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from openpyxl import Workbook
+from logger import logger
+
+
+def size_of(value):
+    """Describe the size of a stage input or output: bytes for files, cells for in-memory workbooks."""
+    if value is None:
+        return None
+    if isinstance(value, Workbook):
+        return {"cells": sum(ws.max_row * ws.max_column for ws in value.worksheets)}
+    if isinstance(value, (list, tuple)):
+        sizes = [size_of(item) for item in value]
+        return [size for size in sizes if size is not None] or None
+    if isinstance(value, str) and os.path.isfile(value):
+        return {"bytes": os.path.getsize(value)}
+    return None
+
+
+class StageRecorder:
+    """
+    Record start, end, duration and input/output sizes of every stage of a run,
+    optionally with a cProfile dump (profile_dir) and the tracemalloc peak (trace_memory) per stage.
+    Recorders are picklable: a worker process gets child() and the parent merge()s the events it returns.
+    """
+
+    def __init__(self, profile_dir=None, trace_memory=False):
+        self.profile_dir = profile_dir
+        self.trace_memory = trace_memory
+        self.events = []
+
+    def child(self):
+        """Return an empty recorder with the same settings, for a worker process."""
+        return StageRecorder(self.profile_dir, self.trace_memory)
+
+    def merge(self, events):
+        self.events.extend(events)
+
+    def _event(self, name, kind, start, duration, cpu, **details):
+        event = {"name": name, "kind": kind, "pid": os.getpid(), "tid": threading.get_ident(),
+                 "start": start, "end": start + duration, "duration": duration, "cpu": cpu}
+        event.update({key: value for key, value in details.items() if value is not None})
+        self.events.append(event)
+        return event
+
+    @contextmanager
+    def span(self, name):
+        """Record a group of stages (a branch, the previous years) as one event."""
+        start, wall_start, cpu_start = time.time(), time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self._event(name, "span", start, time.perf_counter() - wall_start, time.process_time() - cpu_start)
+
+    def stage(self, name, function, *args, **kwargs):
+        """Run a stage function and record it."""
+        input_size = size_of(list(args) + list(kwargs.values()))  # Before the stage changes workbooks in place
+        profiler = cProfile.Profile() if self.profile_dir else None
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+
+        start, wall_start, cpu_start = time.time(), time.perf_counter(), time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            if profiler:
+                profiler.disable()
+            duration, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            peak_memory = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+            if started_tracing:
+                tracemalloc.stop()
+
+        profile_file = None
+        if profiler:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            file_name = re.sub(r"[^\w-]+", "_", name).strip("_")
+            profile_file = os.path.join(self.profile_dir, f"{file_name}.prof")
+            profiler.dump_stats(profile_file)
+
+        self._event(name, "stage", start, duration, cpu, input_size=input_size,
+                    output_size=size_of(result), peak_memory=peak_memory, profile=profile_file)
+        logger.info(f"{name} took {duration:.3f}s")
+        return result
+
+    def write_report(self, report_file, **run_info):
+        """Write the recorded events, sorted by start time, and run_info to a JSON run report."""
+        events = sorted(self.events, key=lambda event: event["start"])
+        stages = [event for event in events if event["kind"] == "stage"]
+        report = dict(run_info,
+                      start=events[0]["start"] if events else None,
+                      end=max(event["end"] for event in events) if events else None,
+                      stage_time=sum(event["duration"] for event in stages),
+                      events=events)
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        logger.info(f"Run report saved as {report_file}")
+
+    def write_chrome_trace(self, trace_file):
+        """Write the events in the Chrome trace event format (chrome://tracing, Perfetto)."""
+        origin = min((event["start"] for event in self.events), default=0)
+        trace_events = [{"name": event["name"], "cat": event["kind"], "ph": "X", "pid": event["pid"],
+                         "tid": event["tid"], "ts": (event["start"] - origin) * 1e6, "dur": event["duration"] * 1e6,
+                         "args": {key: event[key] for key in ("cpu", "input_size", "output_size", "peak_memory")
+                                  if key in event}}
+                        for event in self.events]
+        with open(trace_file, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+        logger.info(f"Chrome trace saved as {trace_file}")
+
+
+def stage_in_worker(recorder, name, function, *args, **kwargs):
+    """Run a recorded stage in a worker process and hand back the result with the recorded events."""
+    return recorder.stage(name, function, *args, **kwargs), recorder.events
+
+
+def branch_in_worker(recorder, name, function, *args, **kwargs):
+    """Run a recorded branch in a worker process and hand back the result with the recorded events."""
+    with recorder.span(name):
+        result = function(*args, recorder=recorder, **kwargs)
+    return result, recorder.events
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import sys
+
+import pandas as pd
+from logger import logger
+
+# Parsed first sheets of the e-Camping exports, keyed by the hash of the file content
+CACHE_DIR = os.path.join("cache", "parsed")
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+CACHE_FORMAT_VERSION = 1
+
+
+def file_digest(input_file):
+    """Return the SHA-256 hex digest of the file content."""
+    digest = hashlib.sha256()
+    with open(input_file, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path(digest, header):
+    """Return the cache entry path for a file digest and the header row it was parsed with."""
+    header_tag = "none" if header is None else str(header)
+    return os.path.join(CACHE_DIR, f"{digest}-h{header_tag}-v{CACHE_FORMAT_VERSION}.pkl")
+
+
+def read_first_sheet(input_file, header=0):
+    """
+    Read the first sheet of an Excel export like pd.read_excel does,
+    serving it from the local cache when the same file content was parsed before.
+    """
+    try:
+        entry = cache_path(file_digest(input_file), header)
+    except OSError as e:
+        logger.warning(f"Parse cache disabled for {input_file}: {e}")
+        return pd.read_excel(input_file, sheet_name=0, header=header)
+
+    if os.path.exists(entry):
+        try:
+            df = pd.read_pickle(entry)
+            os.utime(entry)  # Mark as recently used for eviction
+            logger.debug(f"Parse cache hit for {input_file}")
+            return df
+        except Exception as e:
+            logger.warning(f"Dropping unreadable parse cache entry {entry}: {e}")
+            remove_entry(entry)
+
+    logger.debug(f"Parse cache miss for {input_file}")
+    df = pd.read_excel(input_file, sheet_name=0, header=header)
+    store(df, entry)
+    return df
+
+
+def store(df, entry):
+    """Write a parsed sheet to the cache and keep the cache within its size limit."""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temp_entry = f"{entry}.{os.getpid()}.tmp"
+        df.to_pickle(temp_entry)
+        os.replace(temp_entry, entry)  # Atomic, so concurrent runs never read a half written entry
+        evict(CACHE_MAX_BYTES)
+    except OSError as e:
+        logger.warning(f"Could not write parse cache entry {entry}: {e}")
+
+
+def remove_entry(entry):
+    """Remove a cache entry, ignoring entries already removed by another run."""
+    try:
+        os.remove(entry)
+    except FileNotFoundError:
+        pass
+
+
+def list_entries(cache_dir=None):
+    """Return (path, size, last used) for every entry of the cache (the parse cache by default)."""
+    cache_dir = cache_dir or CACHE_DIR
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".pkl"):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((path, stat.st_size, stat.st_mtime))
+    return entries
+
+
+def evict(max_bytes, cache_dir=None):
+    """Remove the least recently used entries until the cache fits in max_bytes."""
+    entries = sorted(list_entries(cache_dir), key=lambda entry: entry[2])
+    total = sum(size for _, size, _ in entries)
+    for path, size, _ in entries:
+        if total <= max_bytes:
+            break
+        remove_entry(path)
+        total -= size
+        logger.debug(f"Evicted cache entry {path}")
+
+
+def clear_cache():
+    """Invalidate the whole parse cache."""
+    entries = list_entries()
+    for path, _, _ in entries:
+        remove_entry(path)
+    logger.info(f"Parse cache cleared, {len(entries)} entries removed.")
+
+
+if __name__ == "__main__":
+    # python parse_cache.py clear  -> remove all entries
+    # python parse_cache.py        -> show cache usage
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        clear_cache()
+    else:
+        cached = list_entries()
+        logger.info(f"Parse cache {CACHE_DIR}: {len(cached)} entries, "
+                    f"{sum(size for _, size, _ in cached) / 1024:.1f} KB of {CACHE_MAX_BYTES / 1024 / 1024:.0f} MB")
@@ -1,16 +1,13 @@
 from datetime import datetime
 
 import pandas as pd
-from openpyxl import load_workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from header_calendar import greek_day_label, month_column_ranges, parse_headers
 from logger import logger
+from sheet_numbers import NumberBlock
+from workbook_io import frame_to_book, read_values, save_book, settle_book
 
 # Constants
-GREEK_DAYS = {
-    "Mon": "Δευ", "Tue": "Τρι", "Wed": "Τετ", "Thu": "Πεμ",
-    "Fri": "Παρ", "Sat": "Σαβ", "Sun": "Κυρ"
-}
-
 DAY_COLORS = {
     "Παρ": "ADD8E6",  # Light Blue (Friday)
     "Σαβ": "90EE90",  # Light Green (Saturday)
@@ -37,24 +34,12 @@ def load_and_prepare_data(input_file):
     return df, headers
 
 
-def format_date_column(col):
-    """Format a single date column into Greek day and date."""
-    try:
-        date = pd.to_datetime(col, dayfirst=True, errors="coerce")
-        if pd.notna(date):
-            greek_day = GREEK_DAYS.get(date.strftime("%a"), date.strftime("%a"))
-            return f"{greek_day} {date.strftime('%d/%m')}"
-        else:
-            return col
-    except Exception:
-        return col
-
-
 def format_dates(df):
-    """Format all date columns in the DataFrame."""
+    """Format all date columns in the DataFrame into Greek day and date."""
     date_columns = df.columns[1:]
-    formatted_columns = [df.columns[0]] + [format_date_column(col) for col in date_columns]
-    df.columns = formatted_columns
+    dates = parse_headers(date_columns)
+    df.columns = [df.columns[0]] + [greek_day_label(date) if date is not None else col
+                                    for col, date in zip(date_columns, dates)]
     return df
 
 
@@ -96,28 +81,16 @@ def apply_column_sum_formulas(ws, total_rooms_row, total_camping_row, max_col):
 def apply_column_sums_noform(ws, total_rooms_row, total_camping_row, max_col):
     """Directly calculate and insert column sums without using Excel formulas."""
     if DO_CALCULATIONS:
-        for col in range(2, max_col + 2):
-            column_sum_rooms = 0
-            column_sum_camping = 0
+        block = NumberBlock(ws, 2, ws.max_row, 2, max_col + 1)
 
-            # Calculate sum for rooms (from row 2 to the row before 'Total Rooms')
-            if total_rooms_row:
-                for row in range(2, total_rooms_row):
-                    value = ws.cell(row=row, column=col).value
-                    if value is None:
-                        continue
-                    if isinstance(value, (int, float)):  # Ensure it's a number
-                        column_sum_rooms += value
+        # Calculate sum for rooms (from row 2 to the row before 'Total Rooms')
+        if total_rooms_row:
+            for col, column_sum_rooms in block.column_totals(2, total_rooms_row - 1).items():
                 ws.cell(row=total_rooms_row, column=col).value = column_sum_rooms
 
-            # Calculate sum for camping (from the row after 'Total Rooms' to the row before 'Total Camping')
-            if total_camping_row:
-                for row in range(total_rooms_row + 2, total_camping_row):
-                    value = ws.cell(row=row, column=col).value
-                    if value is None:
-                        continue
-                    if isinstance(value, (int, float)):  # Ensure it's a number
-                        column_sum_camping += value
+        # Calculate sum for camping (from the row after 'Total Rooms' to the row before 'Total Camping')
+        if total_camping_row:
+            for col, column_sum_camping in block.column_totals(total_rooms_row + 2, total_camping_row - 1).items():
                 ws.cell(row=total_camping_row, column=col).value = column_sum_camping
 
 
@@ -171,15 +144,9 @@ def add_total_column_direct_noform(ws, max_row, max_col, total_column, total_roo
     ws.cell(row=1, column=total_column).font = Font(bold=True)
 
     if DO_CALCULATIONS:
-        for row in range(2, max_row + 1):
+        row_sums = NumberBlock(ws, 2, max_row, 2, max_col).row_totals(2, max_col)  # The data columns
+        for row, row_sum in row_sums.items():
             if row not in [total_rooms_row, total_camping_row]:
-                row_sum = 0
-                for col in range(2, max_col + 1):  # Iterate through the data columns
-                    value = ws.cell(row=row, column=col).value
-                    if value is None:
-                        continue
-                    if isinstance(value, (int, float)):  # Ensure the value is a number
-                        row_sum += value
                 ws.cell(row=row, column=total_column).value = row_sum
                 ws.cell(row=row, column=total_column).fill = YELLOW_FILL
                 ws.cell(row=row, column=total_column).font = Font(bold=True)
@@ -215,40 +182,16 @@ def add_percentage_column_direct_noform(ws, max_row, total_column, percent_colum
     ws.cell(row=1, column=percent_column).font = Font(bold=True)
 
     if DO_CALCULATIONS:
-        # Manually compute total values for rooms and camping (summing up relevant rows)
-        total_rooms_value = 0
-        total_camping_value = 0
-
-        # Sum the values for rooms and camping based on the rows you want to sum
-        for row in range(2, total_rooms_row):  # Adjust range for rooms section
-            current_value = ws.cell(row=row, column=total_column).value
-            if isinstance(current_value, (int, float)):  # Ensure it's numeric
-                total_rooms_value += current_value
+        # Rooms section up to 'Total Rooms', camping section from the row after the separator
+        sections = [(2, total_rooms_row - 1), (total_rooms_row + 2, max_row)]
+        percentages = NumberBlock(ws, 2, max_row, total_column, total_column).percent_to_total(total_column, sections)
 
-        for row in range(total_rooms_row + 2, max_row + 1):  # Adjust range for camping section
-            current_value = ws.cell(row=row, column=total_column).value
-            if isinstance(current_value, (int, float)):  # Ensure it's numeric
-                total_camping_value += current_value
-
-        for row in range(2, max_row + 1):
+        for row, percentage in percentages.items():
             if row not in [total_rooms_row, total_camping_row]:
-                current_value = ws.cell(row=row, column=total_column).value
-                if isinstance(current_value, (int, float)):  # Ensure the current value is numeric
-                    if row < total_rooms_row:  # Rooms section
-                        if total_rooms_value and total_rooms_value != 0:  # Avoid division by zero
-                            percentage = current_value / total_rooms_value
-                            ws.cell(row=row, column=percent_column).value = percentage
-                        else:
-                            ws.cell(row=row, column=percent_column).value = 0
-                    elif row > total_rooms_row + 1:  # Camping section
-                        if total_camping_value and total_camping_value != 0:  # Avoid division by zero
-                            percentage = current_value / total_camping_value
-                            ws.cell(row=row, column=percent_column).value = percentage
-                        else:
-                            ws.cell(row=row, column=percent_column).value = 0
-
-                    # Format as percentage
-                    ws.cell(row=row, column=percent_column).number_format = "0.00%"
+                ws.cell(row=row, column=percent_column).value = percentage
+
+                # Format as percentage
+                ws.cell(row=row, column=percent_column).number_format = "0.00%"
 
     ws.column_dimensions[ws.cell(row=1, column=percent_column).column_letter].width = 15
 
@@ -287,6 +230,10 @@ def add_monthly_sums_direct_noform(ws, max_row, total_column, separator_column_2
     month_start_col = separator_column_2 + 1  # Start after the second separator
     current_year = datetime.now().year
 
+    if DO_CALCULATIONS:
+        # Sum the daily columns of every month for all rows at once
+        month_sums = NumberBlock(ws, 2, max_row, 2, total_column - 1).bucket_totals(month_ranges)
+
     for i, month in enumerate(MONTHS):
         month_col = month_start_col + i
         ws.cell(row=1, column=month_col).value = f"{month} {current_year}"
@@ -295,20 +242,8 @@ def add_monthly_sums_direct_noform(ws, max_row, total_column, separator_column_2
 
         if DO_CALCULATIONS:
             if month in month_ranges:
-                first_col_index = month_ranges[month][0] - 1  # Adjust for 0-based indexing
-                last_col_index = month_ranges[month][1] - 1  # Adjust for 0-based indexing
-
-                for row in range(2, max_row + 1):
+                for row, row_sum in month_sums[month].items():
                     if row not in [total_rooms_row, total_camping_row]:
-
-                        # Sum the values in the row directly for the given month range
-                        row_sum = 0
-
-                        for col in range(first_col_index, last_col_index + 1):
-                            cell_value = ws.cell(row=row, column=col + 1).value  # Adjust for 1-based indexing
-                            if isinstance(cell_value, (int, float)):  # Check if the value is numeric
-                                row_sum += cell_value
-
                         ws.cell(row=row, column=month_col).value = row_sum
 
     # Add separator column after the last month column
@@ -317,18 +252,8 @@ def add_monthly_sums_direct_noform(ws, max_row, total_column, separator_column_2
 
 def find_monthly_column_ranges(ws, total_column):
     """Find the first and last column for each month."""
-    month_ranges = {}
-    for col in range(2, total_column):
-        header_value = ws.cell(row=1, column=col).value
-        if header_value:
-            for i, month in enumerate(MONTHS):
-                month_number = str(i + 4).zfill(2)  # "Apr" = 04, "May" = 05, etc.
-                if header_value.endswith(f'/{month_number}'):
-                    if month not in month_ranges:
-                        month_ranges[month] = [col, col]
-                    else:
-                        month_ranges[month][1] = col
-    return month_ranges
+    headers = read_values(ws, max_row=1, min_col=2, max_col=total_column - 1)[0]
+    return month_column_ranges(headers, MONTHS, start=2)
 
 
 def add_separator_column(ws, max_row, separator_column):
@@ -367,9 +292,8 @@ def apply_formatting(ws, max_col, max_row, total_rooms_row, total_camping_row):
     ws.freeze_panes = "B2"
 
 
-def apply_excel_formatting_and_formulas(output_file):
-    """Apply formatting and formulas to the output Excel file."""
-    wb = load_workbook(output_file)
+def apply_excel_formatting_and_formulas(wb):
+    """Apply formatting and formulas to the output Excel workbook."""
     ws = wb.active
     max_col = ws.max_column
     max_row = ws.max_row
@@ -386,20 +310,20 @@ def apply_excel_formatting_and_formulas(output_file):
     apply_row_sum_formulas(ws, max_row, max_col, total_rooms_row, total_camping_row)
     apply_formatting(ws, max_col, max_row, total_rooms_row, total_camping_row)
 
-    wb.save(output_file)
-
 
-def per_nat_stage1(input_file, output_file):
-    """Process reservations and generate the output Excel file."""
+def per_nat_stage1(input_file, output_file=None):
+    """Process reservations and return the output Excel workbook, saved to the output file when one is given."""
     logger.info("#######################################################")
     logger.info(f"Running Per Nationality Stage 1 with {input_file=} .....")
     df, headers = load_and_prepare_data(input_file)
     df = format_dates(df)
     split_index = find_camping_first_index(df)
     df = insert_totals_and_spacing(df, split_index)
-    df.to_excel(output_file, index=False, engine='openpyxl')
-    apply_excel_formatting_and_formulas(output_file)
+    wb = settle_book(frame_to_book(df, index=False))
+    apply_excel_formatting_and_formulas(wb)
+    save_book(wb, output_file)
     logger.info(f"Per Nationality Stage 1 completed. File saved as {output_file}")
+    return wb
 
 
 if __name__ == "__main__":
@@ -1,24 +1,13 @@
-import re
-
 import pandas as pd
-from openpyxl import load_workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+import season_store
 from logger import logger
+from sheet_numbers import NumberBlock
+from workbook_io import frame_to_book, save_book, settle_book
 
 DO_CALCULATIONS = False
 
 # Constants
-GREEK_DAYS = {
-    "Mon": "Δευ", "Tue": "Τρι", "Wed": "Τετ", "Thu": "Πεμ",
-    "Fri": "Παρ", "Sat": "Σαβ", "Sun": "Κυρ"
-}
-
-DAY_COLORS = {
-    "Παρ": "ADD8E6",  # Light Blue (Friday)
-    "Σαβ": "90EE90",  # Light Green (Saturday)
-    "Κυρ": "FFB6C1"  # Light Pink (Sunday)
-}
-
 YELLOW_FILL = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
 THIN_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'),
                      top=Side(style='thin'), bottom=Side(style='thin'))
@@ -26,36 +15,15 @@ THIN_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'),
 MONTHS = ["Apr", "May", "Jun", "Jul", "Aug", "Sep"]
 
 
-def load_and_prepare_data(input_file):
-    """Load data from Excel and prepare it for processing."""
-    df = pd.read_excel(input_file, header=None)
-    headers = df.iloc[0]
-    df = df[1:].reset_index(drop=True)
-    df.columns = headers
-    if "Capacity" in df.columns:
-        df = df.drop(columns=["Capacity"])
-    return df, headers
-
-
-def format_date_column(col):
-    """Format a single date column into Greek day and date."""
-    try:
-        date = pd.to_datetime(col, dayfirst=True, errors="coerce")
-        if pd.notna(date):
-            greek_day = GREEK_DAYS.get(date.strftime("%a"), date.strftime("%a"))
-            return f"{greek_day} {date.strftime('%d/%m')}"
-        else:
-            return col
-    except Exception:
-        return col
-
-
-def format_dates(df):
-    """Format all date columns in the DataFrame."""
-    date_columns = df.columns[1:]
-    formatted_columns = [df.columns[0]] + [format_date_column(col) for col in date_columns]
-    df.columns = formatted_columns
-    return df
+def store_previous_year(input_file, year):
+    """Put a previous year availabilityPerNationality export in the season store (read only when its content is new)."""
+    return season_store.ingest(input_file, "nat", year)
+
+
+def load_and_prepare_data(season):
+    """Load the categories of a stored season, one row per row of the export, without the day columns."""
+    category_label, _ = season_store.season_labels(season)
+    return pd.DataFrame({category_label: [category for category, _ in season_store.season_categories(season)]})
 
 
 def find_camping_first_index(df):
@@ -82,50 +50,43 @@ def insert_totals_and_spacing(df, split_index, year):
 def apply_column_sum_formulas(ws, total_rooms_row, total_camping_row, max_col):
     if DO_CALCULATIONS:
         """Calculate column sums directly and insert the values instead of formulas."""
-        for col in range(2, max_col + 2):
-            column_values = [
-                ws.cell(row=row, column=col).value for row in range(2, total_rooms_row)
-                if isinstance(ws.cell(row=row, column=col).value, (int, float))
-            ]
+        block = NumberBlock(ws, 2, ws.max_row, 2, max_col + 1)
+        rooms_sums = block.column_totals(2, total_rooms_row - 1)
+        camping_sums = block.column_totals(total_rooms_row + 2, total_camping_row - 1)
 
+        for col in range(2, max_col + 2):
             if total_rooms_row:
-                ws.cell(row=total_rooms_row, column=col).value = sum(column_values)
-
-            column_values_camping = [
-                ws.cell(row=row, column=col).value for row in range(total_rooms_row + 2, total_camping_row)
-                if isinstance(ws.cell(row=row, column=col).value, (int, float))
-            ]
+                ws.cell(row=total_rooms_row, column=col).value = rooms_sums[col]
 
             if total_camping_row:
-                ws.cell(row=total_camping_row, column=col).value = sum(column_values_camping)
+                ws.cell(row=total_camping_row, column=col).value = camping_sums[col]
 
 
-def apply_row_sum_formulas(ws, max_row, max_col, total_rooms_row, total_camping_row, year):
+def apply_row_sum_formulas(ws, max_row, max_col, total_rooms_row, total_camping_row, year, row_nights,
+                           row_month_nights):
     """Apply Excel formulas to calculate row sums and percentages."""
     total_column = max_col + 1
     percent_column = total_column + 1  # "Percent to Total" column
 
     # Add the "Total" column
-    add_total_column(ws, max_row, max_col, total_column, total_rooms_row, total_camping_row, year=year)
+    add_total_column(ws, max_row, max_col, total_column, total_rooms_row, total_camping_row, year=year,
+                     row_nights=row_nights)
 
     # Add the "Percent to Total" column
     # add_percentage_column(ws, max_row, total_column, percent_column, total_rooms_row, total_camping_row, year=year)
 
-    add_monthly_sums(ws, max_row, total_column, percent_column, total_rooms_row, total_camping_row, year=year)
+    add_monthly_sums(ws, max_row, total_column, percent_column, total_rooms_row, total_camping_row, year=year,
+                     row_month_nights=row_month_nights)
 
 
-def add_total_column(ws, max_row, max_col, total_column, total_rooms_row, total_camping_row, year):
-    """Add a 'Total' column and calculate row sums directly in Python."""
+def add_total_column(ws, max_row, max_col, total_column, total_rooms_row, total_camping_row, year, row_nights):
+    """Add a 'Total' column with the season sum of every row, {row: nights} as summed by the season store."""
     ws.cell(row=1, column=total_column).value = f"Total {year}"
     ws.cell(row=1, column=total_column).font = Font(bold=True)
 
     for row in range(2, max_row + 1):
-        # Compute sum of numeric values in the row
-        row_sum = sum(
-            ws.cell(row=row, column=col).value or 0
-            for col in range(2, max_col + 1)
-            if isinstance(ws.cell(row=row, column=col).value, (int, float))
-        )
+        # Total and separator rows are not in the export and get a sum of 0
+        row_sum = row_nights.get(row, 0)
         ws.cell(row=row, column=total_column).value = row_sum
         ws.cell(row=row, column=total_column).fill = YELLOW_FILL
         ws.cell(row=row, column=total_column).font = Font(bold=True)
@@ -157,47 +118,25 @@ def add_percentage_column(ws, max_row, total_column, percent_column, total_rooms
         ws.column_dimensions[ws.cell(row=1, column=percent_column).column_letter].width = 15
 
 
-def add_monthly_sums(ws, max_row, total_column, separator_column_2, total_rooms_row, total_camping_row, year):
-    """Add monthly sum columns and calculate their sums directly in Python."""
-    month_ranges = find_monthly_column_ranges(ws, total_column)
+def add_monthly_sums(ws, max_row, total_column, separator_column_2, total_rooms_row, total_camping_row, year,
+                     row_month_nights):
+    """
+    Add monthly sum columns, {month number: {row: nights}} as summed by the season store,
+    for the months the season has days in.
+    """
     month_start_col = separator_column_2 + 1  # Start after the second separator
 
     for i, month in enumerate(MONTHS):
         month_col = month_start_col + i
         ws.cell(row=1, column=month_col).value = f"{month} {year}"  # Include year in header
         ws.cell(row=1, column=month_col).font = Font(bold=True)
-        ws.column_dimensions[ws.cell(row=1, column=month_col).column_letter].width = 12
-
-        if month in month_ranges:
-            start_col, end_col = month_ranges[month]
+        # No width is set: per_nat_stage3 copies the widths of these columns and the plan keeps the default one
 
+        month_number = i + 4  # "Apr" = 4, "May" = 5, etc.
+        if month_number in row_month_nights:
             for row in range(2, max_row + 1):
                 if row not in [total_rooms_row, total_camping_row]:
-                    # Compute sum of numeric values in the row for the given month's range
-                    values = [
-                        ws.cell(row=row, column=col).value or 0
-                        for col in range(start_col, end_col + 1)
-                        if isinstance(ws.cell(row=row, column=col).value, (int, float))
-                    ]
-                    monthly_sum = sum(values)
-
-                    ws.cell(row=row, column=month_col).value = monthly_sum
-
-
-def find_monthly_column_ranges(ws, total_column):
-    """Find the first and last column for each month."""
-    month_ranges = {}
-    for col in range(2, total_column):
-        header_value = ws.cell(row=1, column=col).value
-        if header_value:
-            for i, month in enumerate(MONTHS):
-                month_number = str(i + 4).zfill(2)  # "Apr" = 04, "May" = 05, etc.
-                if header_value.endswith(f'/{month_number}'):
-                    if month not in month_ranges:
-                        month_ranges[month] = [col, col]
-                    else:
-                        month_ranges[month][1] = col
-    return month_ranges
+                    ws.cell(row=row, column=month_col).value = row_month_nights[month_number].get(row, 0)
 
 
 def add_separator_column(ws, max_row, separator_column):
@@ -214,15 +153,6 @@ def apply_formatting(ws, max_col, max_row, total_rooms_row, total_camping_row):
         cell.font = Font(bold=True)
         cell.alignment = Alignment(horizontal='center')
 
-    for col_num in range(2, max_col + 1):
-        column_title = ws.cell(row=1, column=col_num).value
-        if column_title:
-            day_part = column_title.split(" ")[0]
-            if day_part in DAY_COLORS:
-                ws.cell(row=1, column=col_num).fill = PatternFill(
-                    start_color=DAY_COLORS[day_part], end_color=DAY_COLORS[day_part], fill_type="solid"
-                )
-
     for row in [total_rooms_row, total_camping_row]:
         if row:
             for col in range(1, max_col + 2):
@@ -236,9 +166,16 @@ def apply_formatting(ws, max_col, max_row, total_rooms_row, total_camping_row):
     ws.freeze_panes = "B2"
 
 
-def apply_excel_formatting_and_formulas(output_file, year):
-    """Apply formatting and formulas to the output Excel file."""
-    wb = load_workbook(output_file)
+def category_rows(number_of_categories, split_index):
+    """Return {position in the export: sheet row} of the categories, camping below Total Rooms and the empty row."""
+    return {position: position + (2 if position < split_index else 4) for position in range(number_of_categories)}
+
+
+def apply_excel_formatting_and_formulas(wb, season, rows, alignment="date"):
+    """
+    Apply formatting and formulas to the output Excel workbook, the sums of the categories at
+    rows ({position: sheet row}) queried from the season store.
+    """
     ws = wb.active
     max_col = ws.max_column
     max_row = ws.max_row
@@ -251,34 +188,42 @@ def apply_excel_formatting_and_formulas(output_file, year):
         elif cell_value == f"Total Camping":
             total_camping_row = row
 
+    row_nights = {rows[position]: nights for position, nights in season_store.category_nights(season).items()}
+    row_month_nights = {month: {rows[position]: nights for position, nights in month_nights.items()}
+                        for month, month_nights in season_store.monthly_nights(season, alignment).items()}
+
     apply_column_sum_formulas(ws, total_rooms_row, total_camping_row, max_col)
-    apply_row_sum_formulas(ws, max_row, max_col, total_rooms_row, total_camping_row, year=year)
+    apply_row_sum_formulas(ws, max_row, max_col, total_rooms_row, total_camping_row, year=season.year,
+                           row_nights=row_nights, row_month_nights=row_month_nights)
     apply_formatting(ws, max_col, max_row, total_rooms_row, total_camping_row)
 
-    # **Find and remove only columns with "Παρ 02/05" or "Fri 02/05" format**
-    date_pattern = re.compile(r"^(Δευ|Τρι|Τετ|Πεμ|Παρ|Σαβ|Κυρ|Mon|Tue|Wed|Thu|Fri|Sat|Sun) \d{2}/\d{2}$")
-    date_cols = [
-        col for col in range(2, ws.max_column + 1)
-        if isinstance(ws.cell(row=1, column=col).value, str) and date_pattern.match(ws.cell(row=1, column=col).value)
-    ]
-
-    # **Drop detected date columns LAST without affecting structure**
-    for col in reversed(date_cols):  # Delete from right to left to avoid shifting issues
-        ws.delete_cols(col)
 
-    wb.save(output_file)
-
-
-def per_nat_stage2(input_file, output_file, year):
-    """Process reservations and generate the output Excel file."""
-    logger.info(f'Starting with Stage 6. Year: {year}. Input File: {input_file}')
-    df, headers = load_and_prepare_data(input_file)
-    df = format_dates(df)
+def season_book(season, alignment="date"):
+    """
+    Return the Stage 2 workbook of a stored nationality season: every category with its season total and
+    its monthly sums, all summed by the season store.
+    alignment ("date" or "weekday") decides in which month of the current season every day of the year is summed.
+    """
+    df = load_and_prepare_data(season)
     split_index = find_camping_first_index(df)
-    df = insert_totals_and_spacing(df, split_index, year=year)
-    df.to_excel(output_file, index=False, engine='openpyxl')
-    apply_excel_formatting_and_formulas(output_file, year=year)
+    rows = category_rows(len(df), split_index)
+    df = insert_totals_and_spacing(df, split_index, year=season.year)
+    wb = settle_book(frame_to_book(df, index=False))
+    apply_excel_formatting_and_formulas(wb, season, rows, alignment=alignment)
+    return wb
+
+
+def per_nat_stage2(input_file, output_file, year, alignment="date"):
+    """
+    Store a previous year export in the season store and return the output Excel workbook built from it,
+    saved to the output file unless it is None.
+    alignment ("date" or "weekday") decides in which month of the current season every day of the year is summed.
+    """
+    logger.info(f'Starting with Stage 6. Year: {year}. Input File: {input_file}')
+    wb = season_book(store_previous_year(input_file, year), alignment=alignment)
+    save_book(wb, output_file)
     logger.info(f'Stage 6 completed. File saved as {output_file}')
+    return wb
 
 
 if __name__ == "__main__":
@@ -1,10 +1,17 @@
+from bisect import bisect_right
+
 import openpyxl
 from openpyxl.styles import PatternFill, Font, Border, Alignment
 from logger import logger
+from per_nat_stage2 import season_book, store_previous_year
+from workbook_io import load_book, save_book
+
+
+SEPARATOR_ROW = "sep_row"  # Marks the empty row between the Rooms and the Camping sections
 
 
 def load_stage5_data(stage5_file):
-    wb5 = openpyxl.load_workbook(stage5_file)
+    wb5 = load_book(stage5_file)
     ws5 = wb5.active
     countries_stage5 = {ws5.cell(row=row, column=1).value: row for row in range(2, ws5.max_row + 1) if
                         ws5.cell(row=row, column=1).value}
@@ -12,7 +19,7 @@ def load_stage5_data(stage5_file):
 
     if empty_row:
         for col in range(1, ws5.max_column + 1):
-            ws5.cell(row=empty_row, column=col, value="sep_row")
+            ws5.cell(row=empty_row, column=col, value=SEPARATOR_ROW)
 
     # Get the header row (first row)
     header = [ws5.cell(row=1, column=col).value for col in range(1, ws5.max_column + 1)]
@@ -20,51 +27,50 @@ def load_stage5_data(stage5_file):
     return wb5, ws5, countries_stage5, empty_row, header
 
 
-def insert_separator_column(ws5, max_col):
+def insert_separator_column(ws5, max_col, rows):
     max_col += 1
-    for row in range(1, ws5.max_row + 1):
+    for row in rows:
         ws5.cell(row=row, column=max_col).fill = PatternFill(start_color="000000", end_color="000000",
                                                              fill_type="solid")
     return max_col
 
 
-def insert_country_row(ws5, country, countries_stage5):
-    total_rooms_row = countries_stage5.get("Total Rooms", ws5.max_row + 1)
-    total_camping_row = countries_stage5.get("Total Camping", ws5.max_row + 1)
-
-    # Determine where the country should go
-    if "Camping" in country:
-        insert_before = total_camping_row  # Camping nationalities should be before "Total Camping"
-    else:
-        insert_before = total_rooms_row  # Room nationalities should be before "Total Rooms"
-
-    # Find the correct insertion point
-    target_row = None
-    sorted_countries = sorted((c, r) for c, r in countries_stage5.items() if c and "Total" not in c)
-
-    for existing_country, row in sorted_countries:
-        if row >= insert_before:
-            break
-        if existing_country and country < existing_country:
-            target_row = row
-            break
-
-    if target_row is None:
-        target_row = insert_before  # Default to inserting above "Total Rooms" or "Total Camping"
-
-    ws5.insert_rows(target_row)
-    ws5.cell(row=target_row, column=1, value=country)
-
-    # Recalculate index mapping
-    new_mapping = {}
-    for row in range(2, ws5.max_row + 1):
-        cell_value = ws5.cell(row=row, column=1).value
-        if cell_value:
-            new_mapping[cell_value] = row
-    countries_stage5.clear()
-    countries_stage5.update(new_mapping)
-
-    return target_row
+def join_countries(names, countries):
+    """
+    Outer join of the sheet's first column (row 2 onwards) with the countries of a previous year.
+    Returns {index in names: missing countries to insert before it}; a missing country goes into its
+    Rooms/Camping section before the alphabetically next nationality, or before the section total.
+    """
+    positions = {name: index for index, name in enumerate(names)}
+    missing = sorted({country for country in countries if country is not None and country not in positions})
+
+    insertions = {}
+    for section_total, camping in (("Total Rooms", False), ("Total Camping", True)):
+        section_end = positions.get(section_total, len(names))
+        candidates = sorted((name, index) for index, name in enumerate(names[:section_end])
+                            if name and "Total" not in name and name != SEPARATOR_ROW
+                            and ("Camping" in name) == camping)
+        candidate_names = [name for name, _ in candidates]
+        for country in missing:
+            if ("Camping" in country) != camping:
+                continue
+            next_candidate = bisect_right(candidate_names, country)
+            before = candidates[next_candidate][1] if next_candidate < len(candidates) else section_end
+            insertions.setdefault(before, []).append(country)
+    return insertions
+
+
+def move_rows(ws, row_order):
+    """Put the cells of row_order[i] (a row of the sheet, None for a new empty row) in row i + 1, all at once."""
+    cells_by_row = {}
+    for (row, _), cell in ws._cells.items():
+        cells_by_row.setdefault(row, []).append(cell)
+    cells = {}
+    for new_row, row in enumerate(row_order, start=1):
+        for cell in cells_by_row.get(row, ()):
+            cell.row = new_row
+            cells[(new_row, cell.column)] = cell
+    ws._cells = cells
 
 
 def copy_cell_styles(source_cell, target_cell):
@@ -99,40 +105,56 @@ def copy_cell_styles(source_cell, target_cell):
     target_cell.number_format = source_cell.number_format
 
 
-def append_stage6_to_stage5(stage5_file, stage6_files, output_file):
-    wb5, ws5, countries_stage5, empty_row, header_stage5 = load_stage5_data(stage5_file)
+def append_stage6_to_stage5(stage5_file, previous_seasons, output_file=None, alignment="date"):
+    """
+    Append the nationalities of the previous years (seasons of the season store) to the current year sheet.
+    The Total and monthly sums of every previous year are queried from the store, in the sheet layout of stage 2.
+    """
+    wb5, ws5, _, _, header_stage5 = load_stage5_data(stage5_file)
+    stage6_sheets = [season_book(season, alignment).active for season in previous_seasons]
+
+    # Plan the rows of every year first: (row of the sheet or None, first column value, index of the year adding it)
+    rows = [(row, ws5.cell(row=row, column=1).value, -1) for row in range(2, ws5.max_row + 1)]
+    for index, ws6 in enumerate(stage6_sheets):
+        insertions = join_countries([name for _, name, _ in rows],
+                                    [ws6.cell(row=row, column=1).value for row in range(2, ws6.max_row + 1)])
+        joined = []
+        for position, planned_row in enumerate(rows + [None]):
+            joined.extend((None, country, index) for country in insertions.get(position, ()))
+            if planned_row:
+                joined.append(planned_row)
+        rows = joined
+
+    # Write the joined rows once, new nationalities only get their name in the first column
+    move_rows(ws5, [1] + [row for row, _, _ in rows])
+    country_rows = {}
+    for target_row, (row, country, _) in enumerate(rows, start=2):
+        if row is None:
+            ws5.cell(row=target_row, column=1, value=country)
+        if country:
+            country_rows[country] = target_row
 
     max_col = ws5.max_column
-    first_file_processed = False
-
-    for index, stage6_file in enumerate(stage6_files):
-        wb6 = openpyxl.load_workbook(stage6_file)
-        ws6 = wb6.active
 
+    for index, ws6 in enumerate(stage6_sheets):
         # Retrieve the header of Stage 6
         header_stage6 = [ws6.cell(row=1, column=col).value for col in range(1, ws6.max_column + 1)]
 
         for col, header_value in enumerate(header_stage6, start=max_col + 2):
             ws5.cell(row=1, column=col, value=header_value)
 
-        # Insert separator column and calculate the starting column for the new data
-        max_col = insert_separator_column(ws5, max_col)
+        # Insert separator column over the rows present before this year, and calculate the starting column
+        max_col = insert_separator_column(ws5, max_col, [1] + [target_row for target_row, (_, _, added) in
+                                                               enumerate(rows, start=2) if added < index])
         start_col = max_col + 1
 
+        copied = False
         for row in range(2, ws6.max_row + 1):
             country = ws6.cell(row=row, column=1).value
             if country is None:
                 continue  # Skip None values
 
-            # Find or insert the country row in Stage 5
-            if first_file_processed:
-                # After the first file, use the first empty row
-                target_row = countries_stage5.get(country) or insert_country_row(ws5, country, countries_stage5,
-                                                                                 )
-            else:
-                # In the first file, proceed as before (insert based on the existing order)
-                target_row = countries_stage5.get(country) or insert_country_row(ws5, country, countries_stage5,
-                                                                                 )
+            target_row = country_rows[country]
 
             # Copy the values and styles from Stage 6 to Stage 5
             for col in range(1, ws6.max_column + 1):
@@ -140,35 +162,39 @@ def append_stage6_to_stage5(stage5_file, stage6_files, output_file):
                 target_cell = ws5.cell(row=target_row, column=start_col + (col - 1))
                 target_cell.value = source_cell.value
                 copy_cell_styles(source_cell, target_cell)
+            copied = True
+
+        if copied:
+            for col in range(1, ws6.max_column + 1):
                 ws5.column_dimensions[
                     openpyxl.utils.get_column_letter(start_col + (col - 1))].width = ws6.column_dimensions.get(
                     openpyxl.utils.get_column_letter(col),
                     ws5.column_dimensions[openpyxl.utils.get_column_letter(start_col + (col - 1))]).width
 
-        # Recalculate the country row indexes after processing the file
-        countries_stage5.clear()
-        for row in range(2, ws5.max_row + 1):
-            cell_value = ws5.cell(row=row, column=1).value
-            if cell_value:
-                countries_stage5[cell_value] = row
-
         # Update the `max_col` after processing each Stage 6 file to set the starting column for the next file
         max_col = ws5.max_column
 
     # Save the output file after all Stage 6 files are processed
-    wb5.save(output_file)
+    return save_book(wb5, output_file)
 
 
-def per_nat_stage3(stage5_path, stage6_paths, output_path):
+def per_nat_stage3(stage5_path, previous_seasons, output_path=None, alignment="date"):
+    """
+    Join the previous years (seasons of the season store) to the current year sheet and return the workbook.
+    alignment ("date" or "weekday") decides in which month of the current season every day of a previous year
+    is summed.
+    """
     logger.info(f'Starting with Per Nationality Stage 3')
-    append_stage6_to_stage5(stage5_path, stage6_paths, output_path)
+    wb = append_stage6_to_stage5(stage5_path, previous_seasons, output_path, alignment=alignment)
     logger.info(f'Per Nationality Stage 3 completed. File saved as {output_path}')
+    return wb
 
 
 if __name__ == '__main__':
     stage5_path = "per_nat_stage1_output.xlsx"
-    stage6_paths = ["per_nat_stage2_output_2024.xlsx",
-                    "per_nat_stage2_output_2023.xlsx", ]  # Add all Stage 6 files here
+    previous_year_paths = {2024: "sources/availabilityPerNationality2024.xls",
+                           2023: "sources/availabilityPerNationality2023.xls"}  # Add all previous years here
     output_path = "per_nat_stage3_output.xlsx"
 
-    append_stage6_to_stage5(stage5_path, stage6_paths, output_path)
+    previous_seasons = [store_previous_year(path, year) for year, path in previous_year_paths.items()]
+    append_stage6_to_stage5(stage5_path, previous_seasons, output_path)
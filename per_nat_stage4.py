@@ -1,70 +1,66 @@
-import openpyxl
 import re
 from datetime import datetime
+from column_plan import ColumnPlan
+from header_calendar import month_header_date
 from logger import logger
-
-
-def extract_date(header):
-    """Extracts datetime object from headers like 'Apr 2025'."""
-    if not isinstance(header, str):
-        return None
-    try:
-        return datetime.strptime(header, '%b %Y')
-    except ValueError:
-        return None
-
-
-def get_headers(ws):
-    """Returns a list of headers from the worksheet."""
-    return [ws.cell(row=1, column=col).value for col in range(1, ws.max_column + 1)]
+from workbook_io import load_book, save_book
 
 
 def identify_date_columns(headers, current_year):
     """Identifies columns with 'Month Year' format for the current year."""
-    return [(col, h, extract_date(h)) for col, h in enumerate(headers, start=1) if
-            extract_date(h) and extract_date(h).year == current_year]
-
-
-def insert_empty_columns_for_months_prev_years(ws, date_columns, number_of_previous_year_data):
-    """Inserts empty columns after each identified date column."""
-    for offset, (col, header, _) in enumerate(date_columns):
-        insert_col = col + offset * number_of_previous_year_data + 1
-        for _ in range(number_of_previous_year_data):
-            ws.insert_cols(insert_col)
-
-
-def move_previous_years_months_sums(ws, number_of_previous_year_data, current_year):
-    """Moves previous years' data into the created empty columns and deletes the original columns."""
-    headers = get_headers(ws)
-
-    for month in range(1, 13):
-        month_name = datetime(current_year, month, 1).strftime('%b')
-        latest_header = f"{month_name} {current_year}"
-        if latest_header not in headers:
-            continue
-
-        latest_col = headers.index(latest_header) + 1
+    dates = [(col, h, month_header_date(h)) for col, h in enumerate(headers, start=1)]
+    return [(col, h, date) for col, h, date in dates if date and date.year == current_year]
+
+
+def first_columns(labels):
+    """Return {label: index of its first occurrence} of a list of column labels."""
+    columns = {}
+    for index, label in enumerate(labels):
+        if label is not None:
+            columns.setdefault(label, index)
+    return columns
+
+
+def months_with_previous_years(headers, date_columns, number_of_previous_year_data, current_year):
+    """
+    Returns {current year month column: the previous years' columns of that month}, one per year counted back
+    from the current one and None where that year has no such month; these fill the empty columns after the month.
+    """
+    columns = first_columns(headers)
+    months = {}
+    for col, header, date in date_columns:
+        month_name = date.strftime('%b')
+        months[col] = [None] * number_of_previous_year_data
+        if columns.get(f"{month_name} {current_year}") != col - 1:
+            continue  # Only the first column of a month gets the previous years, like headers.index found
 
         for year_offset in range(1, number_of_previous_year_data + 1):
-            prev_year = current_year - year_offset
-            prev_header = f"{month_name} {prev_year}"
-            if prev_header not in headers:
-                continue
-
-            prev_col = headers.index(prev_header) + 1
-            ws.move_range(
-                f"{openpyxl.utils.get_column_letter(prev_col)}1:{openpyxl.utils.get_column_letter(prev_col)}{ws.max_row}",
-                cols=(latest_col + year_offset - prev_col))
-            ws.delete_cols(prev_col)
-            headers = get_headers(ws)
+            prev_col = columns.get(f"{month_name} {current_year - year_offset}")
+            if prev_col is not None:
+                months[col][year_offset - 1] = prev_col + 1
+    return months
+
+
+def order_months_with_previous_years(column_count, months):
+    """
+    Orders the columns with the previous years' months moved into the empty columns after each current year month,
+    in place of ws.insert_cols, ws.move_range and ws.delete_cols.
+    """
+    moved = {col for prev_cols in months.values() for col in prev_cols if col}
+    order = []
+    for col in range(1, column_count + 1):
+        if col in moved:
+            continue
+        order.append(col)
+        order.extend(months.get(col, ()))
+    return order
 
 
-def find_total_column_from_first_prev_year(ws):
+def find_total_column_from_first_prev_year(headers):
     """Finds all 'Total YYYY' columns after the second occurrence of 'Category'."""
     category_count = 0
     total_columns = []
-    for col in range(1, ws.max_column + 1):
-        cell_value = ws.cell(row=1, column=col).value
+    for col, cell_value in enumerate(headers, start=1):
         if cell_value == "Category":
             category_count += 1
             continue
@@ -73,73 +69,103 @@ def find_total_column_from_first_prev_year(ws):
     return total_columns
 
 
-def insert_total_columns_current_and_the_rest_prev_years(ws, total_columns, number_of_previous_year_data, current_year,
-                                                         previous_years):
-    """Repositions existing 'Total YYYY' columns instead of inserting new ones."""
-    if not total_columns:
-        return
-
-    first_total_col = total_columns[0][0]
+def order_total_columns_current_and_the_rest_prev_years(order, labels, total_columns, number_of_previous_year_data,
+                                                        current_year, previous_years):
+    """
+    Orders a new 'Total current_year' column before the first previous year's total and the rest of the
+    previous years' totals right after it. Like ws.move_range, a moved total replaces the column it lands on
+    and leaves its own column empty. Returns the index of the new column.
+    """
+    first_total = total_columns[0][0] - 1
 
     # Insert a new column for "Total {current_year}"
-    ws.insert_cols(first_total_col)
-    ws.cell(row=1, column=first_total_col).value = f"Total {current_year}"
+    order.insert(first_total, None)
+    labels.insert(first_total, f"Total {current_year}")
+    columns = first_columns(labels)
 
     # Move existing "Total YYYY" columns for previous years
-    extra_index = 2
-    previous_year_index = 1
-    for _ in range(number_of_previous_year_data - 1):
-        previous_total_header = f"Total {previous_years[previous_year_index]}"
-        headers = get_headers(ws)
-
-        if previous_total_header in headers:
-            prev_col = headers.index(previous_total_header) + 1
-            ws.move_range(
-                f"{openpyxl.utils.get_column_letter(prev_col)}1:"
-                f"{openpyxl.utils.get_column_letter(prev_col)}{ws.max_row}",
-                cols=(first_total_col + extra_index - prev_col)
-            )
-            headers = get_headers(ws)  # Update headers after movement
-        else:
+    for extra_index, previous_year in enumerate(previous_years[1:number_of_previous_year_data], start=2):
+        previous_total_header = f"Total {previous_year}"
+        if previous_total_header not in columns:
             logger.info(f"Warning: {previous_total_header} not found, skipping.")
+            continue
 
-        previous_year_index += 1
-        extra_index += 1
-
-
-def drop_total_current_year_column_first_occurance(ws, current_year):
-    """Drops the first occurrence of the column with header 'Total current_year'."""
-    headers = get_headers(ws)
+        prev_index = columns[previous_total_header]
+        target = first_total + extra_index
+        if prev_index == target:
+            continue
+        while len(order) <= target:
+            order.append(None)
+            labels.append(None)
+        if columns.get(labels[target]) == target:
+            del columns[labels[target]]  # Replaced by the move
+        order[target], labels[target] = order[prev_index], labels[prev_index]
+        order[prev_index] = labels[prev_index] = None
+        columns[previous_total_header] = target
+    return first_total
+
+
+def drop_total_current_year_column_first_occurance(order, labels, new_total, current_year):
+    """
+    Drops the first occurrence of the column with header 'Total current_year'.
+    Returns the index of the new total afterwards, None when it was the one dropped.
+    """
     total_header = f"Total {current_year}"
-    if total_header in headers:
-        total_col = headers.index(total_header) + 1
-        ws.delete_cols(total_col)
-        logger.info(f"Dropped first occurrence of column: {total_header} at position {total_col}")
-    else:
+    total_index = first_columns(labels).get(total_header)
+    if total_index is None:
         logger.info(f"Column {total_header} not found, no deletion performed.")
+        return new_total
+
+    del order[total_index]
+    del labels[total_index]
+    logger.info(f"Dropped first occurrence of column: {total_header} at position {total_index + 1}")
+    if new_total is None or total_index == new_total:
+        return None
+    return new_total - 1 if total_index < new_total else new_total
+
+
+def final_column_order(headers, column_count, number_of_previous_year_data, current_year, previous_years):
+    """
+    Returns the Stage 8 column order of a Stage 7 sheet with these headers: its columns (1-based) left to right,
+    None for an empty column, and the index of the new 'Total current_year' column (None when there is none).
+    """
+    date_columns = identify_date_columns(headers, current_year)
+    months = months_with_previous_years(headers, date_columns, number_of_previous_year_data, current_year)
+    order = order_months_with_previous_years(column_count, months)
+    labels = [headers[col - 1] if col and col <= len(headers) else None for col in order]
+
+    new_total = None
+    total_columns = find_total_column_from_first_prev_year(labels)
+    if total_columns:
+        new_total = order_total_columns_current_and_the_rest_prev_years(
+            order, labels, total_columns, number_of_previous_year_data, current_year, previous_years)
+    new_total = drop_total_current_year_column_first_occurance(order, labels, new_total, current_year)
+    return order, new_total
 
 
 def process_per_nat_stage4(per_nat_stage3_output, output_file, number_of_previous_year_data, previous_years):
-    """Processes Stage 8 by inserting empty columns, moving data, and adjusting total columns."""
-    wb = openpyxl.load_workbook(per_nat_stage3_output)
+    """
+    Processes Stage 8 by inserting empty columns, moving data, and adjusting total columns.
+    The final column order is computed once from the headers and the cells are moved once.
+    """
+    wb = load_book(per_nat_stage3_output)
     ws = wb.active
     current_year = datetime.now().year
+    plan = ColumnPlan(ws)
 
-    headers = get_headers(ws)
-    date_columns = identify_date_columns(headers, current_year)
-    insert_empty_columns_for_months_prev_years(ws, date_columns, number_of_previous_year_data)
-    move_previous_years_months_sums(ws, number_of_previous_year_data, current_year)
-    total_columns = find_total_column_from_first_prev_year(ws)
-    insert_total_columns_current_and_the_rest_prev_years(ws, total_columns, number_of_previous_year_data, current_year,
-                                                         previous_years)
-    drop_total_current_year_column_first_occurance(ws, current_year)
+    order, new_total = final_column_order(plan.headers(), len(plan.columns), number_of_previous_year_data,
+                                          current_year, previous_years)
+    plan.reorder(order)
+    if new_total is not None:
+        plan.set_value(1, new_total + 1, f"Total {current_year}")
+    plan.apply()
 
-    wb.save(output_file)
+    return save_book(wb, output_file)
 
 
 def per_nat_stage4(per_nat_stage3_output, output_path, previous_years, number_of_previous_year_data):
     """Entry point for Stage 8 processing."""
-    process_per_nat_stage4(per_nat_stage3_output=per_nat_stage3_output, output_file=output_path,
+    return process_per_nat_stage4(per_nat_stage3_output=per_nat_stage3_output, output_file=output_path,
                            number_of_previous_year_data=number_of_previous_year_data, previous_years=previous_years)
 
 
@@ -1,7 +1,8 @@
-import openpyxl
 from openpyxl.styles import PatternFill
 from datetime import datetime
 from logger import logger
+from sheet_index import SheetIndex
+from workbook_io import load_book, save_book
 
 
 def get_headers(ws):
@@ -21,101 +22,79 @@ def delete_columns_after_category(ws, last_category_index):
         ws.delete_cols(last_category_index + 1, ws.max_column - last_category_index)
         logger.info(f"Deleted columns from index {last_category_index + 1} onward.")
 
-def add_percentage_columns(ws, previous_years):
-    """Adds 'Percent to Total YYYY' columns for the current year and given previous years."""
-    headers = get_headers(ws)
-    last_col = len(headers) + 1  # Insert after the last existing column
-    current_year = datetime.now().year
+def plan_appended_columns(current_year, previous_years):
+    """
+    Returns the headers of the columns Stage 9 appends after the last column, left to right:
+    'Percent to Total YYYY' for the current and the previous years, a separator ("" header),
+    'Percent difference current_year - previous_year' for the previous years and a final separator.
+    """
     all_years = [current_year] + previous_years  # Include current year first
+    return ([f"Percent to Total {year}" for year in all_years] + [""]
+            + [f"Percent difference {current_year} - {prev_year}" for prev_year in previous_years] + [""])
 
-    for index, year in enumerate(all_years):
-        ws.insert_cols(last_col + index)
-        ws.cell(row=1, column=last_col + index).value = f"Percent to Total {year}"
-
-    logger.info(f"Added 'Percent to Total' columns for: {all_years}")
-
-    return last_col + len(all_years)  # Return the next available column index
-
-def find_and_replace_percent_to_total_column(ws, current_year):
+def write_appended_columns(index, first_col, headers):
     """
-    Finds the first occurrence of the column 'Percent to Total {current_year}',
-    replaces it with a black-filled separator, and returns the next available column index.
+    Writes the planned headers from first_col onward. Nothing is right of them, so every column is written
+    in place instead of shifting the sheet with insert_cols. Returns the separator columns.
     """
-    headers = get_headers(ws)
-    target_header = f"Percent to Total {current_year}"
-
-    for col in range(1, len(headers) + 1):
-        if ws.cell(row=1, column=col).value == target_header:
-            # Replace the header with an empty string
-            ws.cell(row=1, column=col).value = ""
-
-            # Fill the entire column with black
-            black_fill = PatternFill(start_color="000000", end_color="000000", fill_type="solid")
-            for row in range(1, ws.max_row + 1):
-                ws.cell(row=row, column=col).fill = black_fill
+    for offset, header in enumerate(headers):
+        index.set_header(first_col + offset, header)
+    return [first_col + offset for offset, header in enumerate(headers) if header == ""]
 
-            logger.info(f"Replaced '{target_header}' column at position {col} with a black-filled separator.")
-            return col + 1  # Return the next available column index
+def find_percent_to_total_column(index, current_year):
+    """Finds the first occurrence of the column 'Percent to Total {current_year}', which becomes a separator."""
+    target_header = f"Percent to Total {current_year}"
+    col = index.column(target_header)
 
-    logger.info(f"Column '{target_header}' not found.")
-    return None
+    if col is None:
+        logger.info(f"Column '{target_header}' not found.")
+        return None
 
-def add_separator_column(ws, insert_at_col):
-    """Adds a black-filled separator column at the specified position."""
-    ws.insert_cols(insert_at_col)
-    ws.cell(row=1, column=insert_at_col).value = ""  # Keeping the header empty
+    # Replace the header with an empty string
+    index.set_header(col, "")
+    logger.info(f"Replaced '{target_header}' column at position {col} with a black-filled separator.")
+    return col
 
+def fill_separator_columns(ws, separator_columns):
+    """Fills the separator columns black, every row once."""
     black_fill = PatternFill(start_color="000000", end_color="000000", fill_type="solid")
-
-    for row in range(1, ws.max_row + 1):  # Fill the entire column with black
-        ws.cell(row=row, column=insert_at_col).fill = black_fill
-
-    logger.info(f"Added a black-filled separator column at position {insert_at_col}")
-
-    return insert_at_col + 1  # Return the next available column index
-
-def add_percent_difference_columns(ws, insert_at_col, previous_years):
-    """Adds 'Percent difference current_year - previous_year' columns after the first separator."""
-    current_year = datetime.now().year
-
-    for index, prev_year in enumerate(previous_years):
-        ws.insert_cols(insert_at_col + index)
-        ws.cell(row=1, column=insert_at_col + index).value = f"Percent difference {current_year} - {prev_year}"
-
-    logger.info(f"Added 'Percent difference' columns for: {previous_years}")
-
-    return insert_at_col + len(previous_years)  # Return the next available column index
+    for row in range(1, ws.max_row + 1):
+        for col in separator_columns:
+            ws.cell(row=row, column=col).fill = black_fill
 
 def process_per_nat_stage5(input_file, output_file, previous_years):
     """Processes per_nat_stage5 by deleting columns after 'Category', adding percentage columns, separators, and percent differences."""
     logger.info("#######################################################")
     logger.info(f"Running Stage 9 with {input_file=} - {output_file=} - {previous_years=}")
-    wb = openpyxl.load_workbook(input_file)
+    wb = load_book(input_file)
     ws = wb.active
 
-    headers = get_headers(ws)
+    index = SheetIndex(ws)
 
     """For some magic reason had to remove this.. ? who knows?"""
-    # last_category_index = find_last_category_column(headers)
+    # last_category_index = find_last_category_column(get_headers(ws))
     # delete_columns_after_category(ws, last_category_index)
 
-    next_available_col = add_percentage_columns(ws, previous_years)
-
-    # Add the remaining columns and separators
-    next_available_col = add_separator_column(ws, next_available_col)
-    next_available_col = add_percent_difference_columns(ws, next_available_col, previous_years)
-    add_separator_column(ws, next_available_col)  # Final black separator
-
-    # Find and replace the 'Percent to Total {current_year}' column with a black-filled separator
+    # The appended columns are planned first, then written once
     current_year = datetime.now().year
-    find_and_replace_percent_to_total_column(ws, current_year)
-
-    wb.save(output_file)
+    headers = plan_appended_columns(current_year, previous_years)
+    separator_columns = write_appended_columns(index, ws.max_column + 1, headers)
+    logger.info(f"Added 'Percent to Total' columns for: {[current_year] + previous_years}, "
+                f"'Percent difference' columns for: {previous_years} and separators at {separator_columns}")
+
+    # The first 'Percent to Total {current_year}' column becomes a black-filled separator as well
+    percent_to_total_col = find_percent_to_total_column(index, current_year)
+    if percent_to_total_col is not None:
+        separator_columns.append(percent_to_total_col)
+    fill_separator_columns(ws, separator_columns)
+
+    save_book(wb, output_file)
     logger.info(f"Stage 9 processing complete. Output saved to {output_file}")
+    return wb
 
 def per_nat_stage5(input_path, output_path, previous_years):
     """Entry point for per_nat_stage5 processing."""
-    process_per_nat_stage5(input_file=input_path, output_file=output_path, previous_years=previous_years)
+    return process_per_nat_stage5(input_file=input_path, output_file=output_path, previous_years=previous_years)
 
 if __name__ == '__main__':
     input_path = "stage8_output.xlsx"
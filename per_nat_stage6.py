@@ -1,11 +1,14 @@
 import re
 from datetime import datetime
 
-import openpyxl
 from openpyxl.formatting.rule import ColorScaleRule
 from openpyxl.styles import Font, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter  # Convert column index to Excel letters
+from header_calendar import month_column_ranges
 from logger import logger
+from sheet_index import SheetIndex
+from sheet_styles import fill_ranges
+from workbook_io import load_book, read_values, save_book
 
 
 # Define the months for reference
@@ -14,55 +17,33 @@ MONTHS = ["Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec", "Jan",
 # Define six distinct blue shades for different years
 BLUE_SHADES = ["538DD5", "8DB4E2", "C5D9F1", "4F81BD", "95B3D7", "DCE6F1"]
 
+# The rows fill_date_columns leaves alone, as a conditional formatting formula on the first column
+DATA_ROW_FORMULA = 'AND($A2<>"",$A2<>"pan_pan",$A2<>"sep_row",ISERROR(FIND("Total",$A2)))'
+SEPARATOR_ROW_FORMULA = 'OR($A2="",LOWER(TRIM($A2))="pan_pan",LOWER(TRIM($A2))="sep_row")'
 
-def find_total_current_year_column(ws, total_column):
+
+def find_total_current_year_column(index):
     """Find the column index of 'Total current year'."""
     current_year = datetime.now().year
 
-    for col in range(2, total_column + 1):
-        header_value = ws.cell(row=1, column=col).value
-        col_letter = get_column_letter(col)
-
-        if isinstance(header_value, str) and header_value.strip() == f"Total {current_year}":
-            # logger.info(f"[DEBUG] Found 'Total {current_year}' column at {col_letter} (Excel Col {col})")
-            return col
-
-    logger.info(f"[WARNING] 'Total {current_year}' column not found!")
-    return None
+    col = index.column(f"Total {current_year}")
+    if col is None:
+        logger.info(f"[WARNING] 'Total {current_year}' column not found!")
+    return col
 
 
 def find_monthly_column_ranges(ws, total_column):
     """Find the first and last column for each month based on daily entries."""
-    month_ranges = {}
+    headers = read_values(ws, max_row=1, min_col=2, max_col=total_column)[0]
+    return month_column_ranges(headers, MONTHS, start=2)
 
-    for col in range(2, total_column + 1):
-        header_value = ws.cell(row=1, column=col).value
-        if not isinstance(header_value, str):
-            continue
 
-        for i, month in enumerate(MONTHS):
-            month_number = str(i + 4).zfill(2)  # "Apr" = 04, "May" = 05, etc.
-            if header_value.endswith(f'/{month_number}'):
-                if month not in month_ranges:
-                    month_ranges[month] = [col, col]  # Start and end at the same column
-                else:
-                    month_ranges[month][1] = col  # Update end column
-
-    return month_ranges
-
-
-def find_existing_monthly_columns(ws, total_column):
+def find_existing_monthly_columns(index):
     """Find columns labeled 'Apr current_year', 'May current_year', etc."""
-    monthly_columns = {}
     current_year = datetime.now().year
-
-    for col in range(2, total_column + 1):
-        header_value = ws.cell(row=1, column=col).value
-        if isinstance(header_value, str) and header_value in [f"{month} {current_year}" for month in MONTHS]:
-            monthly_columns[header_value] = col
-            # logger.info(f"[DEBUG] Found '{header_value}' at column {get_column_letter(col)} (Excel Col {col})")
-
-    return monthly_columns
+    headers = sorted((header for header in (f"{month} {current_year}" for month in MONTHS) if index.column(header)),
+                     key=index.column)  # In column order, the order of the SUM in the 'Total current_year' column
+    return {header: index.last_column(header) for header in headers}
 
 
 def should_skip_row(ws, row):
@@ -122,26 +103,19 @@ def insert_total_sums(ws, max_row, monthly_columns, total_current_year_col, tota
             # logger.info(f"[DEBUG] Row {row} (Excel {total_current_year_letter}{row}): {sum_formula}")
 
 
-def add_monthly_sums(ws, max_row, total_column, total_rooms_row, total_camping_row):
+def add_monthly_sums(ws, index, max_row, total_column, total_rooms_row, total_camping_row):
     """Find the necessary columns and insert sum formulas."""
     month_ranges = find_monthly_column_ranges(ws, total_column)
-    monthly_columns = find_existing_monthly_columns(ws, total_column)
-    total_current_year_col = find_total_current_year_column(ws, total_column)
+    monthly_columns = find_existing_monthly_columns(index)
+    total_current_year_col = find_total_current_year_column(index)
 
     insert_monthly_sums(ws, max_row, month_ranges, monthly_columns, total_rooms_row, total_camping_row)
     insert_total_sums(ws, max_row, monthly_columns, total_current_year_col, total_rooms_row, total_camping_row)
 
 
-def find_total_rows(ws):
+def find_total_rows(index):
     """Find the row indices for 'Total Rooms' and 'Total Camping'."""
-    total_rooms_row = total_camping_row = None
-    for row in range(2, ws.max_row + 1):
-        cell_value = ws.cell(row=row, column=1).value
-        if cell_value == "Total Rooms":
-            total_rooms_row = row
-        elif cell_value == "Total Camping":
-            total_camping_row = row
-    return total_rooms_row, total_camping_row
+    return index.last_row("Total Rooms"), index.last_row("Total Camping")
 
 
 def should_stop_summing(ws, row):
@@ -226,23 +200,15 @@ def apply_grid_borders(ws):
             cell.border = thin_border
 
 
-def find_column_by_header(ws, header_name):
-    """Find the column index for a given header."""
-    for col in range(1, ws.max_column + 1):
-        if ws.cell(row=1, column=col).value == header_name:
-            return col
-    return None
-
-
-def calculate_percent_to_total(ws, previous_years):
+def calculate_percent_to_total(ws, index, previous_years):
     """Calculate Percent to Total values."""
     current_year = datetime.now().year
     all_years = [current_year] + previous_years
+    total_rooms_row, total_camping_row = find_total_rows(index)
 
-    for index, year in enumerate(all_years):
-        percent_col = find_column_by_header(ws, f"Percent to Total {year}")
-        total_col = find_column_by_header(ws, f"Total {year}")
-        total_rooms_row, total_camping_row = find_total_rows(ws)
+    for year in all_years:
+        percent_col = index.column(f"Percent to Total {year}")
+        total_col = index.column(f"Total {year}")
 
         if not percent_col or not total_col or (not total_rooms_row and not total_camping_row):
             logger.info("[ERROR] Required columns or rows not found!")
@@ -263,14 +229,14 @@ def calculate_percent_to_total(ws, previous_years):
                     logger.info(f"[DEBUG] {percent_cell.coordinate} = {percent_cell.value}")
 
 
-def calculate_percent_difference(ws, previous_years):
+def calculate_percent_difference(ws, index, previous_years):
     """Calculate Percent Difference current_year - previoous years and apply conditional formatting."""
     current_year = datetime.now().year
 
-    for index, year in enumerate(previous_years):
-        percent_diff_col = find_column_by_header(ws, f"Percent difference {current_year} - {year}")
-        total_current_year_col = find_column_by_header(ws, f"Total {current_year}")
-        total_previous_year_col = find_column_by_header(ws, f"Total {year}")
+    for year in previous_years:
+        percent_diff_col = index.column(f"Percent difference {current_year} - {year}")
+        total_current_year_col = index.column(f"Total {current_year}")
+        total_previous_year_col = index.column(f"Total {year}")
 
         if not percent_diff_col or not total_current_year_col or not total_previous_year_col:
             logger.info("[ERROR] Required columns not found!")
@@ -296,41 +262,64 @@ def calculate_percent_difference(ws, previous_years):
         ws.conditional_formatting.add(percent_diff_range, color_scale_rule)
 
 
-def fill_black_columns(ws):
-    """Find empty headers or 'sep_col' headers and apply black fill to the entire column."""
+def fill_black_columns(ws, last_row, range_fills=False):
+    """
+    Find empty headers or 'sep_col' headers and apply black fill to the entire column, down to last_row.
+    With range_fills the columns get one conditional formatting rule instead of a fill per cell.
+    """
     black_fill = PatternFill(start_color="000000", end_color="000000", fill_type="solid")
+    black_ranges = []
 
     for col in range(1, ws.max_column + 1):
         header_cell = ws.cell(row=1, column=col)
         if header_cell.value is None or str(header_cell.value).strip().lower() == "sep_col":
             logger.info(f"[DEBUG] Header '{header_cell.value}' in column {col} is blacked out.")
-            for row in range(2, ws.max_row + 1):  # Fill all data rows
+            col_letter = get_column_letter(col)
+            ws.column_dimensions[col_letter].width = 5  # Set width to 5
+            if range_fills:
+                black_ranges.append(f"{col_letter}2:{col_letter}{last_row}")
+                continue
+            for row in range(2, last_row + 1):  # Fill all data rows
                 ws.cell(row=row, column=col).fill = black_fill
-                ws.column_dimensions[get_column_letter(col)].width = 5  # Set width to 5
+
+    fill_ranges(ws, black_ranges, "000000")
 
 
-def fill_black_rows(ws):
-    """Find rows named 'pan_pan' or 'sep_row', and the row after the last data row, and black them out."""
+def fill_black_rows(ws, last_row, range_fills=False):
+    """
+    Find rows named 'pan_pan' or 'sep_row' and black them out, together with last_row, the row after the last data row.
+    With range_fills the named rows get one conditional formatting rule; last_row is filled cell by cell in both
+    modes, so the sheet always ends on it.
+    """
     black_fill = PatternFill(start_color="000000", end_color="000000", fill_type="solid")
-    last_data_row = ws.max_row
 
-    for row in range(2, last_data_row + 1):
-        first_cell = ws.cell(row=row, column=1)
-        if first_cell.value is None or str(first_cell.value).strip().lower() in ["pan_pan", "sep_row"]:
-            logger.info(f"[DEBUG] Row {row} ('{first_cell.value}') is blacked out.")
-            for col in range(1, ws.max_column + 1):
-                ws.cell(row=row, column=col).fill = black_fill
+    if range_fills:
+        # One rule on the first column finds the same rows
+        logger.info(f"[DEBUG] Blacking out separator rows 2-{last_row - 1} with a conditional format.")
+        fill_ranges(ws, [f"A2:{get_column_letter(ws.max_column)}{last_row - 1}"], "000000", SEPARATOR_ROW_FORMULA)
+    else:
+        for row in range(2, last_row):
+            first_cell = ws.cell(row=row, column=1)
+            if first_cell.value is None or str(first_cell.value).strip().lower() in ["pan_pan", "sep_row"]:
+                logger.info(f"[DEBUG] Row {row} ('{first_cell.value}') is blacked out.")
+                for col in range(1, ws.max_column + 1):
+                    ws.cell(row=row, column=col).fill = black_fill
 
     # Black out the row after the last data row
-    extra_row = last_data_row + 1
+    extra_row = last_row
     logger.info(f"[DEBUG] Blacking out extra row {extra_row}.")
     for col in range(1, ws.max_column + 1):
         ws.cell(row=extra_row, column=col).fill = black_fill
 
 
-def fill_date_columns(ws):
-    """Find columns with 'Month YYYY' format and apply alternating blue shades for each year, skipping specific rows."""
+def fill_date_columns(ws, last_row, range_fills=False):
+    """
+    Find columns with 'Month YYYY' format and apply alternating blue shades for each year down to last_row,
+    skipping specific rows.
+    With range_fills every year gets one conditional formatting rule over its columns instead of a fill per cell.
+    """
     year_colors = {}  # Store assigned colors per year
+    year_ranges = {}  # Columns of every year, for range_fills
     color_index = 0  # Track which color to assign next
 
     for col in range(1, ws.max_column + 1):
@@ -347,13 +336,18 @@ def fill_date_columns(ws):
                         year_colors[year] = BLUE_SHADES[color_index % len(BLUE_SHADES)]
                         color_index += 1  # Move to next color for next year
 
+                    logger.info(f"[DEBUG] Coloring column {col} ({header_value}) with {year_colors[year]}")  # Debugging info
+
+                    if range_fills:
+                        col_letter = get_column_letter(col)
+                        year_ranges.setdefault(year, []).append(f"{col_letter}2:{col_letter}{last_row}")
+                        continue
+
                     fill_color = PatternFill(start_color=year_colors[year], end_color=year_colors[year],
                                              fill_type="solid")
 
-                    logger.info(f"[DEBUG] Coloring column {col} ({header_value}) with {year_colors[year]}")  # Debugging info
-
                     # Apply color to entire column, skipping specific rows
-                    for row in range(2, ws.max_row + 1):  # Start from row 2 (skip header)
+                    for row in range(2, last_row + 1):  # Start from row 2 (skip header)
                         first_cell_value = ws.cell(row=row, column=1).value
 
                         # Skip rows where the first cell is empty, "pan_pan", "sep_row", or contains "Total"
@@ -363,48 +357,52 @@ def fill_date_columns(ws):
 
                         ws.cell(row=row, column=col).fill = fill_color
 
+    for year, ranges in year_ranges.items():
+        fill_ranges(ws, ranges, year_colors[year], DATA_ROW_FORMULA)
 
-def process_per_nat_stage6(input_file, output_file, previous_years):
-    """Processes Stage 10 by adding sum formulas to the input Excel file."""
-    wb = openpyxl.load_workbook(input_file)
+
+def process_per_nat_stage6(input_file, output_file, previous_years, range_fills=False):
+    """
+    Processes Stage 10 by adding sum formulas to the input Excel file.
+    range_fills colours the separators and the year bands with conditional formatting rules over ranges.
+    """
+    wb = load_book(input_file)
     ws = wb.active
 
     max_row = ws.max_row
     total_column = ws.max_column
-    total_rooms_row = total_camping_row = None
-
-    for row in range(2, max_row + 1):
-        cell_value = ws.cell(row=row, column=1).value
-        if cell_value == "Total Rooms":
-            total_rooms_row = row
-        elif cell_value == "Total Camping":
-            total_camping_row = row
+    index = SheetIndex(ws)
+    total_rooms_row, total_camping_row = find_total_rows(index)
 
     logger.info(f"Processing file: {input_file}")
     logger.info(f"Max row: {max_row}")
     logger.info(f"Total Rooms Row: {total_rooms_row}")
     logger.info(f"Total Camping Row: {total_camping_row}")
 
-    add_monthly_sums(ws, max_row, total_column, total_rooms_row, total_camping_row)
+    add_monthly_sums(ws, index, max_row, total_column, total_rooms_row, total_camping_row)
 
     insert_total_room_camping_sums(ws, total_column, total_rooms_row)
     insert_total_room_camping_sums(ws, total_column, total_camping_row)
 
     apply_grid_borders(ws)
 
-    calculate_percent_to_total(ws, previous_years)
-    calculate_percent_difference(ws, previous_years)
-    fill_black_columns(ws)
-    fill_black_rows(ws)
-    fill_date_columns(ws)
+    calculate_percent_to_total(ws, index, previous_years)
+    calculate_percent_difference(ws, index, previous_years)
+    # The fills end on the black row after the data, the same extent for the cell fills and the range rules
+    last_row = max_row + 1
+    fill_black_columns(ws, last_row, range_fills)
+    fill_black_rows(ws, last_row, range_fills)
+    fill_date_columns(ws, last_row, range_fills)
 
-    wb.save(output_file)
+    save_book(wb, output_file)
     logger.info(f"Stage 10 processing complete. Output saved to {output_file}")
+    return wb
 
 
-def per_nat_stage6(input_path, output_path, previous_years):
+def per_nat_stage6(input_path, output_path, previous_years, range_fills=False):
     """Entry point for per_nat_stage6 processing."""
-    process_per_nat_stage6(input_file=input_path, output_file=output_path, previous_years=previous_years)
+    return process_per_nat_stage6(input_file=input_path, output_file=output_path, previous_years=previous_years,
+                                  range_fills=range_fills)
 
 
 if __name__ == '__main__':
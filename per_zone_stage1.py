@@ -1,7 +1,8 @@
 import pandas as pd
-from openpyxl import load_workbook
 from openpyxl.styles import PatternFill
+from header_calendar import date_headers, header_labels
 from logger import logger
+from workbook_io import frame_to_book, save_book, settle_book
 
 # Constants
 HOUSE_KEYWORDS = ["Beach Apt", ".LUX for 4", ".Safari Tent 5pax", ".Sea Safari 4pax",
@@ -27,27 +28,17 @@ def load_data(input_file):
 
 def detect_date_columns(df):
     """Detect first and last date columns."""
-    date_cols = [col for col in df.columns if is_date(col)]
+    date_cols = date_headers(df.columns)
     if date_cols:
         return date_cols[0], date_cols[-1]  # Return first and last date column
     return None, None
 
 
-def is_date(column_name):
-    """Check if a column name is a date."""
-    try:
-        pd.to_datetime(column_name, dayfirst=True)
-        return True
-    except (ValueError, TypeError):
-        return False
-
-
 def format_date_columns(df, first_date_col, last_date_col):
     """Format date columns from first to last to 'Mon 14/9'."""
     if first_date_col and last_date_col:
         date_range = df.loc[:, first_date_col:last_date_col].columns
-        df.rename(columns={col: pd.to_datetime(col, dayfirst=True).strftime("%a %d/%m") for col in date_range},
-                  inplace=True)
+        df.rename(columns=header_labels(date_range, "%a %d/%m"), inplace=True)
 
 
 def contains_keyword(value, keywords):
@@ -71,34 +62,34 @@ def split_sections(df):
                      ignore_index=True)
 
 
-def save_to_excel(df, output_file):
-    """Save dataframe to an Excel file."""
-    df.to_excel(output_file, index=False, engine='openpyxl')
+def save_to_excel(df):
+    """Write dataframe to an in-memory Excel workbook."""
+    return settle_book(frame_to_book(df, index=False))
 
 
-def apply_day_colors(output_file):
+def apply_day_colors(wb):
     """Apply colors only to the date header cells based on DAY_COLORS."""
-    wb = load_workbook(output_file)
     ws = wb.active  # Get the active sheet
 
+    # One fill per day, shared by all its header cells
+    day_fills = {day: PatternFill(start_color=color, end_color=color, fill_type="solid")
+                 for day, color in DAY_COLORS.items()}
+
     # Get header row
     headers = [cell.value for cell in ws[1]]
 
     for col_idx, col_name in enumerate(headers, start=1):
         if isinstance(col_name, str) and len(col_name) > 3:  # Check if formatted as 'Mon 14/9'
             day = col_name[:3]  # Extract day part (e.g., "Mon")
-            if day in DAY_COLORS:
-                fill = PatternFill(start_color=DAY_COLORS[day], end_color=DAY_COLORS[day], fill_type="solid")
-
+            if day in day_fills:
                 # Apply color **only to the header row**
-                ws.cell(row=1, column=col_idx).fill = fill
-
-    wb.save(output_file)
+                ws.cell(row=1, column=col_idx).fill = day_fills[day]
 
 
-def per_zone_stage1(input_file, output_file):
+def per_zone_stage1(input_file, output_file=None):
     """
-    Process the input file (availabilityPerZone) and save the result to the output file.
+    Process the input file (availabilityPerZone) and return the resulting workbook.
+    The workbook is also saved to the output file when one is given.
     """
     logger.info("#######################################################")
     logger.info(f"Running Per Zone Stage 1 with {input_file=} ....")
@@ -109,10 +100,12 @@ def per_zone_stage1(input_file, output_file):
         format_date_columns(df, first_date_col, last_date_col)
 
     df_split = split_sections(df)
-    save_to_excel(df_split, output_file)
-    apply_day_colors(output_file)
+    wb = save_to_excel(df_split)
+    apply_day_colors(wb)
+    save_book(wb, output_file)
 
     logger.info(f"Per Zone Stage 1 completed. File saved as {output_file}")
+    return wb
 
 
 if __name__ == "__main__":
@@ -1,5 +1,7 @@
 import pandas as pd
+from header_calendar import header_labels
 from logger import logger
+from workbook_io import frame_to_book, read_frame, save_book
 
 
 # Constants
@@ -16,23 +18,13 @@ def load_filtered_data(file, keywords):
     df_filtered = df[df.iloc[:, 0].apply(lambda x: any(kw in x for kw in keywords))].copy()
 
     # Format date columns
-    date_cols = [col for col in df_filtered.columns if is_date(col)]
-    if date_cols:
-        df_filtered.rename(columns={col: pd.to_datetime(col, dayfirst=True).strftime("%a %d/%m") for col in date_cols},
-                           inplace=True)
+    date_labels = header_labels(df_filtered.columns, "%a %d/%m")
+    if date_labels:
+        df_filtered.rename(columns=date_labels, inplace=True)
 
     return df_filtered
 
 
-def is_date(column_name):
-    """Check if a column name is a date."""
-    try:
-        pd.to_datetime(column_name, dayfirst=True)
-        return True
-    except (ValueError, TypeError):
-        return False
-
-
 def replace_category_row(df_zone, df_type, target_category):
     """Replace the row containing the target category with the new filtered rows, maintaining alignment."""
     mask = df_zone.iloc[:, 0] == target_category
@@ -44,17 +36,19 @@ def replace_category_row(df_zone, df_type, target_category):
     return df_zone
 
 
-def per_zone_stage2(zone_file, type_file, output_file):
+def per_zone_stage2(zone_file, type_file, output_file=None):
     """
-    Process the input files (output of stage1 and availabilityPerType) and save the result to the output file.
+    Process the input files (output of stage1 and availabilityPerType) and return the resulting workbook.
+    The workbook is also saved to the output file when one is given.
     """
     logger.info("#######################################################")
     logger.info(f"Running Per Zone Stage 2 with {zone_file=} - {type_file=} ....")
-    df_zone = pd.read_excel(zone_file)
+    df_zone = read_frame(zone_file)
     df_type = load_filtered_data(type_file, FILTER_KEYWORDS)
     df_updated = replace_category_row(df_zone, df_type, TARGET_CATEGORY)
-    df_updated.to_excel(output_file, index=False, engine='openpyxl')
+    wb = save_book(frame_to_book(df_updated, index=False), output_file)
     logger.info(f"Per Zone Stage 2 completed. File saved as {output_file}")
+    return wb
 
 
 if __name__ == "__main__":
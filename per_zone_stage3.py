@@ -1,5 +1,6 @@
 import pandas as pd
 from logger import logger
+from workbook_io import frame_to_book, read_frame, save_book
 
 # Hardcoded capacities for accommodations
 ACCOMMODATION_CAPACITIES = {
@@ -41,63 +42,81 @@ GREEK_TO_ENGLISH = {
 }
 
 
-def normalize_letters(name):
-    """Normalize Greek letters to English equivalents."""
-    if pd.isna(name):  # Handle NaN values
-        return None
-    name = str(name).lstrip().rstrip()  # Convert to string and remove leading/trailing spaces
+def normalize_letters(names):
+    """Normalize Greek letters to English equivalents, for a whole Series of names (NaN stays NaN)."""
+    names = names[names.notna()].astype(str).str.strip()  # Convert to string and remove leading/trailing spaces
     # Replace Greek letters with their English equivalents
     for greek, english in GREEK_TO_ENGLISH.items():
-        name = name.replace(greek, english)
-    return name
+        names = names.str.replace(greek, english, regex=False)
+    return names
 
 
-def normalize_camping_area_name(name):
-    """Normalize camping area names by adding 'area' prefix if missing."""
-    if pd.isna(name):  # Handle NaN values
-        return None
-    name = str(name).lstrip().rstrip()  # Convert to string and remove leading/trailing spaces
-    if not name.startswith("area "):
-        return f"area {name}"
-    return name
+def normalize_camping_area_names(names):
+    """Normalize camping area names of a Series by adding 'area' prefix if missing."""
+    names = names[names.notna()].astype(str).str.strip()  # Convert to string and remove leading/trailing spaces
+    return names.where(names.str.startswith("area "), "area " + names)
+
+
+def normalize_categories(names, category_type):
+    """Return the names as they are looked up in the capacities of category_type, without the NaN ones."""
+    if category_type == "camping areas":
+        # Normalize letters first (e.g., Greek Ζ to English Z), then add the "area" prefix if missing
+        return normalize_camping_area_names(normalize_letters(names))
+    return names[names.notna()]
+
+
+def section_rows(categories, category_type):
+    """
+    Return the index of the rows in the section of category_type, below the header row. Empty rows separate
+    the sections: accommodations are the first one, camping areas the last one.
+    """
+    section = categories.isna().cumsum()
+    rows = section[section == (section.max() if category_type == "camping areas" else 0)].index
+    return rows[rows != categories.index[0]]
 
 
 def update_capacity_column(df, capacities, category_type):
-    """Update the capacity column with hardcoded values."""
-    updated_categories = set()  # Track which categories/areas were updated
-    for index, row in df.iterrows():
-        category = row[0]  # First column contains the category/area names
-        # Normalize camping area names if the category type is "camping areas"
-        if category_type == "camping areas":
-            # Normalize letters first (e.g., Greek Ζ to English Z)
-            category = normalize_letters(category)
-            # Normalize camping area names (add "area" prefix if missing)
-            category = normalize_camping_area_name(category)
-            if category is None:  # Skip NaN values
-                continue
-
-        # Check if the category matches any key in the capacities dictionary
-        if category in capacities:
-            df.at[index, 1] = capacities[category]  # Update the capacity column (column index 1)
-            updated_categories.add(category)
+    """
+    Update the capacity column with hardcoded values. The category column is normalized and matched against
+    a lookup of the normalized capacity names in one step. Both sides of a mismatch are reported: the capacities
+    with no row, and the rows of the category_type section with no capacity, which keep the export's value.
+    """
+    # Normalized name -> capacity name, built before looking at the rows
+    lookup = dict(zip(normalize_categories(pd.Series(list(capacities), dtype=object), category_type), capacities))
+
+    # First column contains the category/area names
+    names = normalize_categories(df[0], category_type)
+    matched = names[names.isin(list(lookup))].map(lookup)
+    if not matched.empty:
+        df.loc[matched.index, 1] = matched.map(capacities)  # Update the capacity column (column index 1)
 
     # Check for skipped categories/areas
-    skipped_categories = set(capacities.keys()) - updated_categories
+    found = set(matched)
+    skipped_categories = [name for name in capacities if name not in found]
     if skipped_categories:
         logger.info(
             f"The following {category_type} were not found in the Excel file and were skipped: {', '.join(skipped_categories)}")
 
+    # Check for rows of the section the capacities do not know
+    section_names = names[names.index.isin(section_rows(df[0], category_type))]
+    unmatched = df.loc[section_names[~section_names.isin(list(lookup))].index, 0]
+    if not unmatched.empty:
+        logger.warning(
+            f"The following {category_type} have no hardcoded capacity and keep the one of the export: "
+            f"{', '.join(map(str, unmatched))}")
+
     return df
 
 
-def per_zone_stage3(input_file, output_file):
+def per_zone_stage3(input_file, output_file=None):
     """
-    Process the input file (output of stage2) and save the result to the output file.
+    Process the input file (output of stage2) and return the resulting workbook.
+    The workbook is also saved to the output file when one is given.
     """
     logger.info("#######################################################")
     logger.info(f"Running Per Zone Stage 3 with {input_file=} ....")
     # Load the Excel file
-    df = pd.read_excel(input_file, sheet_name='Sheet1', header=None)
+    df = read_frame(input_file, sheet_name='Sheet1', header=None)
 
     # Update the capacity column for accommodations
     df = update_capacity_column(df, ACCOMMODATION_CAPACITIES, "accommodations")
@@ -105,9 +124,10 @@ def per_zone_stage3(input_file, output_file):
     # Update the capacity column for camping areas
     df = update_capacity_column(df, CAMPING_CAPACITIES, "camping areas")
 
-    # Save the updated DataFrame to a new Excel file
-    df.to_excel(output_file, index=False, header=False)
+    # Save the updated DataFrame to a new Excel workbook
+    wb = save_book(frame_to_book(df, index=False, header=False), output_file)
     logger.info(f"Per_zone Stage 3 completed. File saved as {output_file}")
+    return wb
 
 
 if __name__ == "__main__":
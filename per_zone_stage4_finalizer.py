@@ -4,6 +4,7 @@ import pandas as pd
 from openpyxl.utils import get_column_letter
 from openpyxl.styles import PatternFill, Font, Border, Side
 from logger import logger
+from workbook_io import frame_to_book, read_frame, save_book
 
 # Hardcoded capacities for accommodations
 ACCOMMODATION_CAPACITIES = {
@@ -164,14 +165,15 @@ def add_totals_and_occupancy_rows(df, group, is_last_group=False):
     return df
 
 
-def per_zone_stage4_finalizer(input_file, output_file):
+def per_zone_stage4_finalizer(input_file, output_file=None):
     """
-    Process the input file (output of stage3) and save the result to the output file.
+    Process the input file (output of stage3) and return the resulting workbook.
+    The workbook is also saved to the output file when one is given.
     """
     logger.info("#######################################################")
     logger.info(f"Running Per Zone Stage 4 with {input_file=}")
     # Load the Excel file
-    df = pd.read_excel(input_file, sheet_name='Sheet1', header=None)
+    df = read_frame(input_file, sheet_name='Sheet1', header=None)
 
     # Detect groups dynamically
     groups = detect_groups(df)
@@ -203,66 +205,65 @@ def per_zone_stage4_finalizer(input_file, output_file):
             #formula = ""
             df.at[index, sum_col_index] = formula
 
-    # Save the updated DataFrame to a new Excel file
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, header=False, sheet_name="Stage4 Results")
-
-        # Access the workbook and worksheet
-        workbook = writer.book
-        worksheet = workbook["Stage4 Results"]
-
-        # Ensure the sheet is visible
-        worksheet.sheet_state = 'visible'
-
-        # Set the width of the first column to 22
-        worksheet.column_dimensions['A'].width = 22
-
-        # Define styles
-        yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        light_green_fill = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
-        header_fill = PatternFill(start_color="ADD8E6", end_color="ADD8E6", fill_type="solid")  # Light blue for headers
-        bold_font = Font(bold=True)
-        thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-
-        # Apply styles to the "Total" column and rows
-        for row in worksheet.iter_rows(min_row=2, max_row=worksheet.max_row, min_col=sum_col_index + 1, max_col=sum_col_index + 1):
+    # Write the updated DataFrame to a new Excel workbook
+    workbook = frame_to_book(df, index=False, header=False, sheet_name="Stage4 Results")
+    worksheet = workbook["Stage4 Results"]
+
+    # Ensure the sheet is visible
+    worksheet.sheet_state = 'visible'
+
+    # Set the width of the first column to 22
+    worksheet.column_dimensions['A'].width = 22
+
+    # Define styles
+    yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
+    light_green_fill = PatternFill(start_color="90EE90", end_color="90EE90", fill_type="solid")
+    header_fill = PatternFill(start_color="ADD8E6", end_color="ADD8E6", fill_type="solid")  # Light blue for headers
+    bold_font = Font(bold=True)
+    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+
+    # Apply styles to the "Total" column and rows
+    for row in worksheet.iter_rows(min_row=2, max_row=worksheet.max_row, min_col=sum_col_index + 1, max_col=sum_col_index + 1):
+        for cell in row:
+            cell.fill = yellow_fill
+            cell.font = bold_font
+            cell.border = thin_border
+
+    # Apply styles to the "Totals" rows
+    for group in groups:
+        totals_row_index = group["end_row"] + 1 if group == groups[-1] else group["end_row"]
+        for row in worksheet.iter_rows(min_row=totals_row_index, max_row=totals_row_index, min_col=1, max_col=worksheet.max_column):
             for cell in row:
                 cell.fill = yellow_fill
                 cell.font = bold_font
                 cell.border = thin_border
 
-        # Apply styles to the "Totals" rows
-        for group in groups:
-            totals_row_index = group["end_row"] + 1 if group == groups[-1] else group["end_row"]
-            for row in worksheet.iter_rows(min_row=totals_row_index, max_row=totals_row_index, min_col=1, max_col=worksheet.max_column):
-                for cell in row:
-                    cell.fill = yellow_fill
-                    cell.font = bold_font
-                    cell.border = thin_border
-
-        # Apply styles to the "Πληρότητα" rows
-        for group in groups:
-            occupancy_row_index = group["end_row"] + 2 if group == groups[-1] else group["end_row"] + 1
-            for row in worksheet.iter_rows(min_row=occupancy_row_index, max_row=occupancy_row_index, min_col=1, max_col=worksheet.max_column):
-                for cell in row:
-                    cell.fill = light_green_fill
-                    cell.font = bold_font
-                    cell.border = thin_border
-                    if cell.column > 2:  # Apply percentage format to columns after Capacity
-                        cell.number_format = "0.00%"
-
-        # Apply styles to the header cells (only for "Fri", "Sat", "Sun")
-        for col in range(3, worksheet.max_column):  # Start from column C (Day 1)
-            header_cell = worksheet.cell(row=1, column=col)
-            if isinstance(header_cell.value, str) and any(day in header_cell.value for day in ["Fri", "Sat", "Sun"]):
-                header_cell.fill = header_fill
-                header_cell.font = bold_font
-                header_cell.border = thin_border
-
-        # Freeze pane at B2
-        worksheet.freeze_panes = "C2"
+    # Apply styles to the "Πληρότητα" rows
+    for group in groups:
+        occupancy_row_index = group["end_row"] + 2 if group == groups[-1] else group["end_row"] + 1
+        for row in worksheet.iter_rows(min_row=occupancy_row_index, max_row=occupancy_row_index, min_col=1, max_col=worksheet.max_column):
+            for cell in row:
+                cell.fill = light_green_fill
+                cell.font = bold_font
+                cell.border = thin_border
+                if cell.column > 2:  # Apply percentage format to columns after Capacity
+                    cell.number_format = "0.00%"
+
+    # Apply styles to the header cells (only for "Fri", "Sat", "Sun")
+    for col in range(3, worksheet.max_column):  # Start from column C (Day 1)
+        header_cell = worksheet.cell(row=1, column=col)
+        if isinstance(header_cell.value, str) and any(day in header_cell.value for day in ["Fri", "Sat", "Sun"]):
+            header_cell.fill = header_fill
+            header_cell.font = bold_font
+            header_cell.border = thin_border
+
+    # Freeze pane at B2
+    worksheet.freeze_panes = "C2"
+
+    save_book(workbook, output_file)
 
     logger.info(f"Per Zone Stage 4 completed. File saved as {output_file}")
+    return workbook
 
 
 if __name__ == "__main__":
@@ -1,33 +1,73 @@
 import datetime
+from bisect import bisect_left
 
 import pandas as pd
-from openpyxl import load_workbook
 from openpyxl.styles import PatternFill, Font, Border, Side
 from openpyxl.utils import get_column_letter
 from logger import logger
-
-
-def detect_breakpoints(ws):
+from sheet_index import SheetIndex
+from sheet_numbers import NumberBlock
+from sheet_styles import restyle, style_ids
+from workbook_io import load_book, save_book
+
+
+class RowKinds:
+    """
+    The kind of every row of the sheet, classified in one pass over its cells: 'empty' (no value in any column),
+    'category' (the Category header rows), 'occupancy' (Πληρότητα), 'total' (a label containing Total) or 'data'.
+    Empty and Category rows close the sections, so the section above any row is found with a binary search
+    instead of walking up the sheet cell by cell.
+    """
+
+    def __init__(self, ws):
+        labels = {}
+        filled = set()
+        for (row, column), cell in ws._cells.items():
+            if cell.value is None:
+                continue
+            filled.add(row)
+            if column == 1:
+                labels[row] = cell.value
+        self.kinds = {row: self._classify(labels.get(row), row in filled) for row in range(1, ws.max_row + 1)}
+        self.boundaries = [row for row, kind in self.kinds.items() if kind in ('empty', 'category')]
+
+    @staticmethod
+    def _classify(label, filled):
+        if not filled:
+            return 'empty'
+        if label == "Category":
+            return 'category'
+        if label == 'Πληρότητα':
+            return 'occupancy'
+        if label and 'Total' in str(label):
+            return 'total'
+        return 'data'
+
+    def rows(self, kind):
+        """Return the rows of one kind, top to bottom."""
+        return [row for row, row_kind in self.kinds.items() if row_kind == kind]
+
+    def boundary_above(self, row):
+        """Return the closest empty or Category row above row, None when there is none."""
+        position = bisect_left(self.boundaries, row)
+        return self.boundaries[position - 1] if position else None
+
+
+def detect_breakpoints(row_kinds):
     """Identify key breakpoints in the worksheet"""
     logger.info("🔍 Detecting breakpoints...")
+    category_rows = row_kinds.rows('category')
+    empty_rows = row_kinds.rows('empty')
     breakpoints = {
-        'last_category_row': None,
-        'first_empty_row': None,
-        'final_empty_row': None
+        'last_category_row': category_rows[-1] if category_rows else None,
+        'first_empty_row': empty_rows[0] if empty_rows else None,
+        'final_empty_row': empty_rows[-1] if empty_rows else None
     }
 
-    for row_idx, row in enumerate(ws.iter_rows(values_only=True), 1):
-        # Check for Category rows
-        if row and row[0] == "Category":
-            breakpoints['last_category_row'] = row_idx
-            logger.info(f"  • Category row found at {row_idx}")
-
-        # Check for empty rows
-        if row and all(cell is None for cell in row):
-            if breakpoints['first_empty_row'] is None:
-                breakpoints['first_empty_row'] = row_idx
-                logger.info(f"  • First empty row at {row_idx}")
-            breakpoints['final_empty_row'] = row_idx
+    for row_idx in category_rows:
+        logger.info(f"  • Category row found at {row_idx}")
+    if empty_rows:
+        logger.info(f"  • First empty row at {empty_rows[0]}")
 
     logger.info("📌 Breakpoints identified:")
     for name, row in breakpoints.items():
@@ -36,7 +76,7 @@ def detect_breakpoints(ws):
     return breakpoints
 
 
-def locate_target_rows(ws):
+def locate_target_rows(index):
     """Find all target sum rows and their related rows"""
     logger.info("🔍 Locating target rows...")
     current_year = datetime.datetime.now().year
@@ -61,18 +101,16 @@ def locate_target_rows(ws):
         }
     }
 
-    # First pass: Find sum rows and capacity rows
-    for row_idx, row in enumerate(ws.iter_rows(values_only=True), 1):
-        if row and row[0] in target_data:
-            target_data[row[0]]['sum_row'] = row_idx
-            target_data[row[0]]['capacity_row'] = row_idx
-            logger.info(f"  • Found {row[0]} at row {row_idx} (capacity at row {row_idx})")
+    # Sum rows and capacity rows
+    for label, data in target_data.items():
+        row_idx = index.last_row(label)
+        if row_idx:
+            data['sum_row'] = row_idx
+            data['capacity_row'] = row_idx
+            logger.info(f"  • Found {label} at row {row_idx} (capacity at row {row_idx})")
 
-    # Second pass: Find Πληρότητα rows (they come in fixed order: Accommodations, Youth Hostel, Camping)
-    occupancy_rows = []
-    for row_idx, row in enumerate(ws.iter_rows(values_only=True), 1):
-        if row and row[0] == 'Πληρότητα':
-            occupancy_rows.append(row_idx)
+    # Πληρότητα rows (they come in fixed order: Accommodations, Youth Hostel, Camping)
+    occupancy_rows = index.rows('Πληρότητα')
 
     # Assign Πληρότητα rows in fixed order
     if len(occupancy_rows) >= 3:
@@ -89,30 +127,22 @@ def locate_target_rows(ws):
 
 def calculate_total_capacity(ws, start_row, end_row):
     """Calculate total capacity between two rows in column B"""
-    total_capacity = 0
-    for row_idx in range(start_row, end_row):
-        capacity = ws.cell(row=row_idx, column=2).value  # Column B is capacity
-        if isinstance(capacity, (int, float)):
-            total_capacity += capacity
-    return total_capacity
+    # Column B is capacity
+    return NumberBlock(ws, start_row, end_row - 1, 2, 2).column_totals(start_row, end_row - 1)[2]
 
 
-def determine_stop_row(ws, current_row, breakpoints):
+def determine_stop_row(row_kinds, current_row):
     """Find where the summation should stop (going upward)"""
-    for row_above in range(current_row - 1, 0, -1):
-        # Check if we hit a category row
-        if ws.cell(row=row_above, column=1).value == "Category":
-            logger.info(f"    Stop condition: Category row at {row_above}")
-            return row_above + 1
-
-        # Check if we hit a completely empty row
-        if all(ws.cell(row=row_above, column=c).value is None
-               for c in range(1, ws.max_column + 1)):
-            logger.info(f"    Stop condition: Empty row at {row_above}")
-            return row_above + 1
+    row_above = row_kinds.boundary_above(current_row)
+    if row_above is None:
+        logger.info("    Warning: No breakpoint found, defaulting to row 2")
+        return 2  # Default fallback
 
-    logger.info("    Warning: No breakpoint found, defaulting to row 2")
-    return 2  # Default fallback
+    if row_kinds.kinds[row_above] == 'category':
+        logger.info(f"    Stop condition: Category row at {row_above}")
+    else:
+        logger.info(f"    Stop condition: Empty row at {row_above}")
+    return row_above + 1
 
 
 def calculate_occupancy_rates(ws, target_data):
@@ -157,7 +187,7 @@ def calculate_occupancy_rates(ws, target_data):
                 logger.info(f"    {col_letter}: {formula}")
 
 
-def process_category(ws, category_name, data, breakpoints):
+def process_category(ws, category_name, data, row_kinds):
     """Process a single category (sums and capacity)"""
     sum_row = data['sum_row']
     capacity_row = data['capacity_row']
@@ -166,7 +196,7 @@ def process_category(ws, category_name, data, breakpoints):
     logger.info(f"    Sum row: {sum_row}, Capacity row: {capacity_row}")
 
     # Determine where to stop summing (going upward from sum_row)
-    stop_row = determine_stop_row(ws, sum_row, breakpoints)
+    stop_row = determine_stop_row(row_kinds, sum_row)
 
     # Calculate total capacity (column B)
     data['capacity_value'] = calculate_total_capacity(ws, stop_row, sum_row)
@@ -226,94 +256,78 @@ def calculate_total_column(ws):
     logger.info("✓ Total column calculation complete for all relevant rows")
 
 
-def apply_styling(ws):
-    """Apply all styling to the worksheet after calculations"""
-    logger.info("🎨 Applying styling to worksheet...")
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
 
-    # Define styles
-    weekend_fill = PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid")
-    total_row_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-    occupancy_fill = PatternFill(start_color="CCFFCC", end_color="CCFFCC", fill_type="solid")
-    empty_row_fill = PatternFill(start_color="000000", end_color="000000", fill_type="solid")
-    bold_font = Font(bold=True)
-    thin_border = Border(left=Side(style='thin'),
-                         right=Side(style='thin'),
-                         top=Side(style='thin'),
-                         bottom=Side(style='thin'))
-
-    # Apply grid borders to all cells
-    logger.info("  Applying grid borders to all cells...")
-    for row in ws.iter_rows():
-        for cell in row:
-            cell.border = thin_border
 
-    # Apply styling based on cell content
-    logger.info("  Applying conditional formatting...")
-    for row in ws.iter_rows():
-        # Style empty rows with black fill
-        if all(cell.value is None for cell in row):
-            for cell in row:
-                cell.fill = empty_row_fill
-            continue
+def is_weekend_header(value):
+    """Date headers start with the day abbreviation, Fri to Sun are weekend days"""
+    if not isinstance(value, str):
+        return False
+    words = value.split()
+    return bool(words) and words[0] in WEEKDAYS and value.startswith(('Fri', 'Sat', 'Sun'))
 
-        # Check for date headers (they start with day abbreviations)
-        for cell in row:
-            if isinstance(cell.value, str) and cell.value.split()[0] in ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat',
-                                                                         'Sun']:
-                if cell.value.startswith(('Fri', 'Sat', 'Sun')):
-                    cell.fill = weekend_fill
 
-        # Style Total rows
-        if row[0].value and 'Total' in str(row[0].value):
-            for cell in row:
-                cell.fill = total_row_fill
-                cell.font = bold_font
+def apply_styling(ws, row_kinds):
+    """Apply all styling to the worksheet after calculations in a single pass, styling every row by its kind"""
+    logger.info("🎨 Applying styling to worksheet...")
+    wb = ws.parent
+
+    # Register the styles once, the cells then only point at them
+    thin_border = style_ids(wb, border=Border(left=Side(style='thin'),
+                                              right=Side(style='thin'),
+                                              top=Side(style='thin'),
+                                              bottom=Side(style='thin')))
+    weekend_fill = style_ids(wb, fill=PatternFill(start_color="FFCCCC", end_color="FFCCCC", fill_type="solid"))
+    row_styles = {
+        'empty': style_ids(wb, fill=PatternFill(start_color="000000", end_color="000000", fill_type="solid")),
+        'total': style_ids(wb, fill=PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid"),
+                           font=Font(bold=True)),
+        'occupancy': style_ids(wb, fill=PatternFill(start_color="CCFFCC", end_color="CCFFCC", fill_type="solid")),
+    }
 
-        # Style Occupancy (Πληρότητα) rows
-        if row[0].value == 'Πληρότητα':
-            for cell in row:
-                cell.fill = occupancy_fill
-
-    # Adjust column widths
-    logger.info("  Adjusting column widths...")
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2) * 1.2
-        ws.column_dimensions[column].width = adjusted_width
+    # Grid borders on all cells, black empty rows, weekend date headers, Total and Πληρότητα rows
+    logger.info("  Applying borders and fills, measuring column widths...")
+    max_lengths = [0] * ws.max_column
+    for row in ws.iter_rows():
+        row_style = row_styles.get(row_kinds.kinds[row[0].row])
+        for index, cell in enumerate(row):
+            restyle(cell, thin_border)
+            if row_style:
+                restyle(cell, row_style)
+            elif is_weekend_header(cell.value):
+                restyle(cell, weekend_fill)
+            max_lengths[index] = max(max_lengths[index], len(str(cell.value)))
+
+    for index, max_length in enumerate(max_lengths, start=1):
+        ws.column_dimensions[get_column_letter(index)].width = (max_length + 2) * 1.2
 
     logger.info("✓ Styling applied successfully")
 
 
-def per_zone_stage7(input_file, output_file):
-    """Main processing function for stage 7"""
+def per_zone_stage7(input_file, output_file=None):
+    """Main processing function for stage 7, returns the workbook and saves it when an output file is given"""
     logger.info("🚀 Starting Stage 7 processing...")
 
     # Load workbook
     try:
-        wb = load_workbook(input_file)
+        wb = load_book(input_file)
         ws = wb['Stage4 Results']
     except Exception as e:
         logger.info(f"❌ Error loading workbook: {e}")
         return
 
-    # Step 1: Detect breakpoints
-    breakpoints = detect_breakpoints(ws)
+    # Step 1: Classify every row once and detect breakpoints
+    row_kinds = RowKinds(ws)
+    detect_breakpoints(row_kinds)
 
     # Step 2: Locate target rows
-    target_data = locate_target_rows(ws)
+    target_data = locate_target_rows(SheetIndex(ws))
 
     # Step 3: Process each category (sums and capacities)
     logger.info("📊 Calculating sums and capacities...")
     for category_name, data in target_data.items():
         if data['sum_row']:  # Only process main categories
-            process_category(ws, category_name, data, breakpoints)
+            process_category(ws, category_name, data, row_kinds)
 
     # Step 4: Calculate occupancy rates
     calculate_occupancy_rates(ws, target_data)
@@ -321,17 +335,18 @@ def per_zone_stage7(input_file, output_file):
     # Step 5: Calculate Total column for ALL relevant rows
     calculate_total_column(ws)
 
-    # Step 6: Apply all styling
-    apply_styling(ws)
+    # Step 6: Apply all styling, with the rows classified again now that the formula rows are written
+    apply_styling(ws, RowKinds(ws))
 
     # Save results
     logger.info("💾 Saving results...")
     try:
-        wb.save(output_file)
+        save_book(wb, output_file)
         logger.info(f"✅ Success! Output saved to {output_file}")
         logger.info("🔹 Includes: All calculations with complete styling")
     except Exception as e:
         logger.info(f"❌ Error saving workbook: {e}")
+    return wb
 
 
 if __name__ == "__main__":
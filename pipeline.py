@@ -0,0 +1,304 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from openpyxl.formatting.formatting import ConditionalFormattingList
+from openpyxl.formatting.rule import ColorScaleRule
+from openpyxl.utils import get_column_letter
+
+from per_nat_stage1_finalizer import per_nat_stage1_finalizer
+from per_zone_stage1 import per_zone_stage1
+from per_zone_stage2 import per_zone_stage2
+from per_zone_stage3 import per_zone_stage3
+from per_zone_stage4 import per_zone_stage4
+from per_zone_stage4_finalizer import per_zone_stage4_finalizer
+from per_zone_stage5 import per_zone_per_type_stage5_previous_years, store_previous_year as store_zone_season
+from per_zone_stage6 import per_zone_stage6
+from per_zone_stage7 import per_zone_stage7
+from per_nat_stage1 import per_nat_stage1
+from per_nat_stage2 import per_nat_stage2, store_previous_year as store_nat_season
+from per_nat_stage3 import per_nat_stage3
+from per_nat_stage4 import per_nat_stage4
+from per_nat_stage5 import per_nat_stage5
+from per_nat_stage6 import per_nat_stage6
+from instrumentation import StageRecorder, branch_in_worker
+from logger import logger
+from season_align import ALIGN_MODES
+from stage_graph import StageGraph
+from workbook_io import load_book, move_sheet
+
+# Intermediate file names, written only in the on-disk debug mode
+PER_ZONE_STAGE1_OUTPUT = "per_zone_stage1_output.xlsx"
+PER_ZONE_STAGE2_OUTPUT = "per_zone_stage2_output.xlsx"
+PER_ZONE_STAGE3_OUTPUT = "per_zone_stage3_output.xlsx"
+PER_ZONE_STAGE4_OUTPUT = "per_zone_stage4_output.xlsx"
+PER_ZONE_STAGE4_FINALIZER_OUTPUT = "per_zone_stage4_finalizer_output.xlsx"
+PER_ZONE_STAGE5_OUTPUT = "per_zone_stage5_output_{year}.xlsx"
+PER_ZONE_STAGE6_OUTPUT = "per_zone_stage6_output.xlsx"
+PER_ZONE_STAGE7_OUTPUT = "per_zone_stage7_output.xlsx"
+
+PER_NAT_STAGE1_OUTPUT = "per_nat_stage1_output.xlsx"
+PER_NAT_STAGE1_FINALIZER_OUTPUT = "per_nat_stage1_finalizer_output.xlsx"
+PER_NAT_STAGE2_OUTPUT = "per_nat_stage2_output_{year}.xlsx"
+PER_NAT_STAGE3_OUTPUT = "per_nat_stage3_output.xlsx"
+PER_NAT_STAGE4_OUTPUT = "per_nat_stage4_output.xlsx"
+PER_NAT_STAGE5_OUTPUT = "per_nat_stage5_output.xlsx"
+PER_NAT_STAGE6_OUTPUT = "per_nat_stage6_output.xlsx"
+
+NAT_SHEET_NAME = "εθνικότητες"
+
+
+def intermediate_output(file_name, keep_intermediate_files):
+    """Intermediate files are only written in the on-disk debug mode, otherwise stages hand over workbooks in memory."""
+    return file_name if keep_intermediate_files else None
+
+
+def intermediate_files(previous_zone_years, previous_nat_years):
+    """Return every intermediate file name a run with these previous years can write."""
+    return ([PER_ZONE_STAGE1_OUTPUT, PER_ZONE_STAGE2_OUTPUT, PER_ZONE_STAGE3_OUTPUT, PER_ZONE_STAGE4_OUTPUT,
+             PER_ZONE_STAGE4_FINALIZER_OUTPUT, PER_ZONE_STAGE6_OUTPUT, PER_ZONE_STAGE7_OUTPUT,
+             PER_NAT_STAGE1_OUTPUT, PER_NAT_STAGE1_FINALIZER_OUTPUT, PER_NAT_STAGE3_OUTPUT, PER_NAT_STAGE4_OUTPUT,
+             PER_NAT_STAGE5_OUTPUT, PER_NAT_STAGE6_OUTPUT]
+            + [PER_NAT_STAGE2_OUTPUT.format(year=year) for year in previous_nat_years]
+            + [PER_ZONE_STAGE5_OUTPUT.format(year=year) for year in previous_zone_years])
+
+
+def previous_seasons(graph, store_function, stage_name, previous_years_paths):
+    """
+    Declare the storing of every previous year in the season store (per_zone_stage5 / per_nat_stage2),
+    in previous_years_paths order. The stages give the Season the later stages query the store with;
+    a year whose export did not change is neither parsed nor stored again.
+    """
+    return [graph.add(f"{stage_name}[{year}]", store_function, input_file=file_path, year=year)
+            for year, file_path in previous_years_paths.items()]
+
+
+def previous_year_stages(graph, stage_function, previous_years_paths, output_pattern, keep_intermediate_files,
+                         **options):
+    """
+    Declare a previous year workbook stage (per_zone_stage5 / per_nat_stage2) for every year, in
+    previous_years_paths order. The pipeline only runs them to write their debug files.
+    options are passed to every stage as keyword arguments.
+    """
+    return [graph.add(f"{stage_function.__name__}[{year}]", stage_function, input_file=file_path,
+                      output_file=intermediate_output(output_pattern.format(year=year), keep_intermediate_files),
+                      year=year, **options)
+            for year, file_path in previous_years_paths.items()]
+
+
+def run_zone_branch(zone_path, type_path, previous_years_zone_paths, keep_intermediate_files, max_workers=None,
+                    recorder=None, use_cache=True, alignment="date"):
+    """
+    Run the per zone stages and return (final zone workbook, True when it includes previous years).
+    Stages whose inputs did not change since the last run are served from the stage cache.
+    alignment puts the days of the previous years on the same calendar date or on the same weekday.
+    """
+    # Intermediate files are only written by stages that run, so the debug mode runs them all
+    graph = StageGraph(recorder, max_workers, use_cache and not keep_intermediate_files)
+    zone_stage1 = graph.add("per_zone_stage1", per_zone_stage1, zone_path,
+                            intermediate_output(PER_ZONE_STAGE1_OUTPUT, keep_intermediate_files))
+    zone_stage2 = graph.add("per_zone_stage2", per_zone_stage2, zone_stage1, type_path,
+                            intermediate_output(PER_ZONE_STAGE2_OUTPUT, keep_intermediate_files))
+    zone_stage3 = graph.add("per_zone_stage3", per_zone_stage3, zone_stage2,
+                            intermediate_output(PER_ZONE_STAGE3_OUTPUT, keep_intermediate_files))
+    zone_stage4 = graph.add("per_zone_stage4", per_zone_stage4, zone_stage3,
+                            intermediate_output(PER_ZONE_STAGE4_OUTPUT, keep_intermediate_files))
+    previous_zone_seasons = previous_seasons(graph, store_zone_season, "per_zone_stage5", previous_years_zone_paths)
+
+    if not previous_zone_seasons:
+        """Calculate results for per_zone_stage4_finalizer_output without previous years"""
+        zone_final = graph.add("per_zone_stage4_finalizer", per_zone_stage4_finalizer, zone_stage3,
+                               intermediate_output(PER_ZONE_STAGE4_FINALIZER_OUTPUT, keep_intermediate_files))
+        return graph.evaluate(zone_final), False
+
+    if keep_intermediate_files:
+        graph.evaluate_all(previous_year_stages(graph, per_zone_per_type_stage5_previous_years,
+                                                previous_years_zone_paths, PER_ZONE_STAGE5_OUTPUT,
+                                                keep_intermediate_files))
+
+    """Process previous years zone files"""
+    zone_stage6 = graph.add("per_zone_stage6", per_zone_stage6, zone_stage4, previous_zone_seasons,
+                            intermediate_output(PER_ZONE_STAGE6_OUTPUT, keep_intermediate_files),
+                            alignment=alignment)
+    zone_final = graph.add("per_zone_stage7", per_zone_stage7, zone_stage6,
+                           intermediate_output(PER_ZONE_STAGE7_OUTPUT, keep_intermediate_files))
+    return graph.evaluate(zone_final), True
+
+
+def run_nat_branch(nationality_path, previous_years_nat_paths, keep_intermediate_files, max_workers=None,
+                   recorder=None, use_cache=True, range_fills=False, alignment="date"):
+    """
+    Run the per nationality stages and return the final nationality workbook.
+    Stages whose inputs did not change since the last run are served from the stage cache.
+    range_fills colours the separators and year bands of the last stage with conditional formatting rules.
+    alignment decides in which month of the current season every day of a previous year is summed.
+    """
+    graph = StageGraph(recorder, max_workers, use_cache and not keep_intermediate_files)
+    previous_nat_seasons = previous_seasons(graph, store_nat_season, "per_nat_stage2", previous_years_nat_paths)
+
+    if not previous_nat_seasons:
+        nat_final = graph.add("per_nat_stage1_finalizer", per_nat_stage1_finalizer, nationality_path,
+                              intermediate_output(PER_NAT_STAGE1_FINALIZER_OUTPUT, keep_intermediate_files))
+        return graph.evaluate(nat_final)
+
+    if keep_intermediate_files:
+        graph.evaluate_all(previous_year_stages(graph, per_nat_stage2, previous_years_nat_paths,
+                                                PER_NAT_STAGE2_OUTPUT, keep_intermediate_files, alignment=alignment))
+
+    nat_stage1 = graph.add("per_nat_stage1", per_nat_stage1, nationality_path,
+                           intermediate_output(PER_NAT_STAGE1_OUTPUT, keep_intermediate_files))
+
+    nat_previous_years = list(previous_years_nat_paths.keys())  # Extract years from dictionary keys
+    nat_number_of_previous_year_data = len(previous_nat_seasons)
+
+    nat_stage3 = graph.add("per_nat_stage3", per_nat_stage3, nat_stage1, previous_nat_seasons,
+                           intermediate_output(PER_NAT_STAGE3_OUTPUT, keep_intermediate_files), alignment=alignment)
+    nat_stage4 = graph.add("per_nat_stage4", per_nat_stage4, nat_stage3,
+                           intermediate_output(PER_NAT_STAGE4_OUTPUT, keep_intermediate_files),
+                           nat_previous_years, nat_number_of_previous_year_data)
+    nat_stage5 = graph.add("per_nat_stage5", per_nat_stage5, nat_stage4,
+                           intermediate_output(PER_NAT_STAGE5_OUTPUT, keep_intermediate_files), nat_previous_years)
+    nat_final = graph.add("per_nat_stage6", per_nat_stage6, nat_stage5,
+                          intermediate_output(PER_NAT_STAGE6_OUTPUT, keep_intermediate_files), nat_previous_years,
+                          range_fills=range_fills)
+    return graph.evaluate(nat_final)
+
+
+def run_branches(zone_job, nat_job, max_workers=None, recorder=None, use_cache=True, range_fills=False,
+                 alignment="date"):
+    """
+    Run the zone branch and the nationality branch, in two worker processes when both are requested.
+    zone_job / nat_job are the argument tuples of run_zone_branch / run_nat_branch, or None to skip the branch.
+    Returns ((zone workbook, full_zone), nat workbook), with None for a skipped branch.
+    max_workers=1 runs both branches one after the other in this process.
+    """
+    recorder = recorder or StageRecorder()
+    zone_result = None
+    nat_result = None
+
+    if zone_job is None or nat_job is None or max_workers == 1:
+        if zone_job is not None:
+            with recorder.span("zone branch"):
+                zone_result = run_zone_branch(*zone_job, max_workers=max_workers, recorder=recorder,
+                                              use_cache=use_cache, alignment=alignment)
+        if nat_job is not None:
+            with recorder.span("nationality branch"):
+                nat_result = run_nat_branch(*nat_job, max_workers=max_workers, recorder=recorder, use_cache=use_cache,
+                                            range_fills=range_fills, alignment=alignment)
+        return zone_result, nat_result
+
+    # The two branches share no data until combine_sheets, so they run side by side and split the CPUs
+    branch_workers = max(1, (max_workers or os.cpu_count() or 1) // 2)
+    logger.info(f"Running the zone and nationality branches in parallel ({branch_workers} processes each for previous years)")
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        zone_future = executor.submit(branch_in_worker, recorder.child(), "zone branch", run_zone_branch, *zone_job,
+                                      max_workers=branch_workers, use_cache=use_cache, alignment=alignment)
+        nat_future = executor.submit(branch_in_worker, recorder.child(), "nationality branch", run_nat_branch,
+                                     *nat_job, max_workers=branch_workers, use_cache=use_cache,
+                                     range_fills=range_fills, alignment=alignment)
+        zone_result, zone_events = zone_future.result()
+        nat_result, nat_events = nat_future.result()
+    recorder.merge(zone_events + nat_events)
+    return zone_result, nat_result
+
+
+def plan_output_name(has_nat, full_zone, today=None):
+    """Return the default final file name, named after the data the plan contains."""
+    today = today or datetime.today().strftime("%d-%m-%y")
+    if has_nat:
+        return f"{today}_availabilityPerZone&Nationality.xlsx"
+    if full_zone:
+        return f"{today}_availabilityPerZone&PreviousYears.xlsx"
+    return f"{today}_availabilityPerZone.xlsx"
+
+
+def run_plan(zone_path, type_path, nationality_path, previous_years_zone_paths, previous_years_nat_paths,
+             output_file=None, keep_intermediate_files=False, max_workers=None, recorder=None, use_cache=True,
+             range_fills=False, alignment="date"):
+    """
+    Run the whole pipeline without any UI and return (final file, True when the zone sheet includes previous years).
+    zone_path and type_path go together; without them only the nationality stages run and the final file is None.
+    output_file=None uses plan_output_name in the working directory.
+    Stage timings are collected in recorder (an instrumentation.StageRecorder) when one is given.
+    use_cache=False runs every stage even when its inputs did not change since the last run.
+    range_fills=True colours the nationality separators and year bands with conditional formatting rules
+    over ranges instead of a fill per cell, for a smaller file that opens faster.
+    alignment="weekday" compares every day of the season with the same weekday of the previous years
+    (52 weeks earlier per year) instead of the same calendar date ("date").
+    """
+    recorder = recorder or StageRecorder()
+    no_zone = zone_path is None or type_path is None
+    if no_zone and nationality_path is None:
+        raise ValueError("No availability per zone / type or per nationality file given")
+
+    zone_job = None if no_zone else (zone_path, type_path, previous_years_zone_paths or {}, keep_intermediate_files)
+    nat_job = None if nationality_path is None else (nationality_path, previous_years_nat_paths or {},
+                                                     keep_intermediate_files)
+    if alignment not in ALIGN_MODES:
+        raise ValueError(f"Unknown season alignment {alignment!r}, expected one of {', '.join(ALIGN_MODES)}")
+    zone_result, nat_final = run_branches(zone_job, nat_job, max_workers, recorder, use_cache, range_fills, alignment)
+    if zone_result is None:
+        logger.warning("No zone data given, the nationality results are not packed into a plan")
+        return None, False
+
+    zone_final, full_zone = zone_result
+    today = datetime.today().strftime("%d-%m-%y")
+    output_file = output_file or plan_output_name(nat_final is not None, full_zone, today)
+    recorder.stage("combine_sheets", combine_sheets, zone_final, nat_final, output_file, f"{today}-πληρότητα-units",
+                   NAT_SHEET_NAME if nat_final is not None else None)
+    logger.info(f"Plan saved as {output_file}")
+    return output_file, full_zone
+
+
+def combine_sheets(per_zone_final_file, per_nat_final_file, final_output_name, sheet1_name, sheet2_name):
+    """Combine sheets from stage4 and stage5 outputs (files or in-memory workbooks) into a single Excel file."""
+    # Load workbooks
+    wb_stage5 = None
+
+    if per_nat_final_file is not None:
+        wb_stage5 = load_book(per_nat_final_file)
+
+    # Create a new workbook for the final output
+    wb_final = load_book(per_zone_final_file)
+
+    # Rename the sheet from stage4 to the custom sheet1 name
+    sheet_stage4 = wb_final.active
+    sheet_stage4.title = sheet1_name
+
+    # Move the stage5 sheet over as it is, with its column widths, freeze panes and conditional formats
+    if wb_stage5 is not None:
+        sheet_stage5 = move_sheet(wb_stage5.active, wb_final, sheet2_name)
+        apply_conditional_formatting(sheet_stage5)
+
+    # Save the final workbook, once
+    wb_final.save(final_output_name)
+
+
+def apply_conditional_formatting(ws):
+    """Freeze the headers of the nationality sheet and colour its percent differences over the final rows."""
+    ws.freeze_panes = "B2"
+
+    # The scales stage 6 added end before its separator row, they are replaced by the ones over the whole sheet
+    stage_formats = ws.conditional_formatting
+    ws.conditional_formatting = ConditionalFormattingList()
+    for conditional_format in stage_formats:
+        for rule in conditional_format.rules:
+            if rule.type != "colorScale":
+                ws.conditional_formatting.add(str(conditional_format.sqref), rule)
+
+    # Find columns that start with "Percent difference"
+    header_row = ws[1]  # Assuming headers are in the first row
+    percent_diff_cols = [cell.column for cell in header_row if
+                         cell.value and cell.value.startswith("Percent difference")]
+
+    # Apply conditional formatting to each identified column
+    for percent_diff_col in percent_diff_cols:
+        percent_diff_range = f"{get_column_letter(percent_diff_col)}2:{get_column_letter(percent_diff_col)}{ws.max_row}"
+        color_scale_rule = ColorScaleRule(
+            start_type="num", start_value=-1, start_color="FFCCCC",  # Red for negative
+            mid_type="num", mid_value=0, mid_color="FFFFFF",  # White for neutral
+            end_type="num", end_value=1, end_color="CCFFCC"  # Green for positive
+        )
+        ws.conditional_formatting.add(percent_diff_range, color_scale_rule)
+
+    logger.info("Conditional formatting applied successfully!")
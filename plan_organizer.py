@@ -1,9 +1,11 @@
+import multiprocessing
 import tkinter as tk
 from gui import PlanoKratiseonApp
 from logger import logger
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Needed by the previous years process pool in the packaged executable
     logger.info("Starting PlanoKratiseonApp...")
 
     root = tk.Tk()
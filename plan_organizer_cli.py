@@ -0,0 +1,186 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import traceback
+
+from instrumentation import StageRecorder
+from logger import logger
+from pipeline import run_plan
+from season_align import ALIGN_MODES
+
+# Exit codes
+EXIT_OK = 0
+EXIT_FAILED = 1  # At least one job failed while processing
+EXIT_INVALID_JOB = 2  # Bad arguments or job spec, nothing was processed
+
+JOB_KEYS = {"zone", "type", "nationality", "previous_years_zone", "previous_years_nat", "output",
+            "keep_intermediate_files", "max_workers"}
+
+
+def parse_year_paths(entries):
+    """Turn ["2024=path", ...] from the command line into {2024: path, ...}."""
+    year_paths = {}
+    for entry in entries or []:
+        year, separator, path = entry.partition("=")
+        if not separator:
+            raise ValueError(f"Expected YEAR=PATH, got {entry}")
+        year_paths[year] = path
+    return year_paths
+
+
+def load_jobs(job_file):
+    """Read a job spec file holding one job object or a list of them."""
+    with open(job_file, encoding="utf-8") as f:
+        spec = json.load(f)
+    jobs = spec if isinstance(spec, list) else [spec]
+    for job in jobs:
+        if not isinstance(job, dict):
+            raise ValueError(f"Every job in {job_file} must be an object")
+    return jobs
+
+
+def validate_job(job):
+    """Check a job spec and return it normalized to the run_plan arguments."""
+    unknown = set(job) - JOB_KEYS
+    if unknown:
+        raise ValueError(f"Unknown job keys: {', '.join(sorted(unknown))}")
+
+    keep_intermediate_files = bool(job.get("keep_intermediate_files", False))
+    if (job.get("zone") is None) != (job.get("type") is None):
+        raise ValueError("zone and type files must be given together")
+    if job.get("zone") is None and (job.get("nationality") is None or not keep_intermediate_files):
+        raise ValueError("A plan needs the zone and type files "
+                         "(nationality alone only makes sense with keep_intermediate_files)")
+
+    previous_years = {}
+    for key in ("previous_years_zone", "previous_years_nat"):
+        try:
+            previous_years[key] = {int(year): path for year, path in (job.get(key) or {}).items()}
+        except (AttributeError, ValueError):
+            raise ValueError(f"{key} must map years to files, got {job.get(key)}")
+
+    paths = [job.get("zone"), job.get("type"), job.get("nationality"),
+             *previous_years["previous_years_zone"].values(), *previous_years["previous_years_nat"].values()]
+    missing = [path for path in paths if path is not None and not os.path.isfile(path)]
+    if missing:
+        raise ValueError(f"Files not found: {', '.join(missing)}")
+
+    max_workers = job.get("max_workers")
+    if max_workers is not None and (not isinstance(max_workers, int) or max_workers < 1):
+        raise ValueError(f"max_workers must be a positive integer, got {max_workers}")
+
+    return dict(zone_path=job.get("zone"), type_path=job.get("type"), nationality_path=job.get("nationality"),
+                previous_years_zone_paths=previous_years["previous_years_zone"],
+                previous_years_nat_paths=previous_years["previous_years_nat"],
+                output_file=job.get("output"), keep_intermediate_files=keep_intermediate_files,
+                max_workers=max_workers)
+
+
+def check_batch_outputs(jobs):
+    """
+    Check that every job of a batch writes its own final file. Without an output a job falls back to
+    the GUI naming in the working directory, so the jobs of a batch would overwrite each other.
+    """
+    if len(jobs) == 1:
+        return
+    missing = [number for number, job in enumerate(jobs, start=1) if job["output_file"] is None]
+    if missing:
+        raise ValueError(f"Every job of a batch needs an output, missing in jobs {', '.join(map(str, missing))}")
+    seen = {}
+    for number, job in enumerate(jobs, start=1):
+        output = os.path.normcase(os.path.abspath(job["output_file"]))
+        if output in seen:
+            raise ValueError(f"Jobs {seen[output]} and {number} both write {job['output_file']}")
+        seen[output] = number
+
+
+def numbered(path, number, total):
+    """Give every job of a batch its own report file: report.json -> report_2.json."""
+    if path is None or total == 1:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}_{number}{extension}"
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Build the availability plan without the GUI. "
+                    f"Exit codes: {EXIT_OK} success, {EXIT_FAILED} a job failed, {EXIT_INVALID_JOB} invalid job.")
+    parser.add_argument("--job", help="JSON job spec with one job object or a list of jobs, each with its own "
+                                      "output, keys: " + ", ".join(sorted(JOB_KEYS)))
+    parser.add_argument("--zone", help="Availability per zone, current year")
+    parser.add_argument("--type", help="Availability per type, current year")
+    parser.add_argument("--nationality", help="Availability per nationality, current year")
+    parser.add_argument("--prev-zone", action="append", metavar="YEAR=PATH",
+                        help="Availability per zone of a previous year, repeatable")
+    parser.add_argument("--prev-nat", action="append", metavar="YEAR=PATH",
+                        help="Availability per nationality of a previous year, repeatable")
+    parser.add_argument("--output", help="Final file, defaults to the GUI naming in the working directory")
+    parser.add_argument("--keep-intermediate-files", action="store_true",
+                        help="Also write every stage output, like unchecking Enable Cleanup")
+    parser.add_argument("--max-workers", type=int, help="Processes to use, 1 runs everything in this process")
+    parser.add_argument("--no-stage-cache", action="store_true",
+                        help="Run every stage even when its inputs did not change since the last run")
+    parser.add_argument("--range-fills", action="store_true",
+                        help="Colour the nationality separators and year bands with conditional formatting rules "
+                             "over ranges instead of a fill per cell (smaller file)")
+    parser.add_argument("--align", choices=ALIGN_MODES, default="date",
+                        help="Compare every day with the same calendar date (default) or the same weekday "
+                             "of the previous years")
+    parser.add_argument("--report", help="Write the stage timings and sizes to this JSON run report")
+    parser.add_argument("--trace", help="Write the stages as Chrome trace events (chrome://tracing, Perfetto)")
+    parser.add_argument("--profile-dir", help="Write a cProfile dump per stage into this directory")
+    parser.add_argument("--trace-memory", action="store_true", help="Record the tracemalloc peak per stage")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    try:
+        if args.job:
+            raw_jobs = load_jobs(args.job)
+        else:
+            raw_jobs = [{"zone": args.zone, "type": args.type, "nationality": args.nationality,
+                         "previous_years_zone": parse_year_paths(args.prev_zone),
+                         "previous_years_nat": parse_year_paths(args.prev_nat),
+                         "output": args.output, "keep_intermediate_files": args.keep_intermediate_files,
+                         "max_workers": args.max_workers}]
+        jobs = [validate_job(job) for job in raw_jobs]
+        check_batch_outputs(jobs)
+    except (OSError, ValueError) as e:
+        logger.error(f"Invalid job: {e}")
+        return EXIT_INVALID_JOB
+
+    failed = 0
+    for number, job in enumerate(jobs, start=1):
+        recorder = StageRecorder(numbered(args.profile_dir, number, len(jobs)), args.trace_memory)
+        succeeded = False
+        try:
+            final_output, _ = run_plan(**job, recorder=recorder, use_cache=not args.no_stage_cache,
+                                       range_fills=args.range_fills, alignment=args.align)
+            logger.info(f"Job {number}/{len(jobs)} done: {final_output}")
+            succeeded = True
+        except Exception as e:
+            logger.error(f"Job {number}/{len(jobs)} failed: {e} {traceback.format_exc()}")
+            failed += 1
+        try:
+            if args.report:
+                recorder.write_report(numbered(args.report, number, len(jobs)),
+                                      job=job, succeeded=succeeded)
+            if args.trace:
+                recorder.write_chrome_trace(numbered(args.trace, number, len(jobs)))
+        except OSError as e:
+            logger.error(f"Could not write the report of job {number}: {e}")
+
+    if failed:
+        logger.error(f"{failed} of {len(jobs)} jobs failed")
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
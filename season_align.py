@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+# How the days of a previous season are put next to the days of the current one
+ALIGN_MODES = ("date", "weekday")
+WEEK_YEAR_DAYS = 52 * 7  # A date moved by whole 52-week years keeps its weekday
+
+
+def aligned_dates(dates, target_year, mode="date"):
+    """
+    Move the dates of one season into target_year, all at once, and return them as a DatetimeIndex.
+    The season is moved by the years between its earliest date and target_year, so a season running
+    over New Year continues into the year after instead of being split over both ends of target_year.
+    "date" keeps the calendar date (29/02 has none outside leap years and becomes NaT),
+    "weekday" moves every date by 52 weeks per year, so a Saturday is compared with a Saturday.
+    """
+    if mode not in ALIGN_MODES:
+        raise ValueError(f"Unknown season alignment {mode!r}, expected one of {', '.join(ALIGN_MODES)}")
+    dates = pd.DatetimeIndex(dates)
+    if dates.isna().all():
+        return dates
+    years = target_year - dates.min().year
+    if mode == "weekday":
+        return dates + pd.to_timedelta(years * WEEK_YEAR_DAYS, unit="D")
+    parts = pd.DataFrame({"year": dates.year + years, "month": dates.month, "day": dates.day})
+    return pd.DatetimeIndex(pd.to_datetime(parts.dropna().astype(int), errors="coerce").reindex(parts.index))
+
+
+class SeasonAlignment:
+    """
+    The seasons of any number of years on one axis of days, which starts at the earliest aligned day.
+    The dates of every season are aligned in one step; positions[key][i] is the axis day (0 = first) of the i-th date
+    of that season, -1 for the dates that have no place (NaT, 29/02 in "date" mode).
+    """
+
+    def __init__(self, seasons, target_year, mode="date"):
+        keys = list(seasons)
+        lengths = [len(seasons[key]) for key in keys]
+        days = np.concatenate([aligned_dates(seasons[key], target_year, mode).values.astype("datetime64[D]")
+                               for key in keys] or [np.array([], dtype="datetime64[D]")])
+        valid = ~np.isnat(days)
+        self.mode = mode
+        self.start = days[valid].min() if valid.any() else None
+        axis = np.full(len(days), -1)
+        if self.start is not None:
+            axis[valid] = (days[valid] - self.start).astype(int)
+        self.length = int(axis.max(initial=-1)) + 1
+        self.positions = dict(zip(keys, np.split(axis, np.cumsum(lengths)[:-1])))
+
+    def offset(self, key):
+        """Return the axis day of the first placed date of a season: the empty days in front of it."""
+        placed = self.positions[key][self.positions[key] >= 0]
+        return int(placed.min()) if len(placed) else 0
+
+    def place(self, key, values, fill=None):
+        """Return the values of a season's dates as a row over the whole axis, fill on the days it has no value."""
+        positions = self.positions[key]
+        row = np.full(self.length, fill, dtype=object)
+        values = np.asarray(list(values)[:len(positions)], dtype=object)
+        placed = positions[:len(values)] >= 0
+        row[positions[:len(values)][placed]] = values[placed]
+        return row.tolist()
@@ -0,0 +1,231 @@
+import math
+import os
+import sqlite3
+import sys
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+import parse_cache
+from logger import logger
+from season_align import aligned_dates
+
+# Closed seasons of the e-Camping exports, one row per (kind, year, category, day)
+HISTORY_DB = os.path.join("history", "seasons.sqlite")
+STORE_FORMAT_VERSION = 1
+KINDS = ("zone", "nat")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seasons (
+    kind TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    source TEXT,
+    category_label TEXT,
+    capacity_label TEXT,
+    ingested TEXT,
+    PRIMARY KEY (kind, year)
+);
+CREATE TABLE IF NOT EXISTS categories (
+    kind TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    category,
+    capacity,
+    PRIMARY KEY (kind, year, position)
+);
+CREATE TABLE IF NOT EXISTS nights (
+    kind TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    nights,
+    PRIMARY KEY (kind, year, position, date)
+);
+"""
+
+# Only the cells holding a number are summed, like the isinstance(value, (int, float)) checks of the stages
+NUMERIC_NIGHTS = "typeof(nights) IN ('integer', 'real')"
+
+# A stored season, handed from stage to stage instead of its sheets. The digest is the content it was stored from,
+# source the export to store it from again when the store was removed in the meantime.
+Season = namedtuple("Season", ["kind", "year", "digest", "source"])
+
+
+@contextmanager
+def connect():
+    """
+    Open the store in a transaction, creating it on first use.
+    Columns without a type keep ints and floats apart like the export has them.
+    """
+    os.makedirs(os.path.dirname(HISTORY_DB) or ".", exist_ok=True)
+    connection = sqlite3.connect(HISTORY_DB, timeout=60)  # The previous years are ingested by parallel processes
+    try:
+        with connection:
+            connection.executescript(SCHEMA)
+            connection.execute(f"PRAGMA user_version = {STORE_FORMAT_VERSION}")
+            yield connection
+    finally:
+        connection.close()
+
+
+def cell_value(value):
+    """Return a sheet value as stored, empty cells (NaN) become NULL."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if hasattr(value, "item"):
+        return value.item()  # NumPy scalar
+    return value
+
+
+def stored_digest(kind, year):
+    """Return the digest of the export a season was stored from, None when the season is not stored."""
+    with connect() as connection:
+        stored = connection.execute("SELECT digest FROM seasons WHERE kind = ? AND year = ?", (kind, year)).fetchone()
+    return stored[0] if stored else None
+
+
+def ingest(input_file, kind, year):
+    """
+    Store the first sheet of an e-Camping export as the season (kind, year) and return its Season.
+    A file already ingested with the same content is not read again; a different file replaces the season.
+    """
+    digest = parse_cache.file_digest(input_file)
+    season = Season(kind, year, digest, input_file)
+    if stored_digest(kind, year) == digest:
+        logger.debug(f"Season {kind} {year} already stored from {input_file}")
+        return season
+
+    # header=None keeps every cell as the export has it (ints stay ints next to empty cells)
+    sheet = parse_cache.read_first_sheet(input_file, header=None)
+    labels = list(sheet.iloc[0])
+    if len(labels) < 2 or not all(isinstance(label, datetime) for label in labels[2:]):
+        raise ValueError(f"{input_file} is not an e-Camping export: expected Category, Capacity and date columns")
+    dates = [pd.Timestamp(label) for label in labels[2:]]
+
+    categories = []
+    nights = []
+    for position, row in enumerate(sheet.iloc[1:].itertuples(index=False)):
+        categories.append((kind, year, position, cell_value(row[0]), cell_value(row[1])))
+        nights.extend((kind, year, position, date.date().isoformat(), cell_value(value))
+                      for date, value in zip(dates, row[2:]))
+
+    with connect() as connection:
+        for table in ("seasons", "categories", "nights"):
+            connection.execute(f"DELETE FROM {table} WHERE kind = ? AND year = ?", (kind, year))
+        connection.execute("INSERT INTO seasons VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (kind, year, digest, os.path.basename(input_file), cell_value(labels[0]),
+                            cell_value(labels[1]), datetime.now().isoformat(timespec="seconds")))
+        connection.executemany("INSERT INTO categories VALUES (?, ?, ?, ?, ?)", categories)
+        connection.executemany("INSERT INTO nights VALUES (?, ?, ?, ?, ?)", nights)
+    logger.info(f"Stored season {kind} {year} from {input_file}: {len(categories)} categories, {len(dates)} days")
+    return season
+
+
+@contextmanager
+def read_season(season):
+    """
+    Open the store to read a season. A season that is no longer stored (history removed, season dropped)
+    while a cached stage still hands its Season over is stored again from its export first.
+    """
+    if stored_digest(season.kind, season.year) != season.digest:
+        ingest(season.source, season.kind, season.year)
+    with connect() as connection:
+        yield connection
+
+
+def season_labels(season):
+    """Return the (category, capacity) labels of the header of a season's export."""
+    with read_season(season) as connection:
+        return connection.execute("SELECT category_label, capacity_label FROM seasons WHERE kind = ? AND year = ?",
+                                  (season.kind, season.year)).fetchone()
+
+
+def season_categories(season):
+    """Return the (category, capacity) of every row of a season's export, in export order (the row positions)."""
+    with read_season(season) as connection:
+        return connection.execute("SELECT category, capacity FROM categories WHERE kind = ? AND year = ? "
+                                  "ORDER BY position", (season.kind, season.year)).fetchall()
+
+
+def season_dates(season):
+    """Return the days of a season as datetimes, in order."""
+    with read_season(season) as connection:
+        dates = connection.execute("SELECT DISTINCT date FROM nights WHERE kind = ? AND year = ? ORDER BY date",
+                                   (season.kind, season.year)).fetchall()
+    return [datetime.fromisoformat(date) for date, in dates]
+
+
+def category_nights(season):
+    """Return {position: nights of the whole season} of the rows of a season holding any number."""
+    with read_season(season) as connection:
+        return dict(connection.execute(
+            f"SELECT position, SUM(nights) FROM nights WHERE kind = ? AND year = ? AND {NUMERIC_NIGHTS} "
+            "GROUP BY position", (season.kind, season.year)).fetchall())
+
+
+def day_nights(season, positions):
+    """Return the nights of every day of a season (season_dates order) summed over the rows at positions."""
+    positions = list(positions)
+    with read_season(season) as connection:
+        totals = dict(connection.execute(
+            f"SELECT date, SUM(nights) FROM nights WHERE kind = ? AND year = ? AND {NUMERIC_NIGHTS} "
+            f"AND position IN ({', '.join('?' * len(positions))}) GROUP BY date",
+            (season.kind, season.year, *positions)).fetchall())
+    return [totals.get(date.date().isoformat(), 0) for date in season_dates(season)]
+
+
+def monthly_nights(season, alignment="date"):
+    """
+    Return {month number: {position: nights of that month}} with every month a day of the season counts in.
+    With the "weekday" alignment a day counts in the month of its 52-week aligned day in the current year,
+    "date" keeps the calendar months.
+    """
+    dates = season_dates(season)
+    if alignment == "date":
+        months = [date.month for date in dates]
+    else:
+        months = aligned_dates(dates, datetime.now().year, alignment).month
+    # Days without an aligned day (NaN month) count in no month
+    day_months = [(date.date().isoformat(), int(month)) for date, month in zip(dates, months) if not pd.isna(month)]
+    totals = {month: {} for _, month in day_months}
+    if not day_months:
+        return totals
+
+    with read_season(season) as connection:
+        rows = connection.execute(
+            f"WITH months(date, month) AS (VALUES {', '.join('(?, ?)' for _ in day_months)}) "
+            "SELECT m.month, n.position, SUM(n.nights) FROM nights n JOIN months m ON m.date = n.date "
+            f"WHERE n.kind = ? AND n.year = ? AND {NUMERIC_NIGHTS} GROUP BY m.month, n.position",
+            [value for day_month in day_months for value in day_month] + [season.kind, season.year]).fetchall()
+    for month, position, nights in rows:
+        totals[month][position] = nights
+    return totals
+
+
+def list_seasons():
+    """Return (kind, year, source, ingested) for every stored season."""
+    if not os.path.exists(HISTORY_DB):
+        return []
+    with connect() as connection:
+        return connection.execute("SELECT kind, year, source, ingested FROM seasons ORDER BY kind, year").fetchall()
+
+
+def drop_season(kind, year):
+    """Remove a season, the next run ingests it again from its export."""
+    with connect() as connection:
+        for table in ("seasons", "categories", "nights"):
+            connection.execute(f"DELETE FROM {table} WHERE kind = ? AND year = ?", (kind, year))
+    logger.info(f"Season {kind} {year} removed from {HISTORY_DB}.")
+
+
+if __name__ == "__main__":
+    # python season_store.py                -> list the stored seasons
+    # python season_store.py drop nat 2023  -> remove a season
+    if len(sys.argv) == 4 and sys.argv[1] == "drop" and sys.argv[2] in KINDS:
+        drop_season(sys.argv[2], int(sys.argv[3]))
+    else:
+        for kind, year, source, ingested in list_seasons():
+            logger.info(f"{kind} {year}: {source} (stored {ingested})")
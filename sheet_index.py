@@ -0,0 +1,100 @@
+from bisect import insort
+
+
+class SheetIndex:
+    """
+    Where things are in a worksheet: header text -> columns of the header row, label -> rows of the label column.
+    It is built in one pass over the cells of the sheet; set_header, set_label, insert_rows and insert_cols
+    change the sheet and keep the index up to date, so finding a column or a row never rescans the sheet.
+    """
+
+    def __init__(self, ws, header_row=1, label_column=1):
+        self.ws = ws
+        self.header_row = header_row
+        self.label_column = label_column
+        self._columns = {}
+        self._rows = {}
+        for (row, column), cell in ws._cells.items():
+            if cell.value is None:
+                continue
+            if row == header_row:
+                insort(self._columns.setdefault(cell.value, []), column)
+            if column == label_column:
+                insort(self._rows.setdefault(cell.value, []), row)
+
+    def columns(self, header):
+        """Return every column with this header, left to right."""
+        return list(self._columns.get(header, ()))
+
+    def column(self, header):
+        """Return the first column with this header, None when there is none."""
+        columns = self._columns.get(header)
+        return columns[0] if columns else None
+
+    def last_column(self, header):
+        """Return the last column with this header, None when there is none."""
+        columns = self._columns.get(header)
+        return columns[-1] if columns else None
+
+    def rows(self, label):
+        """Return every row with this label, top to bottom."""
+        return list(self._rows.get(label, ()))
+
+    def row(self, label):
+        """Return the first row with this label, None when there is none."""
+        rows = self._rows.get(label)
+        return rows[0] if rows else None
+
+    def last_row(self, label):
+        """Return the last row with this label, None when there is none."""
+        rows = self._rows.get(label)
+        return rows[-1] if rows else None
+
+    def first_row_starting_with(self, prefix):
+        """Return the first row whose label starts with prefix, None when there is none."""
+        rows = [rows[0] for label, rows in self._rows.items() if isinstance(label, str) and label.startswith(prefix)]
+        return min(rows, default=None)
+
+    def set_header(self, column, value):
+        """Write a header cell, like ws.cell(row=header_row, column=column).value = value."""
+        cell = self.ws.cell(row=self.header_row, column=column)
+        self._replace(self._columns, cell.value, value, column)
+        cell.value = value
+        return cell
+
+    def set_label(self, row, value):
+        """Write a label cell, like ws.cell(row=row, column=label_column).value = value."""
+        cell = self.ws.cell(row=row, column=self.label_column)
+        self._replace(self._rows, cell.value, value, row)
+        cell.value = value
+        return cell
+
+    @staticmethod
+    def _replace(positions, old, new, position):
+        """Move one position of a {value: positions} map from the value old to the value new."""
+        if old is not None:
+            positions[old].remove(position)
+            if not positions[old]:
+                del positions[old]
+        if new is not None:
+            insort(positions.setdefault(new, []), position)
+
+    @staticmethod
+    def _shift(positions, start, amount):
+        """Move every position from start on by amount, like the cells of an inserted row or column."""
+        for key, values in positions.items():
+            positions[key] = [value + amount if value >= start else value for value in values]
+
+    def insert_rows(self, idx, amount=1):
+        """ws.insert_rows(idx, amount), moving the labelled rows below it down."""
+        self.ws.insert_rows(idx, amount)
+        self._shift(self._rows, idx, amount)
+        if self.header_row >= idx:
+            self.header_row += amount
+
+    def insert_cols(self, idx, amount=1):
+        """ws.insert_cols(idx, amount), moving the headed columns right of it."""
+        self.ws.insert_cols(idx, amount)
+        self._shift(self._columns, idx, amount)
+        if self.label_column >= idx:
+            self.label_column += amount
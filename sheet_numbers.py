@@ -0,0 +1,69 @@
+import numpy as np
+
+
+class NumberBlock:
+    """
+    The numbers of a rectangle of a worksheet (rows min_row..max_row, columns min_col..max_col),
+    read once into a NumPy array so row totals, section totals, month buckets and percentages
+    are computed on whole arrays instead of one ws.cell(row, col).value at a time.
+    Cells that are not numbers count as 0, like the isinstance(value, (int, float)) checks of the stages.
+    Totals come back as Python ints when only ints were summed and as floats otherwise.
+    """
+
+    def __init__(self, ws, min_row, max_row, min_col, max_col):
+        self.min_row = min_row
+        self.min_col = min_col
+        shape = (max(max_row - min_row + 1, 0), max(max_col - min_col + 1, 0))
+        self.values = np.zeros(shape)
+        self.floats = np.zeros(shape, dtype=bool)
+        self.numeric = np.zeros(shape, dtype=bool)
+        for (row, column), cell in ws._cells.items():
+            if min_row <= row <= max_row and min_col <= column <= max_col:
+                value = cell.value
+                if isinstance(value, (int, float)):
+                    self.values[row - min_row, column - min_col] = value
+                    self.floats[row - min_row, column - min_col] = isinstance(value, float)
+                    self.numeric[row - min_row, column - min_col] = True
+
+    def _rows(self, first_row, last_row):
+        return slice(first_row - self.min_row, last_row - self.min_row + 1)
+
+    def _columns(self, first_col, last_col):
+        return slice(first_col - self.min_col, last_col - self.min_col + 1)
+
+    @staticmethod
+    def _python(totals, floats):
+        """Turn summed arrays back into the ints and floats a Python sum would have given."""
+        return [total if has_float else int(total) for total, has_float in zip(totals.tolist(), floats.tolist())]
+
+    def row_totals(self, first_col, last_col):
+        """Return {row: sum of the row over first_col..last_col} for every row of the block."""
+        columns = self._columns(first_col, last_col)
+        totals = self._python(self.values[:, columns].sum(axis=1), self.floats[:, columns].any(axis=1))
+        return dict(enumerate(totals, start=self.min_row))
+
+    def column_totals(self, first_row, last_row):
+        """Return {column: sum of the column over first_row..last_row} for every column of the block."""
+        rows = self._rows(first_row, last_row)
+        totals = self._python(self.values[rows].sum(axis=0), self.floats[rows].any(axis=0))
+        return dict(enumerate(totals, start=self.min_col))
+
+    def bucket_totals(self, ranges):
+        """Return {key: {row: sum of the row over first_col..last_col}} for {key: (first_col, last_col)}, e.g. months."""
+        return {key: self.row_totals(first_col, last_col) for key, (first_col, last_col) in ranges.items()}
+
+    def percent_to_total(self, column, sections):
+        """
+        Return {row: value / section total} of a column for the rows holding a number in the
+        [(first_row, last_row)] sections, 0 for the rows of a section whose total is 0.
+        """
+        percentages = {}
+        values = self.values[:, column - self.min_col]
+        numeric = self.numeric[:, column - self.min_col]
+        for first_row, last_row in sections:
+            rows = self._rows(first_row, last_row)
+            total = values[rows].sum()
+            shares = values[rows] / total if total else np.zeros_like(values[rows])
+            percentages.update((row, share) for row, share, is_number in
+                               zip(range(first_row, last_row + 1), shares.tolist(), numeric[rows].tolist()) if is_number)
+        return percentages
@@ -0,0 +1,36 @@
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import PatternFill
+from openpyxl.styles.cell_style import StyleArray
+
+
+def style_ids(wb, font=None, fill=None, border=None):
+    """
+    Register styles in the workbook once and return {StyleArray field: index} pointing at them.
+    cell.font = ... hashes and looks the style up again for every cell; restyle() only sets the indexes.
+    """
+    ids = {}
+    if font is not None:
+        ids["fontId"] = wb._fonts.add(font)
+    if fill is not None:
+        ids["fillId"] = wb._fills.add(fill)
+    if border is not None:
+        ids["borderId"] = wb._borders.add(border)
+    return ids
+
+
+def restyle(cell, ids):
+    """Give the cell the registered styles of style_ids(), like assigning cell.font/fill/border."""
+    if not cell._style:
+        cell._style = StyleArray()
+    for field, index in ids.items():
+        setattr(cell._style, field, index)
+
+
+def fill_ranges(ws, ranges, color, formula="TRUE"):
+    """
+    Fill cell ranges ("B2:B40") through one conditional formatting rule instead of a fill per cell.
+    formula is relative to the top left cell of the first range, the default fills every cell.
+    """
+    if ranges:
+        fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
+        ws.conditional_formatting.add(" ".join(ranges), FormulaRule(formula=[formula], fill=fill))
@@ -0,0 +1,198 @@
+import hashlib
+import inspect
+import os
+import pickle
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import parse_cache
+from instrumentation import StageRecorder, stage_in_worker
+from logger import logger
+
+# Stage outputs, keyed by the hash of the stage code and of everything the stage reads
+STAGE_CACHE_DIR = os.path.join("cache", "stages")
+STAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+STAGE_CACHE_FORMAT_VERSION = 1
+# Helper modules the stages rely on besides their own, their code is part of every key
+SHARED_MODULES = ("workbook_io", "parse_cache", "season_store", "column_plan", "sheet_numbers", "sheet_styles",
+                  "header_calendar", "sheet_index", "season_align")
+
+_code_versions = {}
+
+
+def code_version(module_name):
+    """Return the hash of a module's source, the part of a stage key that changes when the stage code changes."""
+    if module_name not in _code_versions:
+        module = sys.modules[module_name]
+        try:
+            with open(inspect.getsourcefile(module), "rb") as f:
+                _code_versions[module_name] = hashlib.sha256(f.read()).hexdigest()
+        except (OSError, TypeError):
+            # No source next to the code (packaged executable): every new build invalidates the cache
+            build = os.stat(sys.executable)
+            _code_versions[module_name] = f"build {build.st_size} {build.st_mtime_ns}"
+    return _code_versions[module_name]
+
+
+class StageNode:
+    """One stage of the graph: the stage function, its inputs (files, values or other nodes) and its output."""
+
+    def __init__(self, name, function, args, kwargs, key):
+        self.name = name
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.done = False
+        self.value = None
+
+
+class StageGraph:
+    """
+    The pipeline as a graph of stages, evaluated on demand like make:
+    a stage whose key (stage code + inputs) has a cached output is not run, and nor are the stages feeding it.
+    Lists of independent stages (the previous years) are evaluated together in a process pool.
+    """
+
+    def __init__(self, recorder=None, max_workers=None, use_cache=True):
+        self.recorder = recorder or StageRecorder()
+        self.max_workers = max_workers
+        self.use_cache = use_cache
+
+    def add(self, name, function, *args, **kwargs):
+        """Declare a stage; arguments may be other nodes, lists of nodes, file paths or plain values."""
+        digest = hashlib.sha256()
+        digest.update(f"v{STAGE_CACHE_FORMAT_VERSION} {function.__module__}.{function.__qualname__}".encode())
+        for module_name in (function.__module__,) + SHARED_MODULES:
+            digest.update(code_version(module_name).encode())
+        digest.update(str(datetime.now().year).encode())  # The stages label and align by the current year
+        for value in args:
+            digest.update(self._input_key(value).encode())
+        for keyword, value in sorted(kwargs.items()):
+            digest.update(f"{keyword}={self._input_key(value)}".encode())
+        return StageNode(name, function, args, kwargs, digest.hexdigest())
+
+    def _input_key(self, value):
+        """Describe one stage input for the key: upstream keys for nodes, content hashes for files."""
+        if isinstance(value, StageNode):
+            return value.key
+        if isinstance(value, list):
+            return "[" + ",".join(self._input_key(item) for item in value) + "]"
+        if isinstance(value, str) and os.path.isfile(value):
+            return parse_cache.file_digest(value)
+        return repr(value)
+
+    def _cache_path(self, node):
+        return os.path.join(STAGE_CACHE_DIR, f"{node.key}.pkl")
+
+    def _load(self, node):
+        """Fill the node from the cache, return False on a miss."""
+        if node.done:
+            return True
+        if not self.use_cache:
+            return False
+        entry = self._cache_path(node)
+        if not os.path.exists(entry):
+            return False
+        try:
+            with self.recorder.span(f"{node.name} (cached)"):
+                with open(entry, "rb") as f:
+                    node.value = pickle.load(f)
+            os.utime(entry)  # Mark as recently used for eviction
+        except Exception as e:
+            logger.warning(f"Dropping unreadable stage cache entry {entry}: {e}")
+            parse_cache.remove_entry(entry)
+            return False
+        node.done = True
+        logger.info(f"{node.name} is unchanged, using the cached output")
+        return True
+
+    def _store(self, node, value):
+        node.value = value
+        node.done = True
+        if not self.use_cache:
+            return
+        entry = self._cache_path(node)
+        try:
+            os.makedirs(STAGE_CACHE_DIR, exist_ok=True)
+            temp_entry = f"{entry}.{os.getpid()}.tmp"
+            with open(temp_entry, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_entry, entry)  # Atomic, the branches may write the cache at the same time
+            parse_cache.evict(STAGE_CACHE_MAX_BYTES, STAGE_CACHE_DIR)
+        except (OSError, pickle.PicklingError) as e:
+            logger.warning(f"Could not write stage cache entry {entry}: {e}")
+
+    def _resolve(self, value):
+        if isinstance(value, StageNode):
+            return self.evaluate(value)
+        if isinstance(value, list) and any(isinstance(item, StageNode) for item in value):
+            return self.evaluate_all(value)
+        return value
+
+    def evaluate(self, node):
+        """Return the output of a stage, running it and the stages it needs only when their output is not cached."""
+        if self._load(node):
+            return node.value
+        args = [self._resolve(value) for value in node.args]
+        kwargs = {keyword: self._resolve(value) for keyword, value in node.kwargs.items()}
+        self._store(node, self.recorder.stage(node.name, node.function, *args, **kwargs))
+        return node.value
+
+    def evaluate_all(self, nodes):
+        """
+        Return the outputs of independent stages in order, running the uncached ones concurrently in a process pool.
+        Every failing stage is logged and reported in the raised error.
+        max_workers=None uses one process per CPU, max_workers=1 runs them one after the other in this process.
+        """
+        missing = [node for node in nodes if not self._load(node)]
+        workers = min(self.max_workers or os.cpu_count() or 1, len(missing))
+
+        failed = []
+        if workers <= 1:
+            for node in missing:
+                try:
+                    self.evaluate(node)
+                except Exception as e:
+                    logger.error(f"{node.name} failed: {e} {traceback.format_exc()}")
+                    failed.append(f"{node.name}: {e}")
+        else:
+            logger.info(f"Running {len(missing)} stages in {workers} processes")
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [(node, executor.submit(stage_in_worker, self.recorder.child(), node.name, node.function,
+                                                  *[self._resolve(value) for value in node.args],
+                                                  **{keyword: self._resolve(value) for keyword, value in node.kwargs.items()}))
+                           for node in missing]
+                for node, future in futures:
+                    try:
+                        value, events = future.result()
+                        self.recorder.merge(events)
+                        self._store(node, value)
+                    except Exception as e:
+                        logger.error(f"{node.name} failed: {e} {traceback.format_exc()}")
+                        failed.append(f"{node.name}: {e}")
+
+        if failed:
+            raise RuntimeError(f"Processing failed for {'; '.join(failed)}")
+        return [node.value for node in nodes]
+
+
+def clear_stage_cache():
+    """Invalidate every cached stage output."""
+    entries = parse_cache.list_entries(STAGE_CACHE_DIR)
+    for path, _, _ in entries:
+        parse_cache.remove_entry(path)
+    logger.info(f"Stage cache cleared, {len(entries)} entries removed.")
+
+
+if __name__ == "__main__":
+    # python stage_graph.py clear  -> remove all cached stage outputs
+    # python stage_graph.py        -> show cache usage
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        clear_stage_cache()
+    else:
+        cached = parse_cache.list_entries(STAGE_CACHE_DIR)
+        logger.info(f"Stage cache {STAGE_CACHE_DIR}: {len(cached)} entries, "
+                    f"{sum(size for _, size, _ in cached) / 1024:.1f} KB of {STAGE_CACHE_MAX_BYTES / 1024 / 1024:.0f} MB")
@@ -0,0 +1,132 @@
+import pytest
+from openpyxl import Workbook
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from column_plan import ColumnPlan, RowPlan
+from workbook_io import settle_book
+
+# (operation, arguments) in the terms of ColumnPlan: insert(column, amount), move(column, to_column),
+# delete(column, amount), set_value(row, column, value)
+SEQUENCES = {
+    # The per_nat_stage4 pattern: room for the previous years, their months moved in, totals reordered
+    "stage4": [("insert", 3, 2), ("insert", 6, 2), ("move", 9, 4), ("delete", 9), ("move", 9, 7), ("delete", 9),
+               ("insert", 10), ("set_value", 1, 10, "Total 2025"), ("move", 12, 11), ("delete", 8)],
+    "edges": [("move", 2, 8), ("insert", 1), ("delete", 4, 2), ("move", 6, 2), ("insert", 12, 3),
+              ("set_value", 3, 14, 42), ("delete", 1)],
+}
+
+
+def build_sheet():
+    """A sheet with values, gaps, styled cells and column widths."""
+    wb = Workbook()
+    ws = wb.active
+    for column in range(1, 11):
+        ws.cell(row=1, column=column).value = f"H{column}"
+        ws.column_dimensions[get_column_letter(column)].width = 5 + column
+        for row in range(2, 7):
+            if (row + column) % 4:  # Leave some cells out, they must stay out
+                ws.cell(row=row, column=column).value = row * 100 + column
+        if column % 3 == 0:
+            ws.cell(row=2, column=column).font = Font(bold=True)
+            ws.cell(row=4, column=column).fill = PatternFill(start_color="FFFF00", end_color="FFFF00",
+                                                            fill_type="solid")
+    return wb
+
+
+def apply_with_openpyxl(ws, sequence):
+    """Run the sequence cell by cell, the way the stages did before the plan existed."""
+    for operation, *arguments in sequence:
+        if operation == "insert":
+            ws.insert_cols(*arguments)
+        elif operation == "delete":
+            ws.delete_cols(*arguments)
+        elif operation == "move":
+            column, to_column = arguments
+            letter = get_column_letter(column)
+            ws.move_range(f"{letter}1:{letter}{ws.max_row}", cols=to_column - column)
+        else:
+            row, column, value = arguments
+            ws.cell(row=row, column=column).value = value
+
+
+def apply_with_plan(ws, sequence):
+    plan = ColumnPlan(ws)
+    for operation, *arguments in sequence:
+        getattr(plan, operation)(*arguments)
+    plan.apply()
+
+
+def snapshot(wb):
+    ws = settle_book(wb).active
+    cells = {coordinate: (cell.value, cell.font.b, cell.fill.fgColor.rgb, cell.fill.fill_type, tuple(cell._style))
+             for coordinate, cell in ws._cells.items()}
+    assert all(cell.row == row and cell.column == column for (row, column), cell in ws._cells.items())
+    widths = {key: dimension.width for key, dimension in ws.column_dimensions.items()}
+    return cells, widths, ws.max_row, ws.max_column
+
+
+@pytest.mark.parametrize("name", SEQUENCES)
+def test_plan_matches_openpyxl_column_operations(name):
+    expected = build_sheet()
+    apply_with_openpyxl(expected.active, SEQUENCES[name])
+    planned = build_sheet()
+    apply_with_plan(planned.active, SEQUENCES[name])
+
+    expected_cells, expected_widths, *expected_extent = snapshot(expected)
+    planned_cells, planned_widths, *planned_extent = snapshot(planned)
+    assert planned_cells == expected_cells
+    assert planned_widths == expected_widths
+    assert planned_extent == expected_extent
+
+
+@pytest.mark.parametrize("name", SEQUENCES)
+def test_planned_headers_match_the_sheet_after_apply(name):
+    wb = build_sheet()
+    plan = ColumnPlan(wb.active)
+    for operation, *arguments in SEQUENCES[name]:
+        getattr(plan, operation)(*arguments)
+    headers = plan.headers()
+    plan.apply()
+    ws = settle_book(wb).active
+    assert headers == [ws.cell(row=1, column=column).value for column in range(1, ws.max_column + 1)]
+
+
+def test_reorder_matches_openpyxl_column_operations():
+    # Columns 3, a new empty one and 1, the rest deleted
+    expected = build_sheet()
+    apply_with_openpyxl(expected.active, [("delete", 4, 7), ("delete", 2), ("move", 1, 3), ("move", 2, 1)])
+    planned = build_sheet()
+    plan = ColumnPlan(planned.active)
+    plan.reorder([3, None, 1])
+    plan.apply()
+
+    assert snapshot(planned) == snapshot(expected)
+
+
+# The per_zone_stage6 pattern: empty day columns after Capacity, then a header row per year on top
+# and a total row per year below the section totals, several below the same row
+ROW_INSERTS = [(0, ["Category", "Capacity", 1, 2]), (3, ["Total 2024", 7, None, 8]), (3, ["Total 2024 B", 9]),
+               (6, ["Total 2024 C", 10, 11]), (0, ["Category", "Capacity", 3]), (3, ["Total 2023", 12])]
+
+
+def test_row_plan_matches_openpyxl_inserts():
+    expected = build_sheet()
+    ws = expected.active
+    ws.insert_cols(3, 2)
+    original_rows = list(range(ws.max_row + 1))  # The original row now at every sheet row, None for new rows
+    for row, values in ROW_INSERTS:
+        target_row = original_rows.index(row) + 1
+        ws.insert_rows(target_row)
+        original_rows.insert(target_row, None)
+        for column, value in enumerate(values, start=1):
+            ws.cell(row=target_row, column=column).value = value
+
+    planned = build_sheet()
+    plan = RowPlan(planned.active)
+    plan.insert_cols(3, 2)
+    for row, values in ROW_INSERTS:
+        plan.insert_below(row, values)
+    plan.apply()
+
+    assert snapshot(planned) == snapshot(expected)
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+from openpyxl import Workbook
+
+import season_store
+from season_align import aligned_dates
+from per_nat_stage2 import per_nat_stage2
+
+DAYS = [datetime(2024, 4, 29), datetime(2024, 4, 30), datetime(2024, 5, 1)]
+
+
+@pytest.fixture
+def export(tmp_path, monkeypatch):
+    """A nationality export where Greece has two rows of the rooms section."""
+    monkeypatch.chdir(tmp_path)  # The parse cache and the season store are written under the working directory
+    # The weekday alignment compares the days with the current season, 2025 here
+    monkeypatch.setattr(season_store, "aligned_dates",
+                        lambda dates, year, alignment: aligned_dates(dates, 2025, alignment))
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Category", "Capacity"] + DAYS)
+    ws.append(["Greece", None, 1, 2, 3])
+    ws.append(["Denmark", None, 4, "", 6])
+    ws.append(["Greece", None, 10, 20, 30])
+    ws.append(["Camping Greece", None, 100, 200, 300])
+    path = tmp_path / "availabilityPerNationality2024.xlsx"
+    wb.save(path)
+    return str(path)
+
+
+def columns(ws):
+    return {ws.cell(row=1, column=col).value: col for col in range(1, ws.max_column + 1)}
+
+
+@pytest.mark.parametrize("alignment", ["date", "weekday"])
+def test_totals_are_summed_per_row_not_per_label(export, alignment):
+    ws = per_nat_stage2(export, None, 2024, alignment=alignment).active
+    header = columns(ws)
+    rows = {row: ws.cell(row=row, column=1).value for row in range(2, ws.max_row + 1)}
+    assert list(rows.values()) == ["Greece", "Denmark", "Greece", "Total Rooms", None, "Camping Greece",
+                                   "Total Camping"]
+
+    totals = [ws.cell(row=row, column=header["Total 2024"]).value for row in rows]
+    assert totals == [6, 10, 60, 0, 0, 600, 0]
+    april = [ws.cell(row=row, column=header["Apr 2024"]).value for row in rows]
+    may = [ws.cell(row=row, column=header["May 2024"]).value for row in rows]
+    if alignment == "date":
+        assert april == [3, 4, 30, None, 0, 300, None]
+        assert may == [3, 6, 30, None, 0, 300, None]
+    else:
+        # 29/04-01/05/2024 are compared with 28/04-30/04/2025, so all three fall in April and May stays empty
+        assert april == [6, 10, 60, None, 0, 600, None]
+        assert may == [None] * 7
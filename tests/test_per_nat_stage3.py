@@ -0,0 +1,87 @@
+from datetime import datetime
+
+import pytest
+from openpyxl import Workbook
+
+import season_store
+from per_nat_stage2 import store_previous_year
+from per_nat_stage3 import SEPARATOR_ROW, join_countries, per_nat_stage3
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """An empty season store, the parse cache in the test directory."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(season_store, "HISTORY_DB", str(tmp_path / "history" / "seasons.sqlite"))
+    return tmp_path
+
+
+def sheet(header, rows):
+    """A nationality sheet: header row, then (first column, values) rows, None for the empty separator row."""
+    wb = Workbook()
+    ws = wb.active
+    ws.append(header)
+    for row in rows:
+        ws.append([None] if row is None else [row[0]] + list(row[1]))
+    return wb
+
+
+def current_year():
+    return sheet(["Category", "Δευ 14/04", "Τρι 15/04"],
+                 [("Denmark", [1, 2]), ("Greece", [3, 4]), ("Total Rooms", [4, 6]), None,
+                  ("Camping France", [5, 6]), ("Camping Italy", [7, 8]), ("Total Camping", [12, 14])])
+
+
+def previous_year(store, year, rooms, camping):
+    """A nationality export of a previous year with one day, stored in the season store."""
+    export = sheet(["Category", "Capacity", datetime(year, 4, 15)],
+                   [(name, [None, value]) for name, value in rooms + camping])
+    path = store / f"availabilityPerNationality{year}.xlsx"
+    export.save(path)
+    return store_previous_year(str(path), year)
+
+
+def first_column(ws):
+    return [ws.cell(row=row, column=1).value for row in range(1, ws.max_row + 1)]
+
+
+def test_missing_nationalities_join_their_own_section(store):
+    # 2024 has a room nationality the current year has not (Austria) and misses one it has (Greece)
+    year_2024 = previous_year(store, 2024, [("Austria", 10), ("Denmark", 11)],
+                              [("Camping France", 12), ("Camping Italy", 13)])
+    # 2023 has a camping nationality no other year has, alphabetically before every room nationality but Austria
+    year_2023 = previous_year(store, 2023, [("Denmark", 20), ("Greece", 21)],
+                              [("Camping Belgium", 22), ("Camping France", 23)])
+
+    ws = per_nat_stage3(current_year(), [year_2024, year_2023]).active
+
+    assert first_column(ws) == ["Category", "Austria", "Denmark", "Greece", "Total Rooms", SEPARATOR_ROW,
+                                "Camping Belgium", "Camping France", "Camping Italy", "Total Camping"]
+    rows = {name: row for row, name in enumerate(first_column(ws), start=1)}
+
+    # Current year B:C, separator D, 2024 E:M (Category, Total, empty, Apr-Sep), separator N, 2023 O:W
+    assert ws.cell(row=1, column=5).value == "Category" and ws.cell(row=1, column=6).value == "Total 2024"
+    assert ws.cell(row=1, column=15).value == "Category" and ws.cell(row=1, column=16).value == "Total 2023"
+    assert ws.cell(row=1, column=8).value == "Apr 2024" and ws.cell(row=1, column=18).value == "Apr 2023"
+    assert [ws.cell(row=rows["Austria"], column=column).value for column in (2, 6, 16)] == [None, 10, None]
+    assert [ws.cell(row=rows["Greece"], column=column).value for column in (2, 6, 16)] == [3, None, 21]
+    assert [ws.cell(row=rows["Camping Belgium"], column=column).value for column in (2, 6, 16)] == [None, None, 22]
+    assert [ws.cell(row=rows["Camping Italy"], column=column).value for column in (2, 6, 16)] == [7, 13, None]
+    assert [ws.cell(row=rows["Camping Italy"], column=column).value for column in (8, 9, 18)] == [13, None, None]
+
+    # A separator column covers the rows that existed before its year added rows, like row inserts left it
+    def black(row, column):
+        return ws.cell(row=row, column=column).fill.fill_type == "solid"
+
+    assert black(rows["Denmark"], 4) and not black(rows["Austria"], 4)
+    assert black(rows["Austria"], 14) and not black(rows["Camping Belgium"], 14)
+
+
+def test_join_keeps_the_separator_row_and_sections_apart():
+    names = ["Denmark", "Total Rooms", SEPARATOR_ROW, "Camping France", "Total Camping"]
+    insertions = join_countries(names, ["Zambia", "sweden", "Camping Austria", "Camping Zambia", None, "Denmark"])
+    # Room nationalities go before Total Rooms, never after the separator row, even when they sort after it
+    assert insertions[1] == ["Zambia", "sweden"]
+    assert insertions[3] == ["Camping Austria"]
+    assert insertions[4] == ["Camping Zambia"]
+    assert set(insertions) == {1, 3, 4}
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from openpyxl import Workbook
+
+from per_nat_stage4 import process_per_nat_stage4
+
+YEAR = datetime.now().year
+
+
+def stage3_sheet():
+    """A Stage 7 header with two previous years; row 2 holds the column number of every column."""
+    headers = ["Category", f"Total {YEAR}", f"Percent to Total {YEAR}", f"Apr {YEAR}", f"May {YEAR}", None,
+               "Category", f"Total {YEAR - 2}", None, f"Apr {YEAR - 2}", f"May {YEAR - 2}", None,
+               "Category", f"Total {YEAR - 3}", None, f"Apr {YEAR - 3}", f"May {YEAR - 3}"]
+    wb = Workbook()
+    ws = wb.active
+    ws.append(headers)
+    ws.append(list(range(1, len(headers) + 1)))
+    return wb
+
+
+def test_columns_are_placed_like_the_insert_move_delete_steps():
+    ws = process_per_nat_stage4(stage3_sheet(), None, 2, [YEAR - 2, YEAR - 3]).active
+    headers = [ws.cell(row=1, column=column).value for column in range(1, ws.max_column + 1)]
+    # Every current year month gets one column per previous year counted back from it, YEAR - 1 stays empty.
+    # The first previous year's block gets the totals; Total YEAR - 3 replaces the empty column after them
+    # and leaves its own column empty, the months of YEAR - 3 stay where they were.
+    assert headers == ["Category", f"Percent to Total {YEAR}", f"Apr {YEAR}", None, f"Apr {YEAR - 2}",
+                       f"May {YEAR}", None, f"May {YEAR - 2}", None, "Category", f"Total {YEAR}",
+                       f"Total {YEAR - 2}", f"Total {YEAR - 3}", None, "Category", None, None,
+                       f"Apr {YEAR - 3}", f"May {YEAR - 3}"]
+    assert [ws.cell(row=2, column=column).value for column in range(1, ws.max_column + 1)] == [
+        1, 3, 4, None, 10, 5, None, 11, 6, 7, None, 8, 14, 12, 13, None, 15, 16, 17]
@@ -0,0 +1,86 @@
+import os
+import zipfile
+from datetime import datetime
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+import per_nat_stage6
+from per_nat_stage6 import DATA_ROW_FORMULA, SEPARATOR_ROW_FORMULA
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+HEADER = ["Category", "Δευ 14/04", "Τρι 15/04", "Πεμ 01/05", None, "Total 2025", "Percent to Total 2025", "sep_col",
+          "Apr 2025", "May 2025", None, "Total 2024", "Percent to Total 2024", "Apr 2024", "May 2024",
+          "Percent difference 2025 - 2024"]
+ROWS = [("Greece Rooms", [3, 4, 5], [40, 10, 30]), ("Germany Rooms", [1, 0, 2], [8, 3, 5]), ("Total Rooms", None, None),
+        ("sep_row", None, None), ("Greece", [7, 7, 7], [15, 5, 10]), ("Total Camping", None, None)]
+LAST_ROW = len(ROWS) + 2  # The black row after the data
+BLACK = "00000000"
+
+
+class Datetime2025(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2025, 6, 1)
+
+
+@pytest.fixture
+def stage5_output(tmp_path, monkeypatch):
+    """A stage 5 nationality sheet of 2025 with 2024 as previous year, saved to a file."""
+    monkeypatch.setattr(per_nat_stage6, "datetime", Datetime2025)
+    wb = Workbook()
+    ws = wb.active
+    ws.append(HEADER)
+    for label, days, previous in ROWS:
+        previous_cells = [previous[0], None, previous[1], previous[2]] if previous else [None] * 4
+        ws.append([label] + (days or [None] * 3) + [None] * 7 + previous_cells + [None])
+    path = tmp_path / "per_nat_stage5_output.xlsx"
+    wb.save(path)
+    return path
+
+
+def fill_color(cell):
+    return cell.fill.fgColor.rgb if cell.fill.fill_type else None
+
+
+def test_default_output_matches_the_cell_fill_output(stage5_output, tmp_path):
+    """Without range_fills the sheet is byte for byte the one the stage wrote before the option existed."""
+    output = tmp_path / "per_nat_stage6_output.xlsx"
+    per_nat_stage6.per_nat_stage6(str(stage5_output), str(output), [2024])
+
+    with zipfile.ZipFile(output) as archive:
+        for part, expected in (("xl/worksheets/sheet1.xml", "per_nat_stage6_sheet.xml"),
+                               ("xl/styles.xml", "per_nat_stage6_styles.xml")):
+            with open(os.path.join(DATA_DIR, expected), "rb") as f:
+                assert archive.read(part) == f.read(), part
+
+
+def test_range_fills_output_has_the_expected_rules(stage5_output, tmp_path):
+    cell_output = tmp_path / "cells.xlsx"
+    range_output = tmp_path / "ranges.xlsx"
+    per_nat_stage6.per_nat_stage6(str(stage5_output), str(cell_output), [2024])
+    per_nat_stage6.per_nat_stage6(str(stage5_output), str(range_output), [2024], range_fills=True)
+    cells = load_workbook(cell_output).active
+    ranges = load_workbook(range_output).active
+
+    # Same values and the same extent, only the fills differ
+    assert ranges.max_row == cells.max_row == LAST_ROW
+    assert ([[cell.value for cell in row] for row in ranges.iter_rows()]
+            == [[cell.value for cell in row] for row in cells.iter_rows()])
+
+    rules = {str(conditional_format.sqref): rule for conditional_format in ranges.conditional_formatting
+             for rule in conditional_format.rules if rule.type == "expression"}
+    assert rules["E2:E8 H2:H8 K2:K8"].formula == ["TRUE"]
+    assert rules["A2:P7"].formula == [SEPARATOR_ROW_FORMULA]
+    assert rules["I2:I8 J2:J8"].formula == [DATA_ROW_FORMULA]
+    assert rules["N2:N8 O2:O8"].formula == [DATA_ROW_FORMULA]
+    assert rules["I2:I8 J2:J8"].dxf.fill.bgColor.rgb != rules["N2:N8 O2:O8"].dxf.fill.bgColor.rgb
+    assert len(rules) == 4
+
+    # The rules replace the cell fills, except on the black row after the data
+    assert fill_color(ranges["E3"]) is None and fill_color(cells["E3"]) == BLACK
+    assert fill_color(ranges["B5"]) is None and fill_color(cells["B5"]) == BLACK
+    assert fill_color(ranges["I2"]) is None and fill_color(cells["I2"]) is not None
+    assert all(fill_color(cell) == BLACK for cell in ranges[LAST_ROW])
+    assert all(fill_color(cell) == BLACK for cell in cells[LAST_ROW])
@@ -0,0 +1,32 @@
+import logging
+
+import pandas as pd
+
+from per_zone_stage3 import ACCOMMODATION_CAPACITIES, CAMPING_CAPACITIES, update_capacity_column
+
+
+def stage2_frame():
+    """A stage 2 sheet read with header=None: accommodations, the Youth Hostel and the camping areas."""
+    rows = [["Category", "Capacity"], ["APT", 1], [".LUX for 4", 1], ["Villa", 9], [None, None],
+            [".Youth Hostel", 46], [None, None], ["2", 1], ["Κ", 1], [" area Δ ", 1], ["8", 5]]
+    return pd.DataFrame(rows)
+
+
+def test_capacities_are_mapped_on_the_normalized_names():
+    df = update_capacity_column(stage2_frame(), ACCOMMODATION_CAPACITIES, "accommodations")
+    df = update_capacity_column(df, CAMPING_CAPACITIES, "camping areas")
+    assert df[1].tolist() == ["Capacity", 2, 51, 9, None, 46, None, 20, 80, 12, 5]
+
+
+def test_unmatched_rows_of_each_section_are_reported(caplog):
+    with caplog.at_level(logging.INFO, logger="PlanoKratiseon"):
+        df = update_capacity_column(stage2_frame(), ACCOMMODATION_CAPACITIES, "accommodations")
+        update_capacity_column(df, CAMPING_CAPACITIES, "camping areas")
+
+    warnings = [record.getMessage() for record in caplog.records if record.levelno == logging.WARNING]
+    # Only the rows of the section being matched, the Youth Hostel and the other section are not reported
+    assert warnings == ["The following accommodations have no hardcoded capacity and keep the one of the export: Villa",
+                        "The following camping areas have no hardcoded capacity and keep the one of the export: 8"]
+    skipped = [record.getMessage() for record in caplog.records if "were skipped" in record.getMessage()]
+    assert "Beach" in skipped[0] and "APT," not in skipped[0]
+    assert "area 3" in skipped[1] and "area 2," not in skipped[1]
@@ -0,0 +1,32 @@
+from openpyxl import Workbook
+
+from per_zone_stage7 import RowKinds, apply_styling
+
+
+def stage6_sheet():
+    wb = Workbook()
+    ws = wb.active
+    for values in [["Category", "Capacity", "Fri 02/05", "Mon 05/05"], ["APT", 2, 1, 0],
+                   ["Total Accommodations 2025", 2, "=SUM(C2:C2)", "=SUM(D2:D2)"], ["Πληρότητα", None, "=C3/B3"],
+                   [None], ["Category", "Capacity", "Sat 03/05"], ["2", 20, 5]]:
+        ws.append(values)
+    return ws
+
+
+def fill(ws, row, column):
+    return ws.cell(row=row, column=column).fill.fgColor.rgb if ws.cell(row=row, column=column).fill.fill_type else None
+
+
+def test_rows_are_styled_by_their_kind():
+    ws = stage6_sheet()
+    row_kinds = RowKinds(ws)
+    assert [row_kinds.kinds[row] for row in range(1, 8)] == ['category', 'data', 'total', 'occupancy', 'empty',
+                                                             'category', 'data']
+    apply_styling(ws, row_kinds)
+
+    assert [fill(ws, row, 2) for row in range(1, 8)] == [None, None, "00FFFF00", "00CCFFCC", "00000000", None, None]
+    assert ws.cell(row=3, column=1).font.b and not ws.cell(row=2, column=1).font.b
+    # Weekend date headers of the Category rows, every cell of the sheet with a grid border
+    assert [fill(ws, 1, column) for column in (3, 4)] == ["00FFCCCC", None]
+    assert fill(ws, 6, 3) == "00FFCCCC"
+    assert all(cell.border.left.style == "thin" for row in ws.iter_rows() for cell in row)
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import plan_organizer_cli
+
+
+@pytest.fixture
+def exports(tmp_path):
+    zone, availability_type = tmp_path / "zone.xls", tmp_path / "type.xls"
+    zone.write_bytes(b"")
+    availability_type.write_bytes(b"")
+    return str(zone), str(availability_type)
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    """Stand in for run_plan and record the output of every job it is called for."""
+    outputs = []
+
+    def run_plan(**job):
+        outputs.append(job["output_file"])
+        return job["output_file"], False
+
+    monkeypatch.setattr(plan_organizer_cli, "run_plan", run_plan)
+    return outputs
+
+
+def run_batch(tmp_path, jobs):
+    job_file = tmp_path / "jobs.json"
+    job_file.write_text(json.dumps(jobs), encoding="utf-8")
+    return plan_organizer_cli.main(["--job", str(job_file)])
+
+
+def test_batch_jobs_with_their_own_outputs_all_run(tmp_path, exports, runs):
+    zone, availability_type = exports
+    jobs = [{"zone": zone, "type": availability_type, "output": str(tmp_path / f"plan_{number}.xlsx")}
+            for number in (1, 2)]
+    assert run_batch(tmp_path, jobs) == plan_organizer_cli.EXIT_OK
+    assert runs == [job["output"] for job in jobs]
+
+
+@pytest.mark.parametrize("outputs", [[None, "plan.xlsx"], [None, None], ["plan.xlsx", "./plan.xlsx"]])
+def test_batch_jobs_must_not_share_an_output(tmp_path, exports, runs, outputs, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    zone, availability_type = exports
+    jobs = [{"zone": zone, "type": availability_type} | ({"output": output} if output else {}) for output in outputs]
+    assert run_batch(tmp_path, jobs) == plan_organizer_cli.EXIT_INVALID_JOB
+    assert runs == []
+
+
+def test_a_single_job_may_use_the_default_output(tmp_path, exports, runs):
+    zone, availability_type = exports
+    assert run_batch(tmp_path, [{"zone": zone, "type": availability_type}]) == plan_organizer_cli.EXIT_OK
+    assert runs == [None]
@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+from season_align import WEEK_YEAR_DAYS, SeasonAlignment, aligned_dates
+
+
+def dates(*days):
+    return pd.to_datetime(list(days))
+
+
+def test_date_mode_keeps_the_calendar_date():
+    assert list(aligned_dates(dates("2023-05-01", "2023-12-31"), 2025)) == list(dates("2025-05-01", "2025-12-31"))
+
+
+def test_date_mode_continues_a_season_over_new_year():
+    aligned = aligned_dates(dates("2023-12-30", "2023-12-31", "2024-01-01"), 2024)
+    assert list(aligned) == list(dates("2024-12-30", "2024-12-31", "2025-01-01"))
+
+
+def test_date_mode_drops_29_february_outside_leap_years():
+    aligned = aligned_dates(dates("2024-02-28", "2024-02-29", "2024-03-01"), 2025)
+    assert list(aligned[[0, 2]]) == list(dates("2025-02-28", "2025-03-01"))
+    assert pd.isna(aligned[1])
+    # Into a leap year it is a date like any other
+    assert list(aligned_dates(dates("2023-02-28", "2023-03-01"), 2024)) == list(dates("2024-02-28", "2024-03-01"))
+    assert aligned_dates(dates("2024-02-29"), 2028)[0] == pd.Timestamp("2028-02-29")
+
+
+@pytest.mark.parametrize("day", ["2023-12-30", "2023-12-31", "2024-01-01", "2024-02-29", "2024-03-01", "2022-02-28"])
+def test_weekday_mode_moves_by_whole_weeks(day):
+    date = pd.Timestamp(day)
+    aligned = aligned_dates(dates(day), 2025, "weekday")[0]
+    assert aligned.day_name() == date.day_name()
+    assert (aligned - date).days == (2025 - date.year) * WEEK_YEAR_DAYS
+
+
+def test_weekday_mode_over_new_year_and_a_leap_day():
+    # A 364-day year ends a day (two after 29/02) short of the calendar date, so early January lands in December
+    aligned = aligned_dates(dates("2024-01-01", "2024-02-29", "2024-03-01", "2024-12-31"), 2025, "weekday")
+    assert list(aligned) == list(dates("2024-12-30", "2025-02-27", "2025-02-28", "2025-12-30"))
+    # The whole season moves by the same weeks, so it stays one run of days over New Year
+    aligned = aligned_dates(dates("2023-12-31", "2024-01-01"), 2025, "weekday")
+    assert list(aligned) == list(dates("2025-12-28", "2025-12-29"))
+
+
+def test_no_dates():
+    assert aligned_dates(dates(), 2025).empty
+    assert aligned_dates(pd.DatetimeIndex([pd.NaT]), 2025, "weekday").isna().all()
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        aligned_dates(dates("2024-05-01"), 2025, "month")
+
+
+@pytest.mark.parametrize("mode, offsets, placed", [
+    # 29/02 has no place in 2025 by date; by weekday everything moves by 364 days and keeps its place
+    ("date", {"2025": 1, "2024": 0}, ["28/02", "01/03", None]),
+    ("weekday", {"2025": 3, "2024": 0}, ["28/02", "29/02", "01/03", None, None]),
+])
+def test_season_alignment_over_a_leap_day(mode, offsets, placed):
+    seasons = {"2025": dates("2025-03-01", "2025-03-02"), "2024": dates("2024-02-28", "2024-02-29", "2024-03-01")}
+    alignment = SeasonAlignment(seasons, 2025, mode)
+    assert {key: alignment.offset(key) for key in seasons} == offsets
+    assert alignment.length == offsets["2025"] + 2
+    assert alignment.place("2024", ["28/02", "29/02", "01/03"]) == placed
+    assert alignment.place("2025", [1, 2], fill=0) == [0] * offsets["2025"] + [1, 2]
+
+
+@pytest.mark.parametrize("mode, offsets, length", [("date", {"2024": 0, "2023": 0}, 2),
+                                                   ("weekday", {"2024": 2, "2023": 0}, 4)])
+def test_season_alignment_over_new_year(mode, offsets, length):
+    seasons = {"2024": dates("2024-12-31", "2025-01-01"), "2023": dates("2023-12-31", "2024-01-01")}
+    alignment = SeasonAlignment(seasons, 2024, mode)
+    assert {key: alignment.offset(key) for key in seasons} == offsets
+    assert alignment.length == length
+    assert list(alignment.positions["2023"]) == [0, 1]
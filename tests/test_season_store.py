@@ -0,0 +1,56 @@
+import os
+from datetime import datetime
+
+import pytest
+from openpyxl import Workbook
+
+import parse_cache
+import season_store
+
+DAYS = [datetime(2023, 4, 30), datetime(2023, 5, 1)]
+
+
+@pytest.fixture
+def export(tmp_path, monkeypatch):
+    """A zone export with a repeated category and cells that are not numbers."""
+    monkeypatch.chdir(tmp_path)  # The parse cache and the season store are written under the working directory
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Category", "Capacity"] + DAYS)
+    ws.append(["House", 4, 1, 2])
+    ws.append(["Tent", 2, "n/a", 3.5])
+    ws.append(["House", 4, 10, None])
+    path = tmp_path / "availabilityPerZone2023.xlsx"
+    wb.save(path)
+    return str(path)
+
+
+def test_sums_are_per_row_and_skip_non_numbers(export):
+    season = season_store.ingest(export, "zone", 2023)
+    assert season_store.season_categories(season) == [("House", 4), ("Tent", 2), ("House", 4)]
+    assert season_store.season_dates(season) == DAYS
+    assert season_store.category_nights(season) == {0: 3, 1: 3.5, 2: 10}
+    assert season_store.day_nights(season, [0, 2]) == [11, 2]
+    assert season_store.monthly_nights(season) == {4: {0: 1, 2: 10}, 5: {0: 2, 1: 3.5}}
+
+
+def test_an_export_is_read_once(export, monkeypatch):
+    season = season_store.ingest(export, "zone", 2023)
+
+    def read_first_sheet(*args, **kwargs):
+        raise AssertionError("a stored export was read again")
+
+    monkeypatch.setattr(parse_cache, "read_first_sheet", read_first_sheet)
+    assert season_store.ingest(export, "zone", 2023) == season
+    assert season_store.category_nights(season) == {0: 3, 1: 3.5, 2: 10}
+
+
+def test_a_removed_season_is_stored_again_from_its_export(export):
+    season = season_store.ingest(export, "zone", 2023)
+    os.remove(season_store.HISTORY_DB)
+    assert season_store.list_seasons() == []
+    assert season_store.category_nights(season) == {0: 3, 1: 3.5, 2: 10}
+    assert [(kind, year) for kind, year, _, _ in season_store.list_seasons()] == [("zone", 2023)]
+
+    season_store.drop_season("zone", 2023)
+    assert season_store.day_nights(season, [1]) == [0, 3.5]
@@ -0,0 +1,83 @@
+from openpyxl import Workbook
+
+from sheet_index import SheetIndex
+
+
+def scan_columns(ws, header):
+    """The rescan SheetIndex replaces: every column of the header row holding this header."""
+    return [column for column in range(1, ws.max_column + 1) if ws.cell(row=1, column=column).value == header]
+
+
+def scan_rows(ws, label):
+    """The rescan SheetIndex replaces: every row of the first column holding this label."""
+    return [row for row in range(1, ws.max_row + 1) if ws.cell(row=row, column=1).value == label]
+
+
+def sheet():
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Category", "Total 2025", "Percent to Total 2025", None, "Category", "Total 2024"])
+    ws.append(["Germany", 1, 0.5, None, "Germany", 2])
+    ws.append(["Total Rooms", 2, None, None, "Total Rooms", 2])
+    ws.append([None])
+    ws.append(["Camping Germany", 3, 1, None, "Camping Germany", 4])
+    ws.append(["Total Camping", 3, None, None, "Total Camping", 4])
+    return ws
+
+
+def assert_matches_scan(index, headers, labels):
+    for header in headers:
+        columns = scan_columns(index.ws, header)
+        assert index.columns(header) == columns
+        assert index.column(header) == (columns[0] if columns else None)
+        assert index.last_column(header) == (columns[-1] if columns else None)
+    for label in labels:
+        rows = scan_rows(index.ws, label)
+        assert index.rows(label) == rows
+        assert index.row(label) == (rows[0] if rows else None)
+        assert index.last_row(label) == (rows[-1] if rows else None)
+
+
+def test_duplicate_labels_first_and_last():
+    index = SheetIndex(sheet())
+    # "Category" heads column A and the 2024 block in column E; a second "Total Rooms" label goes below the data
+    assert (index.column("Category"), index.last_column("Category")) == (1, 5)
+    assert (index.column("Missing"), index.last_column("Missing")) == (None, None)
+    index.set_label(7, "Total Rooms")
+    assert (index.row("Total Rooms"), index.last_row("Total Rooms")) == (3, 7)
+    assert index.first_row_starting_with("Camping") == 5
+    assert_matches_scan(index, ["Category", "Total 2025", "Total 2024"], ["Germany", "Total Rooms", "Total Camping"])
+
+
+def test_lookup_after_set_header_and_set_label():
+    index = SheetIndex(sheet())
+    index.set_header(3, "Total 2025")  # Replaces "Percent to Total 2025" with a duplicate
+    index.set_header(4, "Separator")  # Fills an empty header cell
+    index.set_header(6, None)  # Clears the only "Total 2024"
+    index.set_label(4, "sep_row")
+    index.set_label(2, "Camping Austria")
+    assert index.columns("Total 2025") == [2, 3]
+    assert index.column("Percent to Total 2025") is None
+    assert index.column("Total 2024") is None
+    assert index.first_row_starting_with("Camping") == 2
+    assert_matches_scan(index, ["Total 2025", "Percent to Total 2025", "Separator", "Total 2024", "Category"],
+                        ["sep_row", "Camping Austria", "Germany", "Total Rooms", "Camping Germany"])
+
+
+def test_lookup_after_inserts():
+    index = SheetIndex(sheet())
+    index.insert_rows(3, 2)
+    index.insert_cols(2)
+    index.set_header(2, "Total 2025")
+    index.set_label(3, "Greece")
+    assert index.columns("Total 2025") == [2, 3]
+    assert (index.row("Total Rooms"), index.row("Total Camping")) == (5, 8)
+    assert_matches_scan(index, ["Category", "Total 2025", "Percent to Total 2025", "Total 2024"],
+                        ["Germany", "Greece", "Total Rooms", "Camping Germany", "Total Camping"])
+    # The header row and the label column move with inserts above and left of them
+    index.insert_rows(1)
+    index.insert_cols(1)
+    assert (index.header_row, index.label_column) == (2, 2)
+    index.set_header(7, "Total 2023")
+    assert index.ws.cell(row=2, column=7).value == "Total 2023"
+    assert index.column("Total 2023") == 7
@@ -0,0 +1,76 @@
+import pytest
+from openpyxl import Workbook
+
+from sheet_numbers import NumberBlock
+
+ROWS = [
+    [1, None, "n/a", 2],
+    [None, None, None, None],
+    [2.5, 3, True, "7"],
+    ["Total", 0, 4, 1.5],
+]
+
+
+def old_sum(values):
+    """The per-cell loops NumberBlock replaces: None and non-numbers are skipped."""
+    total = 0
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, (int, float)):
+            total += value
+    return total
+
+
+@pytest.fixture
+def ws():
+    wb = Workbook()
+    ws = wb.active
+    for row, values in enumerate(ROWS, start=2):
+        for column, value in enumerate(values, start=2):
+            ws.cell(row=row, column=column, value=value)
+    return ws
+
+
+def cell_values(ws, rows, columns):
+    return [ws.cell(row=row, column=column).value for row in rows for column in columns]
+
+
+def assert_same_sums(totals, expected):
+    assert totals == expected
+    # Same types too: a total of ints is written as an int, not as 3.0
+    assert [type(total) for total in totals.values()] == [type(total) for total in expected.values()]
+
+
+def test_row_totals_match_the_old_loop(ws):
+    block = NumberBlock(ws, 2, 5, 2, 5)
+    for first_col, last_col in [(2, 5), (3, 4), (5, 5)]:
+        expected = {row: old_sum(cell_values(ws, [row], range(first_col, last_col + 1))) for row in range(2, 6)}
+        assert_same_sums(block.row_totals(first_col, last_col), expected)
+
+
+def test_column_totals_match_the_old_loop(ws):
+    block = NumberBlock(ws, 2, 5, 2, 5)
+    for first_row, last_row in [(2, 5), (2, 3), (4, 5)]:
+        expected = {column: old_sum(cell_values(ws, range(first_row, last_row + 1), [column])) for column in range(2, 6)}
+        assert_same_sums(block.column_totals(first_row, last_row), expected)
+
+
+def test_bucket_totals(ws):
+    buckets = NumberBlock(ws, 2, 5, 2, 5).bucket_totals({"Apr": (2, 3), "May": (4, 5)})
+    assert buckets["Apr"] == {2: 1, 3: 0, 4: 5.5, 5: 0}
+    assert buckets["May"] == {2: 2, 3: 0, 4: 1, 5: 5.5}
+
+
+def test_cells_outside_the_block_are_ignored(ws):
+    ws.cell(row=1, column=2, value=100)
+    ws.cell(row=2, column=6, value=100)
+    assert NumberBlock(ws, 2, 5, 2, 5).column_totals(2, 5)[2] == 3.5
+    assert NumberBlock(ws, 3, 3, 2, 5).row_totals(2, 5) == {3: 0}
+
+
+def test_percent_to_total(ws):
+    # Column E: 2, None, "7", 1.5 -> one section of the numbers, and a section that sums to 0
+    percentages = NumberBlock(ws, 2, 5, 5, 5).percent_to_total(5, [(2, 3), (4, 5)])
+    assert percentages == {2: 1.0, 5: 1.0}
+    assert NumberBlock(ws, 2, 5, 3, 3).percent_to_total(3, [(2, 4), (5, 5)]) == {4: 1.0, 5: 0}
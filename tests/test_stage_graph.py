@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+import pipeline
+import plan_organizer_cli
+import stage_graph
+from stage_graph import SHARED_MODULES, StageGraph
+
+RUNS = []
+
+
+def count_lines(input_file, factor):
+    """A stage reading a file, recording every time it actually runs."""
+    RUNS.append(input_file)
+    with open(input_file, encoding="utf-8") as f:
+        return len(f.read().splitlines()) * factor
+
+
+@pytest.fixture
+def stage_cache(tmp_path, monkeypatch):
+    """An empty stage cache of its own for every test."""
+    cache_dir = tmp_path / "stages"
+    monkeypatch.setattr(stage_graph, "STAGE_CACHE_DIR", str(cache_dir))
+    RUNS.clear()
+    return cache_dir
+
+
+@pytest.fixture
+def input_file(tmp_path):
+    path = tmp_path / "export.txt"
+    path.write_text("a\nb\nc\n", encoding="utf-8")
+    return str(path)
+
+
+def run_stage(input_file, factor=2, use_cache=True):
+    """Declare and evaluate the stage in a new graph, like a new run of the pipeline."""
+    graph = StageGraph(max_workers=1, use_cache=use_cache)
+    return graph.evaluate(graph.add("count_lines", count_lines, input_file, factor))
+
+
+def cache_entries(cache_dir):
+    return sorted(os.listdir(cache_dir)) if os.path.isdir(cache_dir) else []
+
+
+def test_unchanged_stage_is_served_from_the_cache(stage_cache, input_file):
+    assert run_stage(input_file) == 6
+    assert run_stage(input_file) == 6
+    assert RUNS == [input_file]
+    assert len(cache_entries(stage_cache)) == 1
+
+
+def test_changed_input_file_runs_the_stage_again(stage_cache, input_file):
+    assert run_stage(input_file) == 6
+    with open(input_file, "a", encoding="utf-8") as f:
+        f.write("d\n")
+    assert run_stage(input_file) == 8
+    assert RUNS == [input_file, input_file]
+
+
+def test_changed_value_input_runs_the_stage_again(stage_cache, input_file):
+    assert run_stage(input_file, factor=2) == 6
+    assert run_stage(input_file, factor=3) == 9
+    assert len(RUNS) == 2
+
+
+@pytest.mark.parametrize("module_name", SHARED_MODULES)
+def test_changed_shared_module_runs_the_stage_again(stage_cache, input_file, monkeypatch, module_name):
+    assert run_stage(input_file) == 6
+    monkeypatch.setitem(stage_graph._code_versions, module_name, "edited source")
+    assert run_stage(input_file) == 6
+    assert len(RUNS) == 2
+    assert len(cache_entries(stage_cache)) == 2
+
+
+def test_disabled_cache_runs_every_stage_and_stores_nothing(stage_cache, input_file):
+    assert run_stage(input_file) == 6
+    entries = cache_entries(stage_cache)
+    assert run_stage(input_file, use_cache=False) == 6
+    assert run_stage(input_file, use_cache=False) == 6
+    assert len(RUNS) == 3
+    assert cache_entries(stage_cache) == entries
+
+
+class RecordingGraph:
+    """Stands in for StageGraph in the pipeline, records how every graph was created and runs nothing."""
+    created = []
+
+    def __init__(self, recorder=None, max_workers=None, use_cache=True):
+        RecordingGraph.created.append(use_cache)
+
+    def add(self, name, function, *args, **kwargs):
+        return name
+
+    def evaluate(self, node):
+        return None
+
+
+@pytest.mark.parametrize("flags, use_cache", [([], True), (["--no-stage-cache"], False)])
+def test_no_stage_cache_flag_reaches_the_stage_graph(tmp_path, monkeypatch, flags, use_cache):
+    monkeypatch.setattr(pipeline, "StageGraph", RecordingGraph)
+    monkeypatch.setattr(pipeline, "combine_sheets", lambda *args: None)
+    RecordingGraph.created = []
+    zone, availability_type = tmp_path / "zone.xls", tmp_path / "type.xls"
+    zone.write_bytes(b"")
+    availability_type.write_bytes(b"")
+
+    exit_code = plan_organizer_cli.main(["--zone", str(zone), "--type", str(availability_type),
+                                         "--output", str(tmp_path / "plan.xlsx"), "--max-workers", "1"] + flags)
+
+    assert exit_code == plan_organizer_cli.EXIT_OK
+    assert RecordingGraph.created == [use_cache]
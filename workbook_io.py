@@ -0,0 +1,133 @@
+import copyreg
+from copy import copy
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.styles.numbers import BUILTIN_FORMATS_MAX_SIZE
+from openpyxl.worksheet.dimensions import DimensionHolder
+from openpyxl.worksheet.worksheet import Worksheet
+
+# StyleArray fields and the workbook collections they index
+STYLE_COLLECTIONS = (("fontId", "_fonts"), ("fillId", "_fills"), ("borderId", "_borders"),
+                     ("alignmentId", "_alignments"), ("protectionId", "_protections"))
+
+
+def _reduce_dimension_holder(holder):
+    """
+    Pickle row/column dimensions with their worksheet and factory. The defaultdict default drops both,
+    so a Workbook coming back from a worker process or the stage cache could not add new dimensions.
+    """
+    return (DimensionHolder, (holder.worksheet, holder.reference, holder.default_factory), holder.__dict__, None,
+            iter(holder.items()))
+
+
+copyreg.pickle(DimensionHolder, _reduce_dimension_holder)
+
+
+def read_frame(source, **kwargs):
+    """Read a DataFrame from an Excel file path or from an in-memory Workbook."""
+    if isinstance(source, Workbook):
+        return pd.read_excel(source, engine="openpyxl", **kwargs)
+    return pd.read_excel(source, **kwargs)
+
+
+def load_book(source):
+    """Load a Workbook from a file path, or return it as is when it is already in memory."""
+    if isinstance(source, Workbook):
+        return source
+    return load_workbook(source)
+
+
+def read_values(source, min_row=1, max_row=None, min_col=1, max_col=None):
+    """
+    Return the values of a window of a sheet as row tuples, like ws.iter_rows(values_only=True) over
+    min_row..max_row and min_col..max_col (None up to the last row / column of the sheet).
+    A file is streamed through a read-only workbook, only as far as the window goes; the first sheet of an
+    in-memory Workbook, or a Worksheet, is read without creating the blank cells iter_rows would add.
+    """
+    if isinstance(source, (Workbook, Worksheet)):
+        ws = source.active if isinstance(source, Workbook) else source
+        cells = ws._cells
+        max_row = ws.max_row if max_row is None else max_row
+        max_col = ws.max_column if max_col is None else max_col
+        return [tuple(cells[(row, column)].value if (row, column) in cells else None
+                      for column in range(min_col, max_col + 1))
+                for row in range(min_row, max_row + 1)]
+
+    workbook = load_workbook(source, read_only=True)
+    try:
+        ws = workbook.active
+        return list(ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col,
+                                 max_col=ws.max_column if max_col is None else max_col, values_only=True))
+    finally:
+        workbook.close()
+
+
+def frame_to_book(df, sheet_name="Sheet1", **kwargs):
+    """Write a DataFrame into a new in-memory Workbook exactly like DataFrame.to_excel does."""
+    writer = pd.ExcelWriter(BytesIO(), engine="openpyxl")
+    df.to_excel(writer, sheet_name=sheet_name, **kwargs)
+    return writer.book
+
+
+def settle_book(workbook):
+    """
+    Bring an in-memory Workbook to the state load_workbook would return after a save,
+    so the next stage sees the same cells whether it gets the object or the file.
+    Empty strings are stored as blank cells and blank cells without a style are dropped.
+    """
+    for ws in workbook.worksheets:
+        for coordinate, cell in list(ws._cells.items()):
+            if cell.value == "":
+                cell.value = None
+            if cell.value is None and not cell.has_style and cell.comment is None:
+                del ws._cells[coordinate]
+    return workbook
+
+
+def save_book(workbook, output_file=None):
+    """Save the Workbook when an output file is given (on-disk debug mode) and hand it over to the next stage."""
+    if output_file:
+        workbook.save(output_file)
+    return settle_book(workbook)
+
+
+def _translate_style(style, source, target):
+    """Return the StyleArray pointing at the same styles in the target workbook as style does in the source one."""
+    translated = StyleArray(style)
+    for field, collection in STYLE_COLLECTIONS:
+        setattr(translated, field, getattr(target, collection).add(getattr(source, collection)[getattr(style, field)]))
+    if style.numFmtId >= BUILTIN_FORMATS_MAX_SIZE:
+        number_format = source._number_formats[style.numFmtId - BUILTIN_FORMATS_MAX_SIZE]
+        translated.numFmtId = target._number_formats.add(number_format) + BUILTIN_FORMATS_MAX_SIZE
+    named_style = source._named_styles[style.xfId]
+    if named_style.name not in target.named_styles:
+        target.add_named_style(copy(named_style))
+    translated.xfId = target.named_styles.index(named_style.name)
+    return translated
+
+
+def move_sheet(ws, workbook, title=None):
+    """
+    Move a worksheet into another Workbook as its last sheet, keeping its cells, dimensions, freeze panes
+    and conditional formats as they are. Only the style indexes of the cells are translated to the
+    target workbook, once per distinct style instead of copying the style objects of every cell.
+    """
+    source = ws.parent
+    translated = {}
+    for cell in ws._cells.values():
+        if not cell.has_style:
+            continue
+        key = tuple(cell._style)
+        if key not in translated:
+            translated[key] = _translate_style(cell._style, source, workbook)
+        cell._style = copy(translated[key])  # Cells change their StyleArray in place when restyled
+
+    source._sheets.remove(ws)
+    ws._parent = workbook
+    workbook._add_sheet(ws)
+    if title:
+        ws.title = title
+    return ws